@@ -66,6 +66,37 @@ def verify_database_connection():
 
 
 
+def ensure_indexes():
+    """
+    Crea (de forma idempotente) los índices que usan las consultas calientes.
+
+    - OCR_processed_documents (document_id, processing_status): consultas de
+      estado por documento sin COLLSCAN.
+    - OCR_processed_documents created_at: listados/ordenamientos por fecha.
+    - OCR_document_types (name, is_active): la búsqueda de configuración de
+      tipo que hace cada pipeline (cacheada, pero el miss debe ser barato).
+
+    create_index es un no-op si el índice ya existe, así que es seguro
+    llamarla en cada arranque.
+    """
+    from database.mongodb_connection import get_collection
+
+    processed = get_collection("OCR_processed_documents")
+    processed.create_index(
+        [("document_id", ASCENDING), ("processing_status", ASCENDING)],
+        name="document_id_processing_status",
+    )
+    processed.create_index([("created_at", DESCENDING)], name="created_at_desc")
+
+    document_types = get_collection("OCR_document_types")
+    document_types.create_index(
+        [("name", ASCENDING), ("is_active", ASCENDING)],
+        name="name_is_active",
+    )
+
+    logger.info("Índices de MongoDB verificados/creados correctamente")
+
+
 if __name__ == "__main__":
     # Configurar logging
     logging.basicConfig(level=logging.INFO)
@@ -7,6 +7,7 @@ from typing import Optional
 from pymongo import MongoClient
 from pymongo.database import Database
 from pymongo.collection import Collection
+from pymongo.write_concern import WriteConcern
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 import logging
 
@@ -21,6 +22,21 @@ class MongoDBConnection:
         self._async_client: Optional[AsyncIOMotorClient] = None
         self._database: Optional[Database] = None
         self._async_database: Optional[AsyncIOMotorDatabase] = None
+        self._collections: dict = {}
+
+    @staticmethod
+    def _pool_options() -> dict:
+        """Opciones de pool de conexiones compartidas por ambos clientes.
+
+        El tamaño del pool debe acompañar a la concurrencia de los workers
+        (PROCESSOR_MAX_CONCURRENCY y los executors de capas) para que ninguna
+        operación espere por un socket ni se pague handshake TLS por operación.
+        """
+        return {
+            "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "100")),
+            "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", "20")),
+            "retryWrites": True,
+        }
     
     def get_connection_string(self) -> str:
         """Obtiene la cadena de conexión a MongoDB desde variables de entorno"""
@@ -72,7 +88,8 @@ class MongoDBConnection:
                 connection_string,
                 serverSelectionTimeoutMS=5000,  # 5 segundos máximo para seleccionar servidor
                 connectTimeoutMS=5000,  # 5 segundos máximo para conectar
-                socketTimeoutMS=30000  # 30 segundos para operaciones
+                socketTimeoutMS=30000,  # 30 segundos para operaciones
+                **self._pool_options()
             )
             database_name = os.getenv("MONGODB_DATABASE", "Rocktruck")
             self._database = self._client[database_name]
@@ -89,7 +106,8 @@ class MongoDBConnection:
                 connection_string,
                 serverSelectionTimeoutMS=5000,
                 connectTimeoutMS=5000,
-                socketTimeoutMS=30000
+                socketTimeoutMS=30000,
+                **self._pool_options()
             )
             database_name = os.getenv("MONGODB_DATABASE", "Rocktruck")
             self._async_database = self._async_client[database_name]
@@ -98,10 +116,14 @@ class MongoDBConnection:
         return self._async_database
     
     def get_collection(self, collection_name: str) -> Collection:
-        """Obtiene una colección específica"""
-        if self._database is None:
-            self.connect()
-        return self._database[collection_name]
+        """Obtiene una colección específica (handle cacheado por nombre)"""
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            if self._database is None:
+                self.connect()
+            collection = self._database[collection_name]
+            self._collections[collection_name] = collection
+        return collection
     
     async def get_async_collection(self, collection_name: str):
         """Obtiene una colección específica de forma asíncrona"""
@@ -115,6 +137,7 @@ class MongoDBConnection:
             self._client.close()
             self._client = None
             self._database = None
+            self._collections = {}
     
     async def close_async(self):
         """Cierra la conexión asíncrona"""
@@ -138,6 +161,19 @@ def get_collection(collection_name: str) -> Collection:
     return mongodb_connection.get_collection(collection_name)
 
 
+def get_unacknowledged_collection(collection_name: str) -> Collection:
+    """
+    Obtiene un handle de la colección con write concern w=0 (fire-and-forget).
+
+    Pensado para escrituras puramente observacionales (heartbeats de estado):
+    la llamada retorna tras enviar el socket, sin esperar el RTT del ack.
+    Las escrituras importantes deben seguir usando get_collection (w por defecto).
+    """
+    return mongodb_connection.get_collection(collection_name).with_options(
+        write_concern=WriteConcern(w=0)
+    )
+
+
 async def get_async_database():
     """Función helper para obtener la base de datos de forma asíncrona"""
     return await mongodb_connection.connect_async()
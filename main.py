@@ -88,7 +88,7 @@ except Exception as e:
 
 # Importar verificación de base de datos
 try:
-    from database.init_database import verify_database_connection
+    from database.init_database import verify_database_connection, ensure_indexes
     logger.info("✅ Verificación de DB importada correctamente")
 except Exception as e:
     logger.warning(f"⚠️  Error importando verificación de DB: {e}")
@@ -97,6 +97,10 @@ except Exception as e:
         logger.warning("⚠️  verify_database_connection() no disponible")
         pass
 
+    def ensure_indexes():
+        logger.warning("⚠️  ensure_indexes() no disponible")
+        pass
+
 # Flag para verificar si estamos en Cloud Functions
 # Cloud Functions Gen2 establece estas variables de entorno
 IS_CLOUD_FUNCTION = (
@@ -268,6 +272,8 @@ async def startup_event():
                     loop = asyncio.get_event_loop()
                     await loop.run_in_executor(None, verify_database_connection)
                     logger.info("✅ Conexión a base de datos verificada correctamente")
+                    # Asegurar índices de las consultas calientes (idempotente)
+                    await loop.run_in_executor(None, ensure_indexes)
                 except Exception as e:
                     logger.warning(f"⚠️  No se pudo verificar la conexión a base de datos: {e}")
                     logger.warning("⚠️  La API funcionará pero algunas funciones pueden no estar disponibles")
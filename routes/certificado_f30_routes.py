@@ -18,15 +18,16 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1", tags=["certificado-f30"])
 
-# Inicializar procesador de forma lazy
-_f30_processor = None
+# Inicializar procesadores de forma lazy, uno por tipo de F30: el tipo queda
+# fijado en la instancia y los documentos concurrentes no comparten estado
+_f30_processors: Dict[str, CertificadoF30Processor] = {}
 
-def get_f30_processor():
-    """Obtiene la instancia del procesador (lazy initialization)"""
-    global _f30_processor
-    if _f30_processor is None:
-        _f30_processor = CertificadoF30Processor()
-    return _f30_processor
+def get_f30_processor(tipo_f30: str = "razon_social"):
+    """Obtiene la instancia del procesador para el tipo de F30 (lazy)"""
+    processor = _f30_processors.get(tipo_f30)
+    if processor is None:
+        processor = _f30_processors[tipo_f30] = CertificadoF30Processor(tipo_f30=tipo_f30)
+    return processor
 
 
 @router.post("/certificado_f30", response_model=Dict[str, Any])
@@ -110,8 +111,8 @@ async def process_document_background(document_data: Dict[str, Any], processor_t
             
             # Procesar documento
             set_stage("processing")
-            processor = get_f30_processor()
-            result = processor.process_document(document_data)
+            processor = get_f30_processor(document_data.get("tipo_f30", "razon_social"))
+            result = await processor.aprocess_document(document_data)
             
             # Preparar respuesta
             response_data = {
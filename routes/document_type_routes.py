@@ -10,6 +10,7 @@ from bson import ObjectId
 
 from models.document_models import DocumentType, DocumentTypeCreate, DocumentTypeUpdate
 from database.mongodb_connection import get_collection
+from services.document_type_cache import document_type_cache
 
 logger = logging.getLogger(__name__)
 
@@ -75,10 +76,16 @@ async def create_document_type(document_type: DocumentTypeCreate) -> DocumentTyp
         document_type_data = document_type.dict()
         document_type_data["created_at"] = datetime.utcnow()
         document_type_data["updated_at"] = datetime.utcnow()
+        # Versión inicial de las reglas: las cachés de prompts compilados se
+        # indexan por (_id, rules_version) y cada edición de reglas la incrementa
+        document_type_data["rules_version"] = 1
         
         result = get_collection("OCR_document_types").insert_one(document_type_data)
         document_type_data["_id"] = result.inserted_id
-        
+
+        # Invalidar la caché de tipos para que el pipeline vea el cambio
+        document_type_cache.clear()
+
         return DocumentType(**document_type_data)
         
     except HTTPException:
@@ -107,12 +114,21 @@ async def update_document_type(type_id: str, document_type: DocumentTypeUpdate)
         # Actualizar el tipo de documento
         update_data = {k: v for k, v in document_type.dict().items() if v is not None}
         update_data["updated_at"] = datetime.utcnow()
-        
+
+        update_ops: Dict[str, Any] = {"$set": update_data}
+        if "general_rules" in update_data or "validation_rules" in update_data:
+            # Incrementar la versión de reglas para invalidar los bloques de
+            # prompt compilados cacheados por (_id, rules_version, grupo)
+            update_ops["$inc"] = {"rules_version": 1}
+
         get_collection("OCR_document_types").update_one(
             {"_id": ObjectId(type_id)},
-            {"$set": update_data}
+            update_ops
         )
         
+        # Invalidar la caché de tipos para que el pipeline vea el cambio
+        document_type_cache.clear()
+
         # Obtener el tipo actualizado
         updated = get_collection("OCR_document_types").find_one({"_id": ObjectId(type_id)})
         return DocumentType(**updated)
@@ -151,6 +167,9 @@ async def delete_document_type(type_id: str) -> Dict[str, Any]:
             }
         )
         
+        # Invalidar la caché de tipos para que el pipeline vea el cambio
+        document_type_cache.clear()
+
         return {
             "message": f"Tipo de documento {type_id} desactivado correctamente",
             "type_id": type_id
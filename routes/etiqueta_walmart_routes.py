@@ -107,7 +107,7 @@ async def process_document_background(document_data: Dict[str, Any], processor_t
             # Procesar documento
             set_stage("processing")
             processor = get_walmart_processor()
-            result = processor.process_document(document_data)
+            result = await processor.aprocess_document(document_data)
             
             # Preparar respuesta
             response_data = {
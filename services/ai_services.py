@@ -5,13 +5,22 @@ Basado en el DocumentIAClient del proyecto original pero adaptado para la nueva
 
 import json
 import os
-from typing import Dict, Any, List, Tuple, Optional
-from openai import OpenAI
+from typing import Dict, Any, List, Tuple, Optional, Union
+from openai import OpenAI, AsyncOpenAI
 import logging
 
+from utils.json_utils import dumps_compact, dumps_pretty
+
 logger = logging.getLogger(__name__)
 
 
+def _rules_as_str(rules: Union[str, List[Dict[str, Any]]]) -> str:
+    """Acepta reglas ya serializadas (str) o las serializa para el prompt."""
+    if isinstance(rules, str):
+        return rules
+    return dumps_pretty(rules)
+
+
 class DocumentAIService:
     """Servicio de IA para procesamiento de documentos"""
     
@@ -28,7 +37,12 @@ class DocumentAIService:
             api_key=self.api_key,
             base_url=self.base_url
         )
-    
+        # Cliente asíncrono (mismas credenciales) para las variantes avalidate_*
+        self.async_client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url
+        )
+
     def _calculate_cost(self, usage) -> float:
         """Calcula el costo de la llamada a la API"""
         if not usage:
@@ -66,7 +80,7 @@ class DocumentAIService:
                 doc_type_copy['_id'] = str(doc_type_copy['_id'])
             serializable_types.append(doc_type_copy)
         
-        available_types_str = json.dumps(serializable_types, indent=2, ensure_ascii=False, default=str)
+        available_types_str = dumps_pretty(serializable_types)
         
         # Truncar texto OCR para optimizar
         truncated_ocr = self._truncate_ocr_text(ocr_text)
@@ -196,7 +210,7 @@ class DocumentAIService:
         Extrae datos del documento usando un schema específico
         """
         
-        schema_str = json.dumps(extraction_schema, indent=2, ensure_ascii=False, default=str)
+        schema_str = dumps_pretty(extraction_schema)
         
         # Truncar texto OCR para optimizar
         truncated_ocr = self._truncate_ocr_text(ocr_text)
@@ -267,20 +281,17 @@ class DocumentAIService:
             logger.error(f"Error en extracción de datos: {e}")
             return {}, 0.0
     
-    def validate_general_rules(
+    def _build_general_rules_prompt(
         self,
         document_data: Dict[str, Any],
-        general_rules: List[Dict[str, Any]],
-        document_type: str
-    ) -> Tuple[Dict[str, Any], float]:
-        """
-        Valida los datos del documento contra las reglas generales (no requieren datos del usuario)
-        """
-        
-        rules_str = json.dumps(general_rules, indent=2, ensure_ascii=False, default=str)
-        document_data_str = json.dumps(document_data, indent=2, ensure_ascii=False, default=str)
-        
-        prompt = f"""
+        general_rules: Union[str, List[Dict[str, Any]]]
+    ) -> str:
+        """Construye el prompt de validación de reglas generales (compartido sync/async)"""
+
+        rules_str = _rules_as_str(general_rules)
+        document_data_str = dumps_pretty(document_data)
+
+        return f"""
         **Rol y Objetivo:**
         Eres un experto en validación de documentos. Aplica las reglas generales para validar los datos del documento.
 
@@ -316,7 +327,22 @@ class DocumentAIService:
         }}
         ```
         """
-        
+
+    def validate_general_rules(
+        self,
+        document_data: Dict[str, Any],
+        general_rules: Union[str, List[Dict[str, Any]]],
+        document_type: str
+    ) -> Tuple[Dict[str, Any], float]:
+        """
+        Valida los datos del documento contra las reglas generales (no requieren datos del usuario).
+
+        `general_rules` acepta la lista de reglas o un bloque JSON ya serializado
+        (ver services.rule_prompt_cache) para evitar re-serializar en cada llamada.
+        """
+
+        prompt = self._build_general_rules_prompt(document_data, general_rules)
+
         try:
             response = self.client.chat.completions.create(
                 model=self.model,
@@ -358,22 +384,19 @@ class DocumentAIService:
             logger.error(f"Error en validación de reglas generales: {e}")
             return {"validaciones_detalladas": []}, 0.0
     
-    def validate_cross_validation_rules(
+    def _build_cross_validation_prompt(
         self,
         document_data: Dict[str, Any],
         user_data: Dict[str, Any],
-        validation_rules: List[Dict[str, Any]],
-        document_type: str
-    ) -> Tuple[Dict[str, Any], float]:
-        """
-        Valida los datos del documento contra los datos del usuario usando reglas de validación cruzada
-        """
-        
-        rules_str = json.dumps(validation_rules, indent=2, ensure_ascii=False, default=str)
-        document_data_str = json.dumps(document_data, indent=2, ensure_ascii=False, default=str)
-        user_data_str = json.dumps(user_data, indent=2, ensure_ascii=False, default=str)
-        
-        prompt = f"""
+        validation_rules: Union[str, List[Dict[str, Any]]]
+    ) -> str:
+        """Construye el prompt de validación cruzada (compartido sync/async)"""
+
+        rules_str = _rules_as_str(validation_rules)
+        document_data_str = dumps_pretty(document_data)
+        user_data_str = dumps_pretty(user_data)
+
+        return f"""
         **Rol y Objetivo:**
         Eres un experto en validación cruzada de documentos. Compara los datos del documento con los datos del usuario.
 
@@ -415,7 +438,22 @@ class DocumentAIService:
         }}
         ```
         """
-        
+
+    def validate_cross_validation_rules(
+        self,
+        document_data: Dict[str, Any],
+        user_data: Dict[str, Any],
+        validation_rules: Union[str, List[Dict[str, Any]]],
+        document_type: str
+    ) -> Tuple[Dict[str, Any], float]:
+        """
+        Valida los datos del documento contra los datos del usuario usando reglas de validación cruzada.
+
+        `validation_rules` acepta la lista de reglas o un bloque JSON ya serializado.
+        """
+
+        prompt = self._build_cross_validation_prompt(document_data, user_data, validation_rules)
+
         try:
             response = self.client.chat.completions.create(
                 model=self.model,
@@ -457,6 +495,312 @@ class DocumentAIService:
             logger.error(f"Error en validación cruzada: {e}")
             return {"validaciones_detalladas": []}, 0.0
     
+    # Resultado vacío para la validación combinada (sin reglas aplicables o error)
+    _EMPTY_COMBINED_VALIDATION = {
+        "validaciones_generales": [],
+        "validaciones_cruzadas": [],
+        "validaciones_dinamicas": [],
+        "campos_faltantes": []
+    }
+
+    def _build_validate_all_rules_prompt(
+        self,
+        document_data: Dict[str, Any],
+        user_data: Optional[Dict[str, Any]],
+        general_rules: Optional[Union[str, List[Dict[str, Any]]]],
+        validation_rules: Optional[Union[str, List[Dict[str, Any]]]],
+        document_type: str
+    ) -> Optional[str]:
+        """
+        Construye el prompt de validación combinada (reglas generales + cruzadas +
+        dinámicas). Devuelve None si no hay ninguna validación aplicable.
+        Compartido entre la llamada síncrona y el modo Batch. Los grupos de
+        reglas aceptan listas o bloques JSON ya serializados.
+        """
+
+        document_data_str = dumps_pretty(document_data)
+
+        sections = [f"""
+        **Datos del Documento:**
+        ```json
+        {document_data_str}
+        ```"""]
+
+        instructions = []
+        output_fields = []
+
+        if general_rules:
+            rules_str = _rules_as_str(general_rules)
+            sections.append(f"""
+        **Reglas Generales:**
+        ```json
+        {rules_str}
+        ```""")
+            instructions.append(
+                "Aplica cada regla general sobre los datos del documento (fechas, formatos, vigencia). "
+                "Reporta cada una en 'validaciones_generales'."
+            )
+            output_fields.append('"validaciones_generales": [{"nombre_regla": "...", "resultado": "APROBADO/RECHAZADO", "razon": "..."}]')
+
+        if user_data:
+            user_data_str = dumps_pretty(user_data)
+            sections.append(f"""
+        **Datos del Usuario:**
+        ```json
+        {user_data_str}
+        ```""")
+
+        if validation_rules and user_data:
+            rules_str = _rules_as_str(validation_rules)
+            sections.append(f"""
+        **Reglas de Validación Cruzada:**
+        ```json
+        {rules_str}
+        ```""")
+            instructions.append(
+                "Aplica cada regla de validación cruzada comparando documento vs usuario "
+                "(RUTs normalizados, nombres con coincidencia flexible). "
+                "Reporta cada una en 'validaciones_cruzadas'."
+            )
+            output_fields.append('"validaciones_cruzadas": [{"nombre_regla": "...", "resultado": "APROBADO/RECHAZADO", "razon": "..."}]')
+        elif user_data:
+            instructions.append(
+                "Compara dinámicamente cada campo del usuario con los campos del documento "
+                "(RUTs normalizados, nombres con coincidencia flexible). "
+                "Reporta cada comparación en 'validaciones_dinamicas' y los campos del usuario "
+                "que no aparecen en el documento en 'campos_faltantes'."
+            )
+            output_fields.append(
+                '"validaciones_dinamicas": [{"campo_usuario": "...", "campo_documento": "...", "coincide": true/false, '
+                '"valor_usuario": "...", "valor_documento": "...", "tipo_validacion": "exacta/parcial/flexible", "observaciones": "..."}]'
+            )
+            output_fields.append('"campos_faltantes": ["..."]')
+
+        if not instructions:
+            return None
+
+        instructions_str = "\n        ".join(
+            f"{i + 1}. {instruction}" for i, instruction in enumerate(instructions)
+        )
+        output_str = ",\n            ".join(output_fields)
+        sections_str = "\n".join(sections)
+
+        prompt = f"""
+        **Rol y Objetivo:**
+        Eres un experto en validación de documentos del tipo "{document_type}". Aplica TODAS las validaciones solicitadas en una sola pasada.
+        {sections_str}
+
+        **Instrucciones:**
+        {instructions_str}
+        Evalúa cada regla independientemente.
+
+        **Formato de Salida:**
+        Devuelve únicamente un objeto JSON con esta estructura:
+
+        ```json
+        {{
+            {output_str}
+        }}
+        ```
+        """
+
+        return prompt
+
+    def _parse_combined_validation(self, result_text: str) -> Dict[str, Any]:
+        """Parsea la respuesta JSON de la validación combinada (texto posiblemente con markdown)."""
+        try:
+            # Limpiar la respuesta para extraer solo el JSON
+            result_text = result_text.strip()
+
+            # Si la respuesta contiene markdown, extraer solo el JSON
+            if "```json" in result_text:
+                start = result_text.find("```json") + 7
+                end = result_text.find("```", start)
+                if end != -1:
+                    result_text = result_text[start:end].strip()
+            elif "```" in result_text:
+                start = result_text.find("```") + 3
+                end = result_text.find("```", start)
+                if end != -1:
+                    result_text = result_text[start:end].strip()
+
+            result = json.loads(result_text)
+
+            # Asegurar que los grupos esperados existan
+            for field, default in self._EMPTY_COMBINED_VALIDATION.items():
+                if field not in result:
+                    result[field] = list(default)
+
+            return result
+        except json.JSONDecodeError as e:
+            logger.error(f"Error al parsear validaciones combinadas: {e}")
+            logger.error(f"Respuesta recibida: {result_text[:500]}...")
+            return {k: list(v) for k, v in self._EMPTY_COMBINED_VALIDATION.items()}
+
+    def validate_all_rules(
+        self,
+        document_data: Dict[str, Any],
+        user_data: Optional[Dict[str, Any]],
+        general_rules: Optional[List[Dict[str, Any]]],
+        validation_rules: Optional[List[Dict[str, Any]]],
+        document_type: str
+    ) -> Tuple[Dict[str, Any], float]:
+        """
+        Valida reglas generales, cruzadas y dinámicas en una sola llamada a la API.
+        Optimización para reducir round-trips al LLM: combina lo que antes eran
+        2-3 llamadas separadas por documento en una única petición.
+        """
+
+        prompt = self._build_validate_all_rules_prompt(
+            document_data, user_data, general_rules, validation_rules, document_type
+        )
+        if prompt is None:
+            return {k: list(v) for k, v in self._EMPTY_COMBINED_VALIDATION.items()}, 0.0
+
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "Eres un experto en validación de reglas para documentos."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.1,
+                max_tokens=3000  # Más tokens para cubrir todos los grupos de reglas
+            )
+
+            result_text = response.choices[0].message.content.strip()
+            cost = self._calculate_cost(response.usage)
+
+            return self._parse_combined_validation(result_text), cost
+
+        except Exception as e:
+            # Propagar el fallo en lugar de devolver un resultado vacío: una
+            # lista de validaciones vacía es indistinguible de "todo aprobado"
+            # y el llamador la cachearía como un resultado genuino
+            logger.error(f"Error en validación combinada de reglas: {e}")
+            raise
+
+    def validate_all_rules_batch(
+        self,
+        items: List[Dict[str, Any]],
+        poll_interval: float = 5.0,
+        timeout: float = 3600.0
+    ) -> Dict[str, Tuple[Dict[str, Any], float]]:
+        """
+        Valida varios documentos en una sola petición a la OpenAI Batch API
+        (50% de descuento en tokens respecto a las llamadas interactivas).
+
+        Args:
+            items: Lista de dicts con claves: custom_id, document_data, user_data,
+                   general_rules, validation_rules, document_type
+            poll_interval: Segundos entre consultas de estado del batch
+            timeout: Segundos máximos de espera antes de abortar
+
+        Returns:
+            Dict custom_id -> (resultado combinado, costo)
+        """
+        import time
+
+        empty = lambda: {k: list(v) for k, v in self._EMPTY_COMBINED_VALIDATION.items()}
+        results: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        request_lines: List[Dict[str, Any]] = []
+
+        for item in items:
+            custom_id = item["custom_id"]
+            prompt = self._build_validate_all_rules_prompt(
+                item["document_data"],
+                item.get("user_data"),
+                item.get("general_rules"),
+                item.get("validation_rules"),
+                item["document_type"],
+            )
+            if prompt is None:
+                results[custom_id] = (empty(), 0.0)
+                continue
+            request_lines.append({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": [
+                        {"role": "system", "content": "Eres un experto en validación de reglas para documentos."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    "temperature": 0.1,
+                    "max_tokens": 3000
+                }
+            })
+
+        if not request_lines:
+            return results
+
+        try:
+            jsonl_payload = "\n".join(
+                dumps_compact(line) for line in request_lines
+            ).encode("utf-8")
+
+            batch_file = self.client.files.create(
+                file=("validaciones_batch.jsonl", jsonl_payload),
+                purpose="batch"
+            )
+            batch = self.client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            logger.info(f"Batch de validaciones enviado: {batch.id} ({len(request_lines)} peticiones)")
+
+            deadline = time.monotonic() + timeout
+            while batch.status not in ("completed", "failed", "expired", "cancelled"):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Batch {batch.id} no completó en {timeout}s (estado: {batch.status})")
+                time.sleep(poll_interval)
+                batch = self.client.batches.retrieve(batch.id)
+
+            if batch.status != "completed":
+                raise ValueError(f"Batch {batch.id} terminó con estado: {batch.status}")
+
+            output_text = self.client.files.content(batch.output_file_id).text
+
+            for line in output_text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                custom_id = entry.get("custom_id")
+                response_body = (entry.get("response") or {}).get("body") or {}
+                if entry.get("error") or not response_body.get("choices"):
+                    logger.error(f"Error en respuesta de batch para {custom_id}: {entry.get('error')}")
+                    results[custom_id] = (empty(), 0.0)
+                    continue
+                content = response_body["choices"][0]["message"]["content"].strip()
+                cost = self._calculate_batch_cost(response_body.get("usage"))
+                results[custom_id] = (self._parse_combined_validation(content), cost)
+
+        except Exception as e:
+            logger.error(f"Error en batch de validaciones: {e}")
+
+        # Cualquier petición sin respuesta queda con resultado vacío
+        for line in request_lines:
+            results.setdefault(line["custom_id"], (empty(), 0.0))
+
+        return results
+
+    def _calculate_batch_cost(self, usage: Optional[Dict[str, Any]]) -> float:
+        """Calcula el costo de una respuesta de Batch API (usage como dict, 50% de descuento)"""
+        if not usage:
+            return 0.0
+
+        # Precios aproximados por 1K tokens (ajustar según el modelo)
+        input_price_per_1k = 0.00015  # $0.15 por 1K tokens de entrada
+        output_price_per_1k = 0.0006   # $0.60 por 1K tokens de salida
+
+        input_cost = (usage.get("prompt_tokens", 0) / 1000) * input_price_per_1k
+        output_cost = (usage.get("completion_tokens", 0) / 1000) * output_price_per_1k
+
+        # La Batch API tiene 50% de descuento sobre el precio interactivo
+        return (input_cost + output_cost) * 0.5
+
     def dynamic_user_data_validation(
         self,
         document_data: Dict[str, Any],
@@ -465,11 +809,61 @@ class DocumentAIService:
         """
         Valida dinámicamente los datos del usuario contra los datos del documento
         """
-        
-        document_data_str = json.dumps(document_data, indent=2, ensure_ascii=False, default=str)
-        user_data_str = json.dumps(user_data, indent=2, ensure_ascii=False, default=str)
-        
-        prompt = f"""
+
+        prompt = self._build_dynamic_validation_prompt(document_data, user_data)
+
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "Eres un experto en validación cruzada de datos de documentos."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.1,
+                max_tokens=2000
+            )
+
+            result_text = response.choices[0].message.content.strip()
+            cost = self._calculate_cost(response.usage)
+
+            try:
+                # Limpiar la respuesta para extraer solo el JSON
+                result_text = result_text.strip()
+
+                # Si la respuesta contiene markdown, extraer solo el JSON
+                if "```json" in result_text:
+                    start = result_text.find("```json") + 7
+                    end = result_text.find("```", start)
+                    if end != -1:
+                        result_text = result_text[start:end].strip()
+                elif "```" in result_text:
+                    start = result_text.find("```") + 3
+                    end = result_text.find("```", start)
+                    if end != -1:
+                        result_text = result_text[start:end].strip()
+
+                result = json.loads(result_text)
+                return result, cost
+            except json.JSONDecodeError as e:
+                logger.error(f"Error al parsear validación cruzada: {e}")
+                logger.error(f"Respuesta recibida: {result_text[:500]}...")
+                return {"validaciones_cruzadas": [], "campos_faltantes": [], "resumen": {}}, cost
+
+        except Exception as e:
+            logger.error(f"Error en validación cruzada: {e}")
+            return {"validaciones_cruzadas": [], "campos_faltantes": [], "resumen": {}}, 0.0
+
+    def _build_dynamic_validation_prompt(
+        self,
+        document_data: Dict[str, Any],
+        user_data: Dict[str, Any]
+    ) -> str:
+        """Construye el prompt de validación dinámica de datos del usuario (compartido sync/async)"""
+
+        document_data_str = dumps_pretty(document_data)
+        user_data_str = dumps_pretty(user_data)
+
+        return f"""
         **Rol y Objetivo:**
         Eres un experto en validación cruzada de datos. Compara los datos del usuario con los datos extraídos del documento.
 
@@ -517,26 +911,35 @@ class DocumentAIService:
         }}
         ```
         """
-        
+
+    async def _achat_json(
+        self,
+        system_prompt: str,
+        prompt: str,
+        fallback: Dict[str, Any],
+        error_label: str,
+        max_tokens: int = 2000
+    ) -> Tuple[Dict[str, Any], float]:
+        """
+        Ejecuta una llamada de chat asíncrona y parsea la respuesta JSON
+        (posiblemente envuelta en markdown). Base de las variantes avalidate_*.
+        """
         try:
-            response = self.client.chat.completions.create(
+            response = await self.async_client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": "Eres un experto en validación cruzada de datos de documentos."},
+                    {"role": "system", "content": system_prompt},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.1,
-                max_tokens=2000
+                max_tokens=max_tokens
             )
-            
+
             result_text = response.choices[0].message.content.strip()
             cost = self._calculate_cost(response.usage)
-            
+
             try:
                 # Limpiar la respuesta para extraer solo el JSON
-                result_text = result_text.strip()
-                
-                # Si la respuesta contiene markdown, extraer solo el JSON
                 if "```json" in result_text:
                     start = result_text.find("```json") + 7
                     end = result_text.find("```", start)
@@ -547,18 +950,95 @@ class DocumentAIService:
                     end = result_text.find("```", start)
                     if end != -1:
                         result_text = result_text[start:end].strip()
-                
-                result = json.loads(result_text)
-                return result, cost
+
+                return json.loads(result_text), cost
             except json.JSONDecodeError as e:
-                logger.error(f"Error al parsear validación cruzada: {e}")
+                logger.error(f"Error al parsear {error_label}: {e}")
                 logger.error(f"Respuesta recibida: {result_text[:500]}...")
-                return {"validaciones_cruzadas": [], "campos_faltantes": [], "resumen": {}}, cost
-                
+                return dict(fallback), cost
+
         except Exception as e:
-            logger.error(f"Error en validación cruzada: {e}")
-            return {"validaciones_cruzadas": [], "campos_faltantes": [], "resumen": {}}, 0.0
-    
+            logger.error(f"Error en {error_label}: {e}")
+            return dict(fallback), 0.0
+
+    async def avalidate_general_rules(
+        self,
+        document_data: Dict[str, Any],
+        general_rules: Union[str, List[Dict[str, Any]]],
+        document_type: str
+    ) -> Tuple[Dict[str, Any], float]:
+        """Variante asíncrona de validate_general_rules (mismo prompt y formato)"""
+        return await self._achat_json(
+            "Eres un experto en validación de reglas generales para documentos.",
+            self._build_general_rules_prompt(document_data, general_rules),
+            fallback={"validaciones_detalladas": []},
+            error_label="validación de reglas generales",
+        )
+
+    async def avalidate_cross_validation_rules(
+        self,
+        document_data: Dict[str, Any],
+        user_data: Dict[str, Any],
+        validation_rules: Union[str, List[Dict[str, Any]]],
+        document_type: str
+    ) -> Tuple[Dict[str, Any], float]:
+        """Variante asíncrona de validate_cross_validation_rules (mismo prompt y formato)"""
+        return await self._achat_json(
+            "Eres un experto en validación cruzada de documentos.",
+            self._build_cross_validation_prompt(document_data, user_data, validation_rules),
+            fallback={"validaciones_detalladas": []},
+            error_label="validación cruzada",
+        )
+
+    async def adynamic_user_data_validation(
+        self,
+        document_data: Dict[str, Any],
+        user_data: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], float]:
+        """Variante asíncrona de dynamic_user_data_validation (mismo prompt y formato)"""
+        return await self._achat_json(
+            "Eres un experto en validación cruzada de datos de documentos.",
+            self._build_dynamic_validation_prompt(document_data, user_data),
+            fallback={"validaciones_cruzadas": [], "campos_faltantes": [], "resumen": {}},
+            error_label="validación cruzada",
+        )
+
+    async def avalidate_all_rules(
+        self,
+        document_data: Dict[str, Any],
+        user_data: Optional[Dict[str, Any]],
+        general_rules: Optional[Union[str, List[Dict[str, Any]]]],
+        validation_rules: Optional[Union[str, List[Dict[str, Any]]]],
+        document_type: str
+    ) -> Tuple[Dict[str, Any], float]:
+        """Variante asíncrona de validate_all_rules (validación combinada)"""
+        prompt = self._build_validate_all_rules_prompt(
+            document_data, user_data, general_rules, validation_rules, document_type
+        )
+        if prompt is None:
+            return {k: list(v) for k, v in self._EMPTY_COMBINED_VALIDATION.items()}, 0.0
+
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "Eres un experto en validación de reglas para documentos."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.1,
+                max_tokens=3000
+            )
+
+            result_text = response.choices[0].message.content.strip()
+            cost = self._calculate_cost(response.usage)
+
+            return self._parse_combined_validation(result_text), cost
+
+        except Exception as e:
+            # Misma semántica que validate_all_rules: el fallo se propaga
+            logger.error(f"Error en validación combinada de reglas: {e}")
+            raise
+
     def _truncate_ocr_text(self, ocr_text: str, max_chars: int = 8000) -> str:
         """
         Trunca el texto OCR para reducir el tamaño de los prompts.
@@ -603,7 +1083,7 @@ class DocumentAIService:
         description = document_type_config.get("description", "")
         extraction_schema = document_type_config.get("extraction_schema", {})
         
-        schema_str = json.dumps(extraction_schema, indent=2, ensure_ascii=False, default=str)
+        schema_str = dumps_pretty(extraction_schema)
         
         # Truncar texto OCR para optimizar
         truncated_ocr = self._truncate_ocr_text(ocr_text)
@@ -781,7 +1261,7 @@ class DocumentAIService:
         description = document_type_config.get("description", "")
         extraction_schema = document_type_config.get("extraction_schema", {})
         
-        schema_str = json.dumps(extraction_schema, indent=2, ensure_ascii=False, default=str)
+        schema_str = dumps_pretty(extraction_schema)
         
         # Truncar texto OCR para optimizar
         truncated_ocr = self._truncate_ocr_text(ocr_text)
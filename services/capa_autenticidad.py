@@ -63,6 +63,15 @@ DEFAULT_AUTHENTICITY_CONFIG = {
     "enabled": True,
     "checks": DEFAULT_AUTHENTICITY_CHECKS,
 }
+# Tipos MIME esperados por extensión (frozenset para membership O(1) sin reconstruir por llamada)
+_EXPECTED_MIME = {
+    ".pdf": frozenset({"application/pdf"}),
+    ".jpg": frozenset({"image/jpeg"}),
+    ".jpeg": frozenset({"image/jpeg"}),
+    ".png": frozenset({"image/png"}),
+    ".tiff": frozenset({"image/tiff"}),
+    ".tif": frozenset({"image/tiff"}),
+}
 
 
 def ejecutar_capa_autenticidad(
@@ -100,13 +109,13 @@ def ejecutar_capa_autenticidad(
         # Si no hay extensión, permitir continuar (se validará al procesar el contenido)
         _, ext = os.path.splitext(file_name.lower())
         if not ext:
-            logger.info(f"Archivo sin extensión visible: {file_name}. Se validará por contenido.")
+            logger.info("Archivo sin extensión visible: %s. Se validará por contenido.", file_name)
         else:
-            logger.error(f"Archivo con extensión no soportada: {file_name}. {exc}")
+            logger.error("Archivo con extensión no soportada: %s. %s", file_name, exc)
             raise
 
     set_stage("authenticity")
-    logger.info(f"Iniciando verificación de autenticidad para documento {processed_doc['document_id']}")
+    logger.info("Iniciando verificación de autenticidad para documento %s", processed_doc['document_id'])
 
     signals: List[str] = []
     severity = "PASSED"
@@ -146,7 +155,7 @@ def ejecutar_capa_autenticidad(
                 severity = _combinar_severidad(severity, metadata["result"])
 
     except Exception as exc:  # pragma: no cover - última línea de defensa
-        logger.error(f"Error inesperado en capa de autenticidad: {exc}")
+        logger.error("Error inesperado en capa de autenticidad: %s", exc)
         signals.append("authenticity_unexpected_error")
         severity = "FAILED"
 
@@ -178,23 +187,15 @@ def _verificar_consistencia_archivo(
         response = requests.head(file_url, timeout=10)
         response.raise_for_status()
     except requests.RequestException as exc:
-        logger.warning(f"No se pudo obtener cabeceras del archivo: {exc}")
+        logger.warning("No se pudo obtener cabeceras del archivo: %s", exc)
         return {"result": "WARNING", "signals": ["head_request_failed"]}
 
     content_type = response.headers.get("content-type", "").lower()
     size_header = response.headers.get("content-length")
     extension = os.path.splitext(file_name)[1].lower()
 
-    expected_types = {
-        ".pdf": ["application/pdf"],
-        ".jpg": ["image/jpeg"],
-        ".jpeg": ["image/jpeg"],
-        ".png": ["image/png"],
-        ".tiff": ["image/tiff"],
-        ".tif": ["image/tiff"],
-    }
-
-    if extension in expected_types and content_type not in expected_types[extension]:
+    allowed_types = _EXPECTED_MIME.get(extension)
+    if allowed_types and content_type not in allowed_types:
         signals.append(f"mime_mismatch:{extension}:{content_type or 'unknown'}")
         severity = _combinar_severidad(severity, "WARNING")
 
@@ -223,7 +224,7 @@ def _analizar_metadatos_imagen(
         response = requests.get(file_url, timeout=15)
         response.raise_for_status()
     except requests.RequestException as exc:
-        logger.warning(f"No se pudo descargar imagen para análisis EXIF: {exc}")
+        logger.warning("No se pudo descargar imagen para análisis EXIF: %s", exc)
         return {"result": "WARNING", "signals": ["image_download_failed"]}
 
     signals: List[str] = []
@@ -234,7 +235,7 @@ def _analizar_metadatos_imagen(
         with Image.open(BytesIO(data)) as img:
             exif_data = img.getexif()
     except Exception as exc:
-        logger.warning(f"No se pudo leer EXIF de la imagen: {exc}")
+        logger.warning("No se pudo leer EXIF de la imagen: %s", exc)
         return {"result": "WARNING", "signals": ["exif_parse_error"]}
 
     if not exif_data:
@@ -264,6 +265,47 @@ def _analizar_metadatos_imagen(
     return {"result": severity, "signals": signals}
 
 
+# Bytes a pedir del final del PDF (trailer con /Producer y /Creator) y del inicio
+# (/Info en PDFs linearizados) cuando el servidor soporta Range requests.
+_PDF_TAIL_RANGE_BYTES = 32768
+_PDF_HEAD_RANGE_BYTES = 2048
+
+
+def _descargar_pdf_para_metadatos(file_url: str) -> bytes:
+    """
+    Descarga solo las regiones del PDF relevantes para metadatos usando HTTP Range.
+
+    Los nombres de editor viven en el trailer (/Producer, /Creator) al final del
+    archivo, y en PDFs linearizados el objeto /Info puede estar cerca del inicio.
+    Si el servidor no soporta Range (responde 200 en lugar de 206), se usa el
+    cuerpo completo como antes.
+    """
+    tail_response = requests.get(
+        file_url,
+        headers={"Range": f"bytes=-{_PDF_TAIL_RANGE_BYTES}"},
+        timeout=10,
+    )
+    tail_response.raise_for_status()
+
+    if tail_response.status_code != 206:
+        # Sin soporte de Range: ya tenemos el archivo completo
+        return tail_response.content
+
+    content = tail_response.content
+    try:
+        head_response = requests.get(
+            file_url,
+            headers={"Range": f"bytes=0-{_PDF_HEAD_RANGE_BYTES - 1}"},
+            timeout=10,
+        )
+        head_response.raise_for_status()
+        content = head_response.content + content
+    except requests.RequestException as exc:
+        logger.debug("No se pudo obtener el inicio del PDF vía Range: %s", exc)
+
+    return content
+
+
 def _analizar_metadatos_pdf(
     file_url: str,
     *,
@@ -271,14 +313,13 @@ def _analizar_metadatos_pdf(
     editors: Optional[Iterable[str]] = None,
 ) -> Dict[str, Any]:
     try:
-        response = requests.get(file_url, timeout=15)
-        response.raise_for_status()
+        raw_content = _descargar_pdf_para_metadatos(file_url)
     except requests.RequestException as exc:
-        logger.warning(f"No se pudo descargar PDF para análisis de metadatos: {exc}")
+        logger.warning("No se pudo descargar PDF para análisis de metadatos: %s", exc)
         return {"result": "WARNING", "signals": ["pdf_download_failed"]}
 
     try:
-        content = response.content.decode("utf-8", errors="ignore")
+        content = raw_content.decode("utf-8", errors="ignore")
     except Exception:
         content = ""
 
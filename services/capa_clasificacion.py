@@ -27,6 +27,18 @@ def ejecutar_capa_clasificacion(
 
         # Obtener tipos de documentos disponibles
         available_types = list(document_types_collection.find({"is_active": True}))
+        types_by_name = {doc_type.get("name"): doc_type for doc_type in available_types}
+
+        # Si la clasificación proporcionada corresponde a un tipo configurado,
+        # la clasificación es redundante: validar el tipo y extraer en una sola
+        # llamada combinada, ahorrando una ida y vuelta completa al LLM.
+        if provided_classification and provided_classification in types_by_name:
+            return _verificar_y_extraer_tipo_conocido(
+                context=context,
+                document_type=types_by_name[provided_classification],
+                ai_service=ai_service,
+                ocr_text=ocr_text,
+            )
 
         # Verificar clasificación con IA
         classification_result, ai_cost = ai_service.verify_document_classification(
@@ -84,16 +96,82 @@ def ejecutar_capa_clasificacion(
             doc_id=processed_doc["document_id"],
         )
 
-        logger.info(f"Clasificación y extracción completadas para documento {processed_doc['document_id']}")
+        logger.info("Clasificación y extracción completadas para documento %s", processed_doc['document_id'])
         return context
 
     except Exception as e:
         set_stage("classification_error")
-        logger.error(f"Error en clasificación: {e}")
+        logger.error("Error en clasificación: %s", e)
         context["processing_log"].append(f"Error en clasificación: {str(e)}")
         raise
 
 
+def _verificar_y_extraer_tipo_conocido(
+    context: Dict[str, Any],
+    document_type: Dict[str, Any],
+    ai_service: Any,
+    ocr_text: str,
+) -> Dict[str, Any]:
+    """
+    Valida el tipo proporcionado y extrae los datos en una sola llamada combinada.
+    Se usa cuando la clasificación proporcionada ya es un tipo configurado.
+    """
+    processed_doc = context["processed_doc"]
+    document_type_name = document_type["name"]
+
+    combined_result, combined_cost = ai_service.verify_and_extract_document(
+        ocr_text, document_type_name, document_type
+    )
+
+    context["total_cost"] += combined_cost
+    context["classification_result"] = {
+        "is_correct": combined_result.get("is_correct_type", False),
+        "document_type": document_type_name,
+        "confidence": combined_result.get("confidence"),
+        "reason": combined_result.get("reason"),
+        "suggested_type": None,
+    }
+    context["processing_log"].append(
+        f"Clasificación proporcionada coincide con tipo configurado; "
+        f"validación y extracción combinadas. Costo: ${combined_cost:.6f}"
+    )
+
+    if not combined_result.get("is_correct_type", False):
+        context["final_decision"] = FinalDecision.REJECTED
+        context["rejection_reasons"].append(
+            {
+                "reason": "El documento no corresponde al tipo esperado",
+                "provided": document_type_name,
+                "suggested": None,
+                "ai_reason": combined_result.get("reason"),
+            }
+        )
+        context["processing_log"].append(
+            f"Clasificación rechazada: {combined_result.get('reason')}"
+        )
+        logger.warning(
+            f"Documento {processed_doc['document_id']} no corresponde al tipo esperado "
+            f"'{document_type_name}': {combined_result.get('reason')}"
+        )
+        return context
+
+    extracted_data = combined_result.get("extracted_data") or {}
+    context["extracted_data"] = extracted_data
+    context["document_type_config"] = document_type
+    context["document_type_id"] = document_type["_id"]
+    context["document_type_name"] = document_type_name
+    context["processing_log"].append("Extracción de datos completada (método combinado)")
+
+    if not extracted_data:
+        logger.warning("No se pudieron extraer datos del documento %s", processed_doc['document_id'])
+        context["processing_log"].append("Advertencia: No se pudieron extraer datos del documento")
+
+    logger.info(
+        f"Clasificación y extracción combinadas completadas para documento {processed_doc['document_id']}"
+    )
+    return context
+
+
 def _procesar_extraccion(
     context: Dict[str, Any],
     document_type: Dict[str, Any],
@@ -114,11 +192,11 @@ def _procesar_extraccion(
         context["processing_log"].append(f"Extracción de datos completada. Costo: ${extraction_cost:.6f}")
 
         if not extracted_data or len(extracted_data) == 0:
-            logger.warning(f"No se pudieron extraer datos del documento {doc_id}")
+            logger.warning("No se pudieron extraer datos del documento %s", doc_id)
             context["processing_log"].append("Advertencia: No se pudieron extraer datos del documento")
 
     except Exception as e:
-        logger.error(f"Error en extracción de datos para documento {doc_id}: {e}")
+        logger.error("Error en extracción de datos para documento %s: %s", doc_id, e)
         context["processing_log"].append(f"Error en extracción de datos: {str(e)}")
         context["extracted_data"] = {}
         context["document_type_config"] = document_type
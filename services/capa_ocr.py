@@ -31,12 +31,12 @@ def ejecutar_capa_ocr(
         context["total_cost"] += ocr_cost
         context["processing_log"].append(f"OCR completado. Costo: ${ocr_cost:.6f}")
 
-        logger.info(f"OCR completado para documento {processed_doc['document_id']}")
+        logger.info("OCR completado para documento %s", processed_doc['document_id'])
         return context
 
     except Exception as e:
         set_stage("ocr_error")
-        logger.error(f"Error en OCR: {e}")
+        logger.error("Error en OCR: %s", e)
         context["processing_log"].append(f"Error en OCR: {str(e)}")
         raise
 
@@ -1,11 +1,23 @@
+import asyncio
 import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from operator import methodcaller
 from typing import Any, Dict, Callable, List
 
-from models.document_models import ProcessingStatus
+from models.document_models import ProcessingStatus, FinalDecision
+from services.rule_prompt_cache import get_compiled_rules
+from services.validation_cache import make_cache_key, validation_cache
+from utils.json_utils import dumps_compact
 from utils.logging_utils import set_stage
 
 logger = logging.getLogger(__name__)
 
+# Máximo de validaciones LLM concurrentes por documento (I/O-bound en HTTP)
+_MAX_VALIDATION_WORKERS = 4
+
 
 def ejecutar_capa_validacion(
     context: Dict[str, Any],
@@ -25,89 +37,105 @@ def ejecutar_capa_validacion(
         set_stage("validation")
         update_processing_status(processed_doc["_id"], ProcessingStatus.VALIDATION)
 
-        validation_results: List[Dict[str, Any]] = []
+        # Lock para proteger las mutaciones de contexto compartido
+        # (total_cost, processing_log, rejection_reasons) entre validaciones concurrentes
+        context["_ctx_lock"] = threading.Lock()
 
-        # Validar reglas del documento original
-        if document_type_config.get("general_rules"):
-            validation_results.extend(
-                _validar_reglas_generales(
-                    context=context,
-                    ai_service=ai_service,
-                    extracted_data=extracted_data,
-                    document_type_config=document_type_config,
-                    document_source="original",  # Marcar origen
-                )
-            )
+        validation_results: List[Dict[str, Any]] = []
 
-        if document_type_config.get("validation_rules") and user_data:
-            validation_results.extend(
-                _validar_reglas_cruzadas(
-                    context=context,
-                    ai_service=ai_service,
-                    extracted_data=extracted_data,
-                    user_data=user_data,
-                    document_type_config=document_type_config,
-                    document_source="original",  # Marcar origen
-                )
-            )
-        elif user_data and not document_type_config.get("validation_rules"):
-            validation_results.extend(
-                _validacion_dinamica(
-                    context=context, 
-                    ai_service=ai_service, 
-                    extracted_data=extracted_data, 
-                    user_data=user_data,
-                    document_source="original"  # Marcar origen
-                )
+        # Construir las validaciones por origen de documento. Las tareas de un
+        # mismo origen (generales, cruzadas/dinámicas) son llamadas LLM
+        # independientes y siempre se ejecutan en paralelo entre sí.
+        task_groups: List[List[Callable[[], List[Dict[str, Any]]]]] = [
+            _construir_tareas_validacion(
+                context=context,
+                ai_service=ai_service,
+                extracted_data=extracted_data,
+                user_data=user_data,
+                document_type_config=document_type_config,
+                document_source="original",
             )
+        ]
 
         # Si hay documento descargado del portal, también validar sus reglas
         download_info = context.get("download_info")
         extracted_data_downloaded = None
         if download_info:
             extracted_data_downloaded = download_info.get("extracted_data_downloaded")
-        
+
+        clonar_descargado = False
         if extracted_data_downloaded and document_type_config:
-            logger.info("Validando reglas del documento descargado del portal")
-            
-            # Validar reglas generales del documento descargado
-            if document_type_config.get("general_rules"):
-                validation_results.extend(
-                    _validar_reglas_generales(
-                        context=context,
-                        ai_service=ai_service,
-                        extracted_data=extracted_data_downloaded,
-                        document_type_config=document_type_config,
-                        document_source="downloaded",  # Marcar origen
-                    )
+            # Si el documento descargado no aporta campos distintos al original,
+            # repetir las mismas validaciones sería duplicar llamadas LLM
+            diff = {
+                k: v
+                for k, v in extracted_data_downloaded.items()
+                if extracted_data.get(k) != v
+            }
+            if not diff:
+                clonar_descargado = True
+                logger.info(
+                    "Documento descargado idéntico al original; se reutilizan las validaciones"
                 )
-            
-            # Validar reglas cruzadas del documento descargado
-            if document_type_config.get("validation_rules") and user_data:
-                validation_results.extend(
-                    _validar_reglas_cruzadas(
-                        context=context,
-                        ai_service=ai_service,
-                        extracted_data=extracted_data_downloaded,
-                        user_data=user_data,
-                        document_type_config=document_type_config,
-                        document_source="downloaded",  # Marcar origen
-                    )
+                context["processing_log"].append(
+                    "Validación del documento descargado omitida: datos idénticos al original. "
+                    "Se clonan los resultados de la validación original."
                 )
-            elif user_data and not document_type_config.get("validation_rules"):
-                validation_results.extend(
-                    _validacion_dinamica(
+            else:
+                logger.info("Validando reglas del documento descargado del portal")
+                task_groups.append(
+                    _construir_tareas_validacion(
                         context=context,
                         ai_service=ai_service,
                         extracted_data=extracted_data_downloaded,
                         user_data=user_data,
-                        document_source="downloaded"  # Marcar origen
+                        document_type_config=_filtrar_config_por_campos(
+                            document_type_config, diff.keys(), context
+                        ),
+                        document_source="downloaded",
                     )
                 )
 
+        # Modo fail_fast (por defecto): ejecutar origen por origen y cortar al
+        # primer origen con rechazos, ahorrando las llamadas LLM del siguiente.
+        # Las tareas dentro de un origen se paralelizan igual en ambos modos.
+        # Con fail_fast deshabilitado, ejecutar todos los orígenes en paralelo.
+        fail_fast = document_type_config.get("fail_fast", True)
+
+        if fail_fast:
+            for i, group in enumerate(task_groups):
+                group_validations = _ejecutar_tareas(group)
+                validation_results.extend(group_validations)
+                if _grupo_tiene_rechazos(group_validations):
+                    context["final_decision"] = FinalDecision.REJECTED
+                    restantes = sum(len(g) for g in task_groups[i + 1:])
+                    if restantes:
+                        context["processing_log"].append(
+                            f"Validación detenida (fail_fast): rechazo encontrado; "
+                            f"se omiten {restantes} grupo(s) de validación restante(s)."
+                        )
+                        logger.info(
+                            "fail_fast: rechazo en validación; se omiten %s grupo(s) restante(s)", restantes
+                        )
+                    context["validation_results"] = validation_results
+                    logger.info("Validación completada para documento %s", processed_doc["document_id"])
+                    return context
+        else:
+            validation_results.extend(
+                _ejecutar_tareas([task for group in task_groups for task in group])
+            )
+
+        if clonar_descargado:
+            clones = [
+                dict(validation, document_source="downloaded")
+                for validation in validation_results
+                if validation.get("document_source") == "original"
+            ]
+            validation_results.extend(clones)
+
         context["validation_results"] = validation_results
 
-        logger.info(f"Validación completada para documento {processed_doc['document_id']}")
+        logger.info("Validación completada para documento %s", processed_doc["document_id"])
         return context
 
     except Exception as e:
@@ -117,6 +145,415 @@ def ejecutar_capa_validacion(
         raise
 
 
+async def aejecutar_capa_validacion(
+    context: Dict[str, Any],
+    ai_service: Any,
+    update_processing_status: Callable[[Any, ProcessingStatus], None],
+) -> Dict[str, Any]:
+    """
+    Variante asíncrona de la capa de validación para llamadores sobre un event
+    loop (endpoints FastAPI). Delega la orquestación síncrona a un hilo para no
+    bloquear el loop; el paralelismo entre llamadas LLM ya lo aporta la capa.
+    Para llamadas LLM individuales desde código async, DocumentAIService expone
+    además las variantes avalidate_*.
+    """
+    return await asyncio.to_thread(
+        ejecutar_capa_validacion, context, ai_service, update_processing_status
+    )
+
+
+def _ejecutar_tareas(
+    tasks: List[Callable[[], List[Dict[str, Any]]]]
+) -> List[Dict[str, Any]]:
+    """
+    Ejecuta un conjunto de tareas de validación y devuelve sus resultados
+    concatenados. Con una sola tarea la llama directamente; con varias las
+    lanza en paralelo (cada una es una llamada LLM limitada por latencia HTTP).
+    """
+    if not tasks:
+        return []
+    if len(tasks) == 1:
+        return tasks[0]()
+
+    results: List[Dict[str, Any]] = []
+    with ThreadPoolExecutor(max_workers=min(len(tasks), _MAX_VALIDATION_WORKERS)) as executor:
+        futures = [executor.submit(task) for task in tasks]
+        for future in as_completed(futures):
+            results.extend(future.result())
+    return results
+
+
+def _etiquetar_origen(
+    validations: List[Dict[str, Any]], document_source: str
+) -> List[Dict[str, Any]]:
+    """
+    Marca in-place el origen del documento en cada validación. El bucle corre
+    en C (map + deque de consumo, receta "consume" de itertools) en lugar de
+    iterar dict por dict a nivel Python.
+    """
+    deque(
+        map(methodcaller("__setitem__", "document_source", document_source), validations),
+        maxlen=0,
+    )
+    return validations
+
+
+def _grupo_tiene_rechazos(validations: List[Dict[str, Any]]) -> bool:
+    """
+    Indica si un grupo de validaciones recién ejecutado contiene algún rechazo
+    (reglas con resultado distinto de APROBADO). Solo se miran los mismos
+    criterios que alimentan rejection_reasons: una comparación dinámica sin
+    coincidencia no rechaza por sí sola, y cortar por ella aquí haría que la
+    decisión final dependiera de si fail_fast está habilitado.
+    """
+    for validation in validations:
+        if "resultado" in validation and validation.get("resultado") != "APROBADO":
+            return True
+    return False
+
+
+def _persistir_validaciones(
+    context: Dict[str, Any], validations: List[Dict[str, Any]], cost: float
+) -> bool:
+    """
+    Persiste incrementalmente un grupo de validaciones recién calculado, si el
+    servicio registró un callback de persistencia en el contexto. Devuelve True
+    si el costo quedó acumulado server-side (vía $inc): en ese caso el llamador
+    NO debe sumarlo también a context["total_cost"], para no contarlo dos veces
+    en la escritura final. Los errores no interrumpen el pipeline.
+    """
+    persist = context.get("_persist")
+    if not persist or not validations:
+        return False
+    try:
+        persist(validations, cost)
+        return True
+    except Exception as exc:
+        logger.warning("No se pudieron persistir validaciones incrementalmente: %s", exc)
+        return False
+
+
+def _obtener_ctx_lock(context: Dict[str, Any]) -> threading.Lock:
+    """Devuelve el lock del contexto, creándolo si los helpers se usan de forma aislada."""
+    lock = context.get("_ctx_lock")
+    if lock is None:
+        lock = threading.Lock()
+        context["_ctx_lock"] = lock
+    return lock
+
+
+def _construir_tareas_validacion(
+    context: Dict[str, Any],
+    ai_service: Any,
+    extracted_data: Dict[str, Any],
+    user_data: Any,
+    document_type_config: Dict[str, Any],
+    document_source: str,
+) -> List[Callable[[], List[Dict[str, Any]]]]:
+    """
+    Construye las validaciones de un origen de documento como callables sin argumentos,
+    listos para ejecutarse en paralelo.
+    """
+    tasks: List[Callable[[], List[Dict[str, Any]]]] = []
+
+    # Pre-filtrado local: las reglas cuyos campos declarados no están en los
+    # datos extraídos fallarían igual en el LLM; rechazarlas aquí ahorra tokens
+    document_type_config, prefallos = _prefiltrar_reglas_por_campos(
+        document_type_config, extracted_data, document_source
+    )
+    if prefallos:
+        tasks.append(
+            lambda: _aplicar_prefallos(context, prefallos, document_source)
+        )
+
+    # Modo combinado: una sola llamada LLM por origen de documento en lugar de 2-3
+    use_combined = os.getenv("USE_COMBINED_VALIDATION", "true").lower() == "true"
+    if use_combined and hasattr(ai_service, "validate_all_rules"):
+        has_rules = bool(
+            document_type_config.get("general_rules")
+            or (user_data and document_type_config.get("validation_rules"))
+            or user_data
+        )
+        if has_rules:
+            tasks.append(
+                lambda: _validar_reglas_combinadas(
+                    context=context,
+                    ai_service=ai_service,
+                    extracted_data=extracted_data,
+                    user_data=user_data,
+                    document_type_config=document_type_config,
+                    document_source=document_source,
+                )
+            )
+        return tasks
+
+    if document_type_config.get("general_rules"):
+        tasks.append(
+            lambda: _validar_reglas_generales(
+                context=context,
+                ai_service=ai_service,
+                extracted_data=extracted_data,
+                document_type_config=document_type_config,
+                document_source=document_source,
+            )
+        )
+
+    if document_type_config.get("validation_rules") and user_data:
+        tasks.append(
+            lambda: _validar_reglas_cruzadas(
+                context=context,
+                ai_service=ai_service,
+                extracted_data=extracted_data,
+                user_data=user_data,
+                document_type_config=document_type_config,
+                document_source=document_source,
+            )
+        )
+    elif user_data and not document_type_config.get("validation_rules"):
+        tasks.append(
+            lambda: _validacion_dinamica(
+                context=context,
+                ai_service=ai_service,
+                extracted_data=extracted_data,
+                user_data=user_data,
+                document_source=document_source,
+            )
+        )
+
+    return tasks
+
+
+def _filtrar_config_por_campos(
+    document_type_config: Dict[str, Any],
+    campos_distintos: Any,
+    context: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Devuelve una copia de la configuración del tipo de documento donde las reglas
+    que declaran `fields_used` y no tocan ningún campo distinto quedan fuera.
+    Las reglas sin `fields_used` se conservan siempre (comportamiento previo).
+    """
+    campos = set(campos_distintos)
+    filtered_config = dict(document_type_config)
+    # Las reglas filtradas son específicas de este documento: evitar que la
+    # caché de prompts las confunda con las reglas completas del tipo
+    filtered_config["_rules_filtered"] = True
+    total_omitidas = 0
+
+    for rules_key in ("general_rules", "validation_rules"):
+        rules = document_type_config.get(rules_key)
+        if not rules:
+            continue
+        kept = [
+            rule
+            for rule in rules
+            if not rule.get("fields_used") or campos.intersection(rule["fields_used"])
+        ]
+        total_omitidas += len(rules) - len(kept)
+        filtered_config[rules_key] = kept
+
+    if total_omitidas:
+        context["processing_log"].append(
+            f"Validación del documento descargado: {total_omitidas} regla(s) omitida(s) "
+            f"porque sus campos no difieren del original."
+        )
+
+    return filtered_config
+
+
+def _prefiltrar_reglas_por_campos(
+    document_type_config: Dict[str, Any],
+    extracted_data: Dict[str, Any],
+    document_source: str,
+) -> tuple:
+    """
+    Separa las reglas aplicables de las que declaran `fields_used` con campos
+    ausentes en los datos extraídos. Devuelve (config con solo reglas
+    aplicables, validaciones auto-rechazadas para las reglas no evaluables).
+    Las reglas sin `fields_used` se envían siempre al LLM (comportamiento previo).
+    """
+    prefallos: List[Dict[str, Any]] = []
+    filtered_config = None
+
+    for rules_key in ("general_rules", "validation_rules"):
+        rules = document_type_config.get(rules_key)
+        if not rules:
+            continue
+
+        applicable = []
+        for rule in rules:
+            fields = rule.get("fields_used")
+            faltantes = [f for f in fields if f not in extracted_data] if fields else []
+            if not faltantes:
+                applicable.append(rule)
+                continue
+            prefallos.append(
+                {
+                    "nombre_regla": rule.get("name") or rule.get("nombre_regla"),
+                    "resultado": "RECHAZADO",
+                    "razon": (
+                        f"Regla no evaluable: campos ausentes en los datos extraídos: "
+                        f"{', '.join(faltantes)}"
+                    ),
+                    "document_source": document_source,
+                }
+            )
+
+        if len(applicable) != len(rules):
+            if filtered_config is None:
+                # Copia específica de este documento: no debe contaminar la
+                # caché de prompts del tipo
+                filtered_config = dict(document_type_config)
+                filtered_config["_rules_filtered"] = True
+            filtered_config[rules_key] = applicable
+
+    return filtered_config or document_type_config, prefallos
+
+
+def _aplicar_prefallos(
+    context: Dict[str, Any],
+    prefallos: List[Dict[str, Any]],
+    document_source: str,
+) -> List[Dict[str, Any]]:
+    """
+    Registra las reglas auto-rechazadas por campos ausentes (sin llamada LLM):
+    razones de rechazo, log de procesamiento y persistencia incremental.
+    """
+    with _obtener_ctx_lock(context):
+        context["processing_log"].append(
+            f"{len(prefallos)} regla(s) rechazada(s) localmente por campos ausentes "
+            f"({document_source}). Sin costo LLM."
+        )
+        context["rejection_reasons"].extend(
+            {
+                "reason": "Regla no evaluable: campos ausentes en el documento",
+                "rule": v.get("nombre_regla"),
+                "details": v.get("razon"),
+                "type": "missing_field_precheck",
+                "document_source": document_source,
+            }
+            for v in prefallos
+        )
+
+    _persistir_validaciones(context, prefallos, 0.0)
+
+    return prefallos
+
+
+def _validar_reglas_combinadas(
+    context: Dict[str, Any],
+    ai_service: Any,
+    extracted_data: Dict[str, Any],
+    user_data: Any,
+    document_type_config: Dict[str, Any],
+    document_source: str = "original",
+) -> List[Dict[str, Any]]:
+    """
+    Valida reglas generales, cruzadas y dinámicas en una sola llamada LLM y
+    reparte el resultado con el mismo etiquetado y razones de rechazo que los
+    helpers separados.
+    """
+    cache_key = make_cache_key(
+        kind="combined",
+        rules=document_type_config.get("general_rules"),
+        cross_rules=document_type_config.get("validation_rules") if user_data else None,
+        rules_version=document_type_config.get("rules_version"),
+        data=extracted_data,
+        user=user_data,
+    )
+    (combined_result, combined_cost), from_cache = validation_cache.get_or_compute(
+        cache_key,
+        lambda: ai_service.validate_all_rules(
+            extracted_data,
+            user_data,
+            get_compiled_rules(document_type_config, "general_rules"),
+            get_compiled_rules(document_type_config, "validation_rules") if user_data else None,
+            document_type_config["name"],
+        ),
+    )
+    if from_cache:
+        combined_cost = 0.0
+
+    return aplicar_resultado_combinado(
+        context=context,
+        combined_result=combined_result,
+        combined_cost=combined_cost,
+        document_source=document_source,
+        from_cache=from_cache,
+    )
+
+
+def aplicar_resultado_combinado(
+    context: Dict[str, Any],
+    combined_result: Dict[str, Any],
+    combined_cost: float,
+    document_source: str = "original",
+    from_cache: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Reparte el resultado de una validación combinada (síncrona o vía Batch API)
+    en validaciones etiquetadas por origen y razones de rechazo del contexto.
+    """
+    general_validations = combined_result.get("validaciones_generales", [])
+    cross_validations = combined_result.get("validaciones_cruzadas", [])
+    dynamic_validations = combined_result.get("validaciones_dinamicas", [])
+    campos_faltantes = combined_result.get("campos_faltantes", [])
+
+    all_validations = general_validations + cross_validations + dynamic_validations
+
+    # Agregar información del origen del documento a cada validación
+    _etiquetar_origen(all_validations, document_source)
+
+    rejection_reasons: List[Dict[str, Any]] = []
+    rejection_reasons.extend(
+        {
+            "reason": "Regla general fallida",
+            "rule": v.get("nombre_regla"),
+            "details": v.get("razon"),
+            "type": "general",
+            "document_source": document_source,  # Marcar origen
+        }
+        for v in general_validations
+        if v.get("resultado") != "APROBADO"
+    )
+    rejection_reasons.extend(
+        {
+            "reason": "Validación cruzada fallida",
+            "rule": v.get("nombre_regla"),
+            "details": v.get("razon"),
+            "type": "cross_validation",
+            "document_source": document_source,  # Marcar origen
+        }
+        for v in cross_validations
+        if v.get("resultado") != "APROBADO"
+    )
+    if campos_faltantes:
+        rejection_reasons.append(
+            {
+                "reason": "Campos del usuario no encontrados en documento",
+                "campos_faltantes": campos_faltantes,
+                "type": "missing_fields",
+                "document_source": document_source,  # Marcar origen
+            }
+        )
+
+    # El costo se acumula server-side ($inc) cuando hay persistencia
+    # incremental; solo si no la hay se suma al contexto
+    persisted = _persistir_validaciones(context, all_validations, combined_cost)
+
+    with _obtener_ctx_lock(context):
+        if not persisted:
+            context["total_cost"] += combined_cost
+        context["processing_log"].append(
+            f"Validación combinada de reglas completada ({document_source})"
+            f"{' (caché)' if from_cache else ''}. Costo: ${combined_cost:.6f}"
+        )
+        if rejection_reasons:
+            context["rejection_reasons"].extend(rejection_reasons)
+
+    return all_validations
+
+
 def _validar_reglas_generales(
     context: Dict[str, Any],
     ai_service: Any,
@@ -124,34 +561,50 @@ def _validar_reglas_generales(
     document_type_config: Dict[str, Any],
     document_source: str = "original",
 ) -> List[Dict[str, Any]]:
-    general_rules_result, general_cost = ai_service.validate_general_rules(
-        extracted_data, document_type_config["general_rules"], document_type_config["name"]
+    cache_key = make_cache_key(
+        kind="general",
+        rules=document_type_config["general_rules"],
+        rules_version=document_type_config.get("rules_version"),
+        data=extracted_data,
     )
+    (general_rules_result, general_cost), from_cache = validation_cache.get_or_compute(
+        cache_key,
+        lambda: ai_service.validate_general_rules(
+            extracted_data,
+            get_compiled_rules(document_type_config, "general_rules"),
+            document_type_config["name"],
+        ),
+    )
+    if from_cache:
+        general_cost = 0.0
 
-    context["total_cost"] += general_cost
     general_validations = general_rules_result.get("validaciones_detalladas", [])
-    
+
     # Agregar información del origen del documento a cada validación
-    for validation in general_validations:
-        validation["document_source"] = document_source
-    
-    context["processing_log"].append(
-        f"Validación de reglas generales completada ({document_source}). Costo: ${general_cost:.6f}"
-    )
+    _etiquetar_origen(general_validations, document_source)
 
-    failed_general = [v for v in general_validations if v.get("resultado") != "APROBADO"]
-    if failed_general:
+    # El costo se acumula server-side ($inc) cuando hay persistencia incremental
+    persisted = _persistir_validaciones(context, general_validations, general_cost)
+
+    with _obtener_ctx_lock(context):
+        if not persisted:
+            context["total_cost"] += general_cost
+        context["processing_log"].append(
+            f"Validación de reglas generales completada ({document_source})"
+            f"{' (caché)' if from_cache else ''}. Costo: ${general_cost:.6f}"
+        )
+        # Una sola pasada: filtra y construye las razones de rechazo sin
+        # materializar la lista intermedia de validaciones fallidas
         context["rejection_reasons"].extend(
-            [
-                {
-                    "reason": "Regla general fallida",
-                    "rule": v.get("nombre_regla"),
-                    "details": v.get("razon"),
-                    "type": "general",
-                    "document_source": document_source,  # Marcar origen
-                }
-                for v in failed_general
-            ]
+            {
+                "reason": "Regla general fallida",
+                "rule": v.get("nombre_regla"),
+                "details": v.get("razon"),
+                "type": "general",
+                "document_source": document_source,  # Marcar origen
+            }
+            for v in general_validations
+            if v.get("resultado") != "APROBADO"
         )
 
     return general_validations
@@ -165,34 +618,52 @@ def _validar_reglas_cruzadas(
     document_type_config: Dict[str, Any],
     document_source: str = "original",
 ) -> List[Dict[str, Any]]:
-    validation_rules_result, validation_cost = ai_service.validate_cross_validation_rules(
-        extracted_data, user_data, document_type_config["validation_rules"], document_type_config["name"]
+    cache_key = make_cache_key(
+        kind="cross",
+        rules=document_type_config["validation_rules"],
+        rules_version=document_type_config.get("rules_version"),
+        data=extracted_data,
+        user=user_data,
+    )
+    (validation_rules_result, validation_cost), from_cache = validation_cache.get_or_compute(
+        cache_key,
+        lambda: ai_service.validate_cross_validation_rules(
+            extracted_data,
+            user_data,
+            get_compiled_rules(document_type_config, "validation_rules"),
+            document_type_config["name"],
+        ),
     )
+    if from_cache:
+        validation_cost = 0.0
 
-    context["total_cost"] += validation_cost
     cross_validations = validation_rules_result.get("validaciones_detalladas", [])
-    
+
     # Agregar información del origen del documento a cada validación
-    for validation in cross_validations:
-        validation["document_source"] = document_source
-    
-    context["processing_log"].append(
-        f"Validación cruzada completada ({document_source}). Costo: ${validation_cost:.6f}"
-    )
+    _etiquetar_origen(cross_validations, document_source)
+
+    # El costo se acumula server-side ($inc) cuando hay persistencia incremental
+    persisted = _persistir_validaciones(context, cross_validations, validation_cost)
 
-    failed_cross = [v for v in cross_validations if v.get("resultado") != "APROBADO"]
-    if failed_cross:
+    with _obtener_ctx_lock(context):
+        if not persisted:
+            context["total_cost"] += validation_cost
+        context["processing_log"].append(
+            f"Validación cruzada completada ({document_source})"
+            f"{' (caché)' if from_cache else ''}. Costo: ${validation_cost:.6f}"
+        )
+        # Una sola pasada: filtra y construye las razones de rechazo sin
+        # materializar la lista intermedia de validaciones fallidas
         context["rejection_reasons"].extend(
-            [
-                {
-                    "reason": "Validación cruzada fallida",
-                    "rule": v.get("nombre_regla"),
-                    "details": v.get("razon"),
-                    "type": "cross_validation",
-                    "document_source": document_source,  # Marcar origen
-                }
-                for v in failed_cross
-            ]
+            {
+                "reason": "Validación cruzada fallida",
+                "rule": v.get("nombre_regla"),
+                "details": v.get("razon"),
+                "type": "cross_validation",
+                "document_source": document_source,  # Marcar origen
+            }
+            for v in cross_validations
+            if v.get("resultado") != "APROBADO"
         )
 
     return cross_validations
@@ -205,29 +676,63 @@ def _validacion_dinamica(
     user_data: Dict[str, Any],
     document_source: str = "original",
 ) -> List[Dict[str, Any]]:
+    # Pre-chequeo local: si cada valor del usuario aparece textualmente en los
+    # datos extraídos o en el texto OCR, la comparación es trivial y no
+    # justifica una llamada LLM completa
+    extracted_str = dumps_compact(extracted_data)
+    ocr_text = context.get("ocr_text") or ""
+    faltantes = [
+        k
+        for k, v in user_data.items()
+        if str(v) not in extracted_str and str(v) not in ocr_text
+    ]
+    if not faltantes:
+        dynamic_validations = [
+            {
+                "campo_usuario": campo,
+                "coincide": True,
+                "valor_usuario": valor,
+                "tipo_validacion": "exacta",
+                "observaciones": "Valor encontrado textualmente en el documento (sin llamada LLM)",
+                "document_source": document_source,
+            }
+            for campo, valor in user_data.items()
+        ]
+        with _obtener_ctx_lock(context):
+            context["processing_log"].append(
+                f"Validación dinámica resuelta localmente ({document_source}): todos los "
+                f"campos del usuario aparecen textualmente en el documento. Sin costo LLM."
+            )
+        _persistir_validaciones(context, dynamic_validations, 0.0)
+        return dynamic_validations
+
     dynamic_validation_result, dynamic_cost = ai_service.dynamic_user_data_validation(extracted_data, user_data)
 
-    context["total_cost"] += dynamic_cost
     dynamic_validations = dynamic_validation_result.get("validaciones_cruzadas", [])
-    
+
     # Agregar información del origen del documento a cada validación
-    for validation in dynamic_validations:
-        validation["document_source"] = document_source
-    
-    context["processing_log"].append(
-        f"Validación dinámica completada ({document_source}). Costo: ${dynamic_cost:.6f}"
-    )
+    _etiquetar_origen(dynamic_validations, document_source)
 
     campos_faltantes = dynamic_validation_result.get("campos_faltantes", [])
-    if campos_faltantes:
-        context["rejection_reasons"].append(
-            {
-                "reason": "Campos del usuario no encontrados en documento",
-                "campos_faltantes": campos_faltantes,
-                "type": "missing_fields",
-                "document_source": document_source,  # Marcar origen
-            }
+
+    # El costo se acumula server-side ($inc) cuando hay persistencia incremental
+    persisted = _persistir_validaciones(context, dynamic_validations, dynamic_cost)
+
+    with _obtener_ctx_lock(context):
+        if not persisted:
+            context["total_cost"] += dynamic_cost
+        context["processing_log"].append(
+            f"Validación dinámica completada ({document_source}). Costo: ${dynamic_cost:.6f}"
         )
+        if campos_faltantes:
+            context["rejection_reasons"].append(
+                {
+                    "reason": "Campos del usuario no encontrados en documento",
+                    "campos_faltantes": campos_faltantes,
+                    "type": "missing_fields",
+                    "document_source": document_source,  # Marcar origen
+                }
+            )
 
     return dynamic_validations
 
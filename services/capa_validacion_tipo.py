@@ -5,9 +5,10 @@ Valida que el documento corresponde al tipo esperado y extrae los datos
 
 import logging
 import os
-from typing import Any, Dict, Callable
+from typing import Any, Dict, Callable, Optional
 
 from models.document_models import ProcessingStatus, FinalDecision
+from services.document_type_cache import get_active_document_type
 from utils.logging_utils import set_stage
 
 logger = logging.getLogger(__name__)
@@ -19,18 +20,21 @@ def ejecutar_validacion_tipo_especifico(
     document_types_collection: Any,
     ai_service: Any,
     update_processing_status: Callable[[Any, ProcessingStatus], None],
+    document_type_config: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     """
     Valida que el documento corresponde al tipo específico esperado y extrae los datos.
     No clasifica, solo valida que sea el tipo correcto.
-    
+
     Args:
         context: Contexto del procesamiento
         document_type_name: Nombre del tipo de documento esperado
         document_types_collection: Colección de tipos de documentos
         ai_service: Servicio de IA
         update_processing_status: Función para actualizar el estado
-        
+        document_type_config: Configuración del tipo ya resuelta por el llamador;
+            si se entrega, se omite la consulta a la colección
+
     Returns:
         Contexto actualizado con los resultados de validación y extracción
     """
@@ -42,11 +46,12 @@ def ejecutar_validacion_tipo_especifico(
         set_stage("validation")
         update_processing_status(processed_doc["_id"], ProcessingStatus.VALIDATION)
         
-        # Obtener solo el tipo de documento específico
-        document_type = document_types_collection.find_one({
-            "name": document_type_name,
-            "is_active": True
-        })
+        # Obtener solo el tipo de documento específico (cacheado con TTL:
+        # la configuración cambia rara vez y ahorra un round trip por documento).
+        # Si el llamador ya resolvió la configuración, se usa directamente.
+        document_type = document_type_config or get_active_document_type(
+            document_type_name, document_types_collection
+        )
         
         if not document_type:
             context["final_decision"] = FinalDecision.REJECTED
@@ -70,11 +75,14 @@ def ejecutar_validacion_tipo_especifico(
         use_combined = os.getenv("USE_COMBINED_VALIDATION_EXTRACTION", "true").lower() == "true"
         has_method = hasattr(ai_service, 'verify_and_extract_document')
         
-        logger.info(f"Configuración método combinado: use_combined={use_combined}, has_method={has_method} para documento {processed_doc['document_id']}")
+        logger.info(
+            "Configuración método combinado: use_combined=%s, has_method=%s para documento %s",
+            use_combined, has_method, processed_doc["document_id"]
+        )
         
         # Forzar uso del método combinado si está disponible (optimización activa por defecto)
         if use_combined and has_method:
-            logger.info(f"Usando método combinado de validación y extracción para documento {processed_doc['document_id']}")
+            logger.info("Usando método combinado de validación y extracción para documento %s", processed_doc["document_id"])
             # Método optimizado: validación y extracción en una sola llamada
             combined_result, combined_cost = ai_service.verify_and_extract_document(
                 ocr_text, document_type_name, document_type
@@ -97,8 +105,8 @@ def ejecutar_validacion_tipo_especifico(
                     f"Documento rechazado: {combined_result.get('reason')}"
                 )
                 logger.warning(
-                    f"Documento {processed_doc['document_id']} no corresponde al tipo esperado '{document_type_name}': "
-                    f"{combined_result.get('reason')}"
+                    "Documento %s no corresponde al tipo esperado '%s': %s",
+                    processed_doc["document_id"], document_type_name, combined_result.get("reason")
                 )
                 return context
             
@@ -111,11 +119,11 @@ def ejecutar_validacion_tipo_especifico(
             context["processing_log"].append("Extracción de datos completada (método combinado)")
             
             if not extracted_data or len(extracted_data) == 0:
-                logger.warning(f"No se pudieron extraer datos del documento {processed_doc['document_id']}")
+                logger.warning("No se pudieron extraer datos del documento %s", processed_doc["document_id"])
                 context["processing_log"].append("Advertencia: No se pudieron extraer datos del documento")
         else:
             # Método tradicional: validación y extracción separadas
-            logger.info(f"Usando método tradicional (separado) para documento {processed_doc['document_id']}")
+            logger.info("Usando método tradicional (separado) para documento %s", processed_doc["document_id"])
             validation_result, validation_cost = ai_service.verify_document_type(
                 ocr_text, document_type_name, document_type
             )
@@ -137,8 +145,8 @@ def ejecutar_validacion_tipo_especifico(
                     f"Documento rechazado: {validation_result.get('reason')}"
                 )
                 logger.warning(
-                    f"Documento {processed_doc['document_id']} no corresponde al tipo esperado '{document_type_name}': "
-                    f"{validation_result.get('reason')}"
+                    "Documento %s no corresponde al tipo esperado '%s': %s",
+                    processed_doc["document_id"], document_type_name, validation_result.get("reason")
                 )
                 return context
             
@@ -151,7 +159,7 @@ def ejecutar_validacion_tipo_especifico(
                 doc_id=processed_doc["document_id"],
             )
         
-        logger.info(f"Validación y extracción completadas para documento {processed_doc['document_id']}")
+        logger.info("Validación y extracción completadas para documento %s", processed_doc["document_id"])
         return context
         
     except Exception as e:
@@ -182,7 +190,7 @@ def _procesar_extraccion(
         context["processing_log"].append(f"Extracción de datos completada. Costo: ${extraction_cost:.6f}")
         
         if not extracted_data or len(extracted_data) == 0:
-            logger.warning(f"No se pudieron extraer datos del documento {doc_id}")
+            logger.warning("No se pudieron extraer datos del documento %s", doc_id)
             context["processing_log"].append("Advertencia: No se pudieron extraer datos del documento")
     
     except Exception as e:
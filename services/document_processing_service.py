@@ -4,22 +4,40 @@ Orquesta todas las capas de procesamiento
 """
 
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
 
 from models.document_models import ProcessedDocument, ProcessingStatus, FinalDecision
 from services.ai_services import DocumentAIService
 from services.ocr_service import get_ocr_service
-from database.mongodb_connection import get_collection
+from database.mongodb_connection import get_collection, get_unacknowledged_collection
 from utils.logging_utils import document_logging_context, set_stage
 from services.capa_autenticidad import ejecutar_capa_autenticidad
 from services.capa_ocr import ejecutar_capa_ocr
 from services.capa_clasificacion import ejecutar_capa_clasificacion
-from services.capa_validacion import ejecutar_capa_validacion
+from services.capa_validacion import aplicar_resultado_combinado, ejecutar_capa_validacion
+from services.processing_context import ProcessingContext
 
 logger = logging.getLogger(__name__)
 
+# Umbral de operaciones pendientes y edad máxima antes de hacer flush del buffer
+_PENDING_OPS_MAX = 8
+_PENDING_OPS_MAX_AGE_SECONDS = 0.5
+
+# Campos constantes del registro inicial de documento (los valores mutables,
+# como processing_log, se crean por documento para no compartir instancias)
+_DOC_TEMPLATE = {
+    "processing_status": ProcessingStatus.PENDING,
+    "processing_cost_usd": 0.0,
+}
+
 
 class DocumentProcessingService:
     """Servicio principal para el procesamiento de documentos"""
@@ -30,6 +48,16 @@ class DocumentProcessingService:
         # Inicializar colecciones de forma lazy para evitar errores al importar
         self._document_types_collection = None
         self._processed_documents_collection = None
+        self._heartbeat_collection = None
+        # Executor compartido para solapar capas independientes del pipeline
+        # (autenticidad y validación de reglas no dependen entre sí)
+        self._stage_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pipeline-stage")
+        # Buffer de transiciones de estado para coalescerlas en un solo bulk_write
+        self._pending_ops: List[UpdateOne] = []
+        self._pending_ops_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        # Último estado registrado por documento, para omitir transiciones no-op
+        self._last_status: Dict[ObjectId, ProcessingStatus] = {}
     
     @property
     def document_types_collection(self):
@@ -44,8 +72,15 @@ class DocumentProcessingService:
         if self._processed_documents_collection is None:
             self._processed_documents_collection = get_collection("OCR_processed_documents")
         return self._processed_documents_collection
-    
-    def process_document(self, document_data: Dict[str, Any]) -> Dict[str, Any]:
+
+    @property
+    def heartbeat_collection(self):
+        """Handle w=0 de documentos procesados para heartbeats de estado (lazy)"""
+        if self._heartbeat_collection is None:
+            self._heartbeat_collection = get_unacknowledged_collection("OCR_processed_documents")
+        return self._heartbeat_collection
+
+    def process_document(self, document_data: Dict[str, Any]) -> ProcessingContext:
         """
         Procesa un documento completo siguiendo el pipeline de capas
         
@@ -87,10 +122,124 @@ class DocumentProcessingService:
                 self._mark_document_as_failed(processed_doc["_id"], str(e))
                 raise
     
+    def process_documents_batch(self, documents: list) -> list:
+        """
+        Procesa varios documentos agrupando todas sus validaciones de reglas en
+        una sola petición a la OpenAI Batch API (modo cola, 50% de descuento en
+        tokens). El camino síncrono process_document se mantiene para las
+        necesidades de latencia de la API de un solo documento.
+
+        Args:
+            documents: Lista de document_data (mismo formato que process_document)
+
+        Returns:
+            Lista de contextos resultantes, en el mismo orden de entrada
+        """
+        pendientes = []
+
+        # Fase 1: OCR + clasificación + autenticidad por documento (sin validación)
+        for document_data in documents:
+            document_id = document_data["document_id"]
+            provided_classification = document_data.get("provided_classification")
+
+            with document_logging_context(
+                doc_id=document_id,
+                provided_classification=provided_classification,
+                stage="initialization",
+            ):
+                set_stage("create_record")
+                processed_doc = self._create_processed_document(document_data)
+
+                context = ProcessingContext(processed_doc=processed_doc)
+
+                try:
+                    set_stage("pipeline")
+                    context = ejecutar_capa_ocr(
+                        context=context,
+                        ocr_service=self.ocr_service,
+                        update_processing_status=self._update_processing_status,
+                    )
+                    context = ejecutar_capa_clasificacion(
+                        context=context,
+                        document_types_collection=self.document_types_collection,
+                        ai_service=self.ai_service,
+                        update_processing_status=self._update_processing_status,
+                    )
+                    if context.get("final_decision") != FinalDecision.REJECTED:
+                        context = ejecutar_capa_autenticidad(context)
+                except Exception as e:
+                    logger.error(f"Error en procesamiento del documento {document_id}: {e}")
+                    self._mark_document_as_failed(processed_doc["_id"], str(e))
+                    context["_failed"] = True
+
+                pendientes.append((processed_doc, context))
+
+        # Fase 2: una sola petición Batch con las validaciones de todos los documentos
+        items = []
+        for processed_doc, context in pendientes:
+            if context.get("_failed"):
+                continue
+            document_type_config = context.get("document_type_config")
+            if not document_type_config:
+                continue
+            user_data = context["processed_doc"].get("user_data")
+            items.append({
+                "custom_id": str(processed_doc["_id"]),
+                "document_data": context.get("extracted_data", {}),
+                "user_data": user_data,
+                "general_rules": document_type_config.get("general_rules"),
+                "validation_rules": document_type_config.get("validation_rules") if user_data else None,
+                "document_type": document_type_config["name"],
+            })
+
+        batch_results = self.ai_service.validate_all_rules_batch(items) if items else {}
+
+        # Fase 3: demultiplexar por custom_id, decidir y persistir cada documento
+        resultados = []
+        for processed_doc, context in pendientes:
+            if context.get("_failed"):
+                resultados.append(context)
+                continue
+
+            with document_logging_context(
+                doc_id=processed_doc["document_id"],
+                provided_classification=processed_doc.get("provided_classification"),
+                stage="validation",
+            ):
+                custom_id = str(processed_doc["_id"])
+                if custom_id in batch_results:
+                    combined_result, combined_cost = batch_results[custom_id]
+                    context["validation_results"].extend(
+                        aplicar_resultado_combinado(
+                            context=context,
+                            combined_result=combined_result,
+                            combined_cost=combined_cost,
+                            document_source="original",
+                        )
+                    )
+                elif not context.get("document_type_config"):
+                    logger.warning("No hay configuración de tipo de documento para %s", processed_doc["document_id"])
+                    context["final_decision"] = FinalDecision.MANUAL_REVIEW
+                    context["processing_log"].append("No se encontró configuración de tipo de documento")
+
+                context = self._determine_final_decision(context)
+
+                set_stage("update_record")
+                self._update_processed_document(processed_doc["_id"], context)
+                set_stage("completed")
+                resultados.append(context)
+
+        return resultados
+
     def _create_processed_document(self, document_data: Dict[str, Any]) -> Dict[str, Any]:
         """Crea el registro inicial del documento procesado"""
         
+        now = datetime.utcnow()
         processed_doc = {
+            **_DOC_TEMPLATE,
+            # _id generado client-side: conocido de inmediato, sin depender del
+            # round trip de insert_one para encadenar las escrituras siguientes
+            "_id": ObjectId(),
             "document_id": document_data["document_id"],
             "file_url": document_data["file_url"],
             "file_name": document_data.get("file_name", "document.pdf"),
@@ -99,44 +248,54 @@ class DocumentProcessingService:
             "destination": document_data["destination"],
             "provided_classification": document_data["provided_classification"],
             "user_data": document_data.get("user_data"),
-            "processing_status": ProcessingStatus.PENDING,
             "response_url": document_data.get("response_url"),
-            "processing_cost_usd": 0.0,
             "processing_log": [],
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "created_at": now,
+            "updated_at": now
         }
         
         # Insertar en la base de datos
-        result = self.processed_documents_collection.insert_one(processed_doc)
-        processed_doc["_id"] = result.inserted_id
-        
-        logger.info(f"Documento {document_data['document_id']} creado con ID {result.inserted_id}")
+        self.processed_documents_collection.insert_one(processed_doc)
+
+        logger.info("Documento %s creado con ID %s", document_data["document_id"], processed_doc["_id"])
         return processed_doc
     
-    def _execute_processing_pipeline(self, processed_doc: Dict[str, Any]) -> Dict[str, Any]:
+    def _execute_processing_pipeline(self, processed_doc: Dict[str, Any]) -> ProcessingContext:
         """Ejecuta el pipeline completo de procesamiento"""
         
         document_id = processed_doc["document_id"]
-        context = {
-            "processed_doc": processed_doc,
-            "processing_log": [],
-            "total_cost": 0.0,
-            "rejection_reasons": [],
-            "validation_results": []
-        }
+        context = ProcessingContext(processed_doc=processed_doc)
+        # Callback para persistir validaciones incrementalmente vía $push,
+        # en lugar de esperar al $set monolítico del final del pipeline
+        context["_persist"] = lambda items, cost=0.0: self._append_validation(
+            processed_doc["_id"], items, cost
+        )
         
         try:
             # Capa 1: OCR
-            logger.info(f"Iniciando OCR para documento {document_id}")
+            logger.info("Iniciando OCR para documento %s", document_id)
             context = ejecutar_capa_ocr(
                 context=context,
                 ocr_service=self.ocr_service,
                 update_processing_status=self._update_processing_status,
             )
             
+            # Corto-circuito: sin texto OCR utilizable, clasificación y validación
+            # solo acumularían fallos y costo; mejor derivar a revisión manual ya
+            min_ocr_len = int(os.getenv("MIN_OCR_TEXT_LENGTH", "20"))
+            if len((context.get("ocr_text") or "").strip()) < min_ocr_len:
+                logger.warning(
+                    "OCR sin texto utilizable para documento %s; se omiten las capas de IA",
+                    document_id,
+                )
+                context["final_decision"] = FinalDecision.MANUAL_REVIEW
+                context["processing_log"].append(
+                    "OCR sin texto utilizable; documento derivado a revisión manual"
+                )
+                return self._determine_final_decision(context)
+
             # Capa 2: Verificación de Clasificación y Extracción
-            logger.info(f"Iniciando verificación de clasificación para documento {document_id}")
+            logger.info("Iniciando verificación de clasificación para documento %s", document_id)
             context = ejecutar_capa_clasificacion(
                 context=context,
                 document_types_collection=self.document_types_collection,
@@ -144,27 +303,44 @@ class DocumentProcessingService:
                 update_processing_status=self._update_processing_status,
             )
 
+            # Capas 3 y 4 en paralelo: autenticidad (HTTP/metadatos) y validación de
+            # reglas (LLM) no dependen entre sí, así que se solapan para ahorrar
+            # una latencia completa de LLM por documento.
+            # copy_context() preserva el contexto de logging (doc_id/stage) en cada thread.
+            authenticity_future = None
+            validation_future = None
+
             # Si la clasificación rechazó el documento, saltar autenticidad para evitar ruido
             if context.get("final_decision") == FinalDecision.REJECTED:
                 logger.info(
                     "Documento rechazado durante clasificación; se omite verificación de autenticidad posterior."
                 )
             else:
-                logger.info(f"Evaluando necesidad de autenticidad para documento {document_id}")
-                context = ejecutar_capa_autenticidad(context)
-            
-            # Capa 3: Validación de Reglas de Negocio
+                logger.info("Evaluando necesidad de autenticidad para documento %s", document_id)
+                authenticity_future = self._stage_executor.submit(
+                    copy_context().run, ejecutar_capa_autenticidad, context
+                )
+
+            # Capa de Validación de Reglas de Negocio
             if context.get("document_type_config"):
-                logger.info(f"Iniciando validación de reglas para documento {document_id}")
-                context = ejecutar_capa_validacion(
-                    context=context,
-                    ai_service=self.ai_service,
-                    update_processing_status=self._update_processing_status,
+                logger.info("Iniciando validación de reglas para documento %s", document_id)
+                validation_future = self._stage_executor.submit(
+                    copy_context().run,
+                    lambda: ejecutar_capa_validacion(
+                        context=context,
+                        ai_service=self.ai_service,
+                        update_processing_status=self._update_processing_status,
+                    ),
                 )
             else:
-                logger.warning(f"No hay configuración de tipo de documento para {document_id}")
+                logger.warning("No hay configuración de tipo de documento para %s", document_id)
                 context["final_decision"] = FinalDecision.MANUAL_REVIEW
                 context["processing_log"].append("No se encontró configuración de tipo de documento")
+
+            # Esperar ambas capas antes de decidir (propaga excepciones del pipeline)
+            for future in (authenticity_future, validation_future):
+                if future is not None:
+                    future.result()
             
             # Determinar decisión final
             context = self._determine_final_decision(context)
@@ -178,7 +354,7 @@ class DocumentProcessingService:
             raise
     
     
-    def _determine_final_decision(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    def _determine_final_decision(self, context: ProcessingContext) -> ProcessingContext:
         """Determina la decisión final basada en los resultados"""
         
         set_stage("final_decision")
@@ -196,22 +372,82 @@ class DocumentProcessingService:
         
         return context
     
-    def _update_processing_status(self, document_id: ObjectId, status: ProcessingStatus):
-        """Actualiza el estado de procesamiento del documento"""
-        
+    def _append_validation(self, document_id: ObjectId, items: list, cost: float = 0.0):
+        """
+        Persiste validaciones de forma incremental conforme se completan.
+        Hace el progreso observable y evita perder resultados ya calculados
+        si el pipeline falla después.
+        """
+        if not items:
+            return
+
         self.processed_documents_collection.update_one(
             {"_id": document_id},
             {
-                "$set": {
-                    "processing_status": status,
-                    "updated_at": datetime.utcnow()
-                }
+                "$push": {"validation_results": {"$each": items}},
+                "$inc": {"processing_cost_usd": cost},
+                "$currentDate": {"updated_at": True}
+            }
+        )
+
+    def _update_processing_status(self, document_id: ObjectId, status: ProcessingStatus):
+        """
+        Registra el cambio de estado del documento.
+
+        Las transiciones intermedias se bufferizan y se envían coalescadas en un
+        bulk_write (cada documento pasa por varias etapas): se hace flush al
+        llegar a _PENDING_OPS_MAX operaciones, al superar la edad máxima del
+        buffer, o sincrónicamente en la escritura final del documento.
+        Transiciones repetidas al mismo estado se omiten sin tocar la base.
+        """
+        op = UpdateOne(
+            {"_id": document_id},
+            {
+                "$set": {"processing_status": status},
+                "$currentDate": {"updated_at": True}
             }
         )
+
+        with self._pending_ops_lock:
+            if self._last_status.get(document_id) == status:
+                return
+            self._last_status[document_id] = status
+            self._pending_ops.append(op)
+            should_flush = (
+                len(self._pending_ops) >= _PENDING_OPS_MAX
+                or time.monotonic() - self._last_flush > _PENDING_OPS_MAX_AGE_SECONDS
+            )
+
+        if should_flush:
+            self._flush_pending_ops()
+
+    def _flush_pending_ops(self):
+        """Envía las operaciones de estado bufferizadas en un solo bulk_write"""
+        with self._pending_ops_lock:
+            ops, self._pending_ops = self._pending_ops, []
+            self._last_flush = time.monotonic()
+
+        if not ops:
+            return
+
+        try:
+            # w=0: los heartbeats son observacionales, no vale la pena esperar el ack
+            self.heartbeat_collection.bulk_write(ops, ordered=False)
+        except Exception as exc:
+            logger.warning("Error en bulk_write de estados de procesamiento: %s", exc)
     
     def _update_processed_document(self, document_id: ObjectId, result: Dict[str, Any]):
         """Actualiza el documento con el resultado final"""
-        
+
+        # Drenar transiciones de estado pendientes antes de la escritura final
+        self._flush_pending_ops()
+
+        # Frontera de persistencia: fuera de aquí el contexto viaja como
+        # ProcessingContext (slots); Mongo recibe su vista dict
+        context = result
+        if isinstance(result, ProcessingContext):
+            result = result.to_dict()
+
         update_data = {
             "processing_status": ProcessingStatus.COMPLETED,
             "final_decision": result.get("final_decision"),
@@ -220,24 +456,45 @@ class DocumentProcessingService:
             "classification_result": result.get("classification_result"),
             "validation_results": result.get("validation_results"),
             "rejection_reasons": result.get("rejection_reasons"),
-            "processing_cost_usd": result.get("total_cost", 0.0),
             "processing_log": result.get("processing_log", []),
             "document_type_id": result.get("document_type_id"),
-            "document_type_name": result.get("document_type_name"),
-            "processed_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "document_type_name": result.get("document_type_name")
         }
-        
-        self.processed_documents_collection.update_one(
+        # No escribir campos ausentes: un rechazo temprano deja la mayoría en
+        # None y enviarlos solo agranda el update sin aportar información
+        update_data = {k: v for k, v in update_data.items() if v is not None}
+
+        with self._pending_ops_lock:
+            self._last_status.pop(document_id, None)
+
+        # Los costos de validación ya se acumularon server-side vía $inc
+        # (_append_validation); aquí solo se suma lo acumulado en el contexto
+        # (OCR, clasificación, etc.) y se lee el total final en la misma operación
+        updated = self.processed_documents_collection.find_one_and_update(
             {"_id": document_id},
-            {"$set": update_data}
+            {
+                "$set": update_data,
+                "$inc": {"processing_cost_usd": result.get("total_cost", 0.0)},
+                # Timestamps server-side: evita discrepancias de reloj y bytes en el wire
+                "$currentDate": {"updated_at": True, "processed_at": True}
+            },
+            projection={"processing_cost_usd": 1},
+            return_document=ReturnDocument.AFTER
         )
+        if updated is not None:
+            context["total_cost"] = updated.get("processing_cost_usd", 0.0)
     
     def _mark_document_as_failed(self, document_id: ObjectId, error_message: str):
         """Marca el documento como fallido"""
-        
+
         set_stage("failed")
-        
+
+        # El estado de fallo debe quedar persistido de inmediato
+        self._flush_pending_ops()
+
+        with self._pending_ops_lock:
+            self._last_status.pop(document_id, None)
+
         self.processed_documents_collection.update_one(
             {"_id": document_id},
             {
@@ -245,8 +502,8 @@ class DocumentProcessingService:
                     "processing_status": ProcessingStatus.FAILED,
                     "final_decision": FinalDecision.REJECTED,
                     "rejection_reasons": [{"reason": "Error de procesamiento", "details": error_message}],
-                    "processing_log": [f"Error: {error_message}"],
-                    "updated_at": datetime.utcnow()
-                }
+                    "processing_log": [f"Error: {error_message}"]
+                },
+                "$currentDate": {"updated_at": True}
             }
         )
@@ -2,23 +2,36 @@
 Procesador base para documentos
 """
 
+import asyncio
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from bson import ObjectId
+from pymongo import UpdateOne
 
 from models.document_models import ProcessingStatus, FinalDecision
 from services.ai_services import DocumentAIService
 from services.ocr_service import get_ocr_service
-from database.mongodb_connection import get_collection
+from database.mongodb_connection import get_collection, get_unacknowledged_collection
+from services.document_type_cache import get_active_document_type
 from utils.logging_utils import document_logging_context, set_stage
 from services.capa_autenticidad import ejecutar_capa_autenticidad
 from services.capa_ocr import ejecutar_capa_ocr
 from services.capa_validacion import ejecutar_capa_validacion
 from services.capa_validacion_tipo import ejecutar_validacion_tipo_especifico
+from services.processing_context import ProcessingContext
 
 logger = logging.getLogger(__name__)
 
+# Umbral de operaciones pendientes y edad máxima antes de hacer flush del buffer
+_PENDING_OPS_MAX = 8
+_PENDING_OPS_MAX_AGE_SECONDS = 0.5
+
 
 class BaseDocumentProcessor:
     """Procesador base para documentos con lógica común"""
@@ -35,7 +48,24 @@ class BaseDocumentProcessor:
         self.ocr_service = get_ocr_service()
         self._document_types_collection = None
         self._processed_documents_collection = None
-    
+        self._heartbeat_collection = None
+        # Executor compartido para solapar capas independientes del pipeline
+        self._stage_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pipeline-stage")
+        # Buffer de transiciones de estado para coalescerlas en un solo bulk_write
+        self._pending_ops: List[UpdateOne] = []
+        self._pending_ops_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        # Transiciones acumuladas en memoria cuando los heartbeats no se persisten
+        self._status_log: Dict[ObjectId, List[str]] = {}
+        # Último estado registrado por documento, para omitir transiciones no-op
+        self._last_status: Dict[ObjectId, ProcessingStatus] = {}
+        # Secuencia de pasos del pipeline, resuelta una sola vez por instancia
+        self._pipeline_steps = [
+            self._paso_ocr,
+            self._paso_validacion_tipo,
+            self._paso_capas_negocio,
+        ]
+
     @property
     def document_types_collection(self):
         """Obtiene la colección de tipos de documentos (lazy)"""
@@ -49,8 +79,15 @@ class BaseDocumentProcessor:
         if self._processed_documents_collection is None:
             self._processed_documents_collection = get_collection("OCR_processed_documents")
         return self._processed_documents_collection
-    
-    def process_document(self, document_data: Dict[str, Any]) -> Dict[str, Any]:
+
+    @property
+    def heartbeat_collection(self):
+        """Handle w=0 de documentos procesados para heartbeats de estado (lazy)"""
+        if self._heartbeat_collection is None:
+            self._heartbeat_collection = get_unacknowledged_collection("OCR_processed_documents")
+        return self._heartbeat_collection
+
+    def process_document(self, document_data: Dict[str, Any]) -> ProcessingContext:
         """
         Procesa un documento completo siguiendo el pipeline de capas
         
@@ -86,15 +123,59 @@ class BaseDocumentProcessor:
                 
             except Exception as e:
                 set_stage("error")
-                logger.error(f"Error en procesamiento del documento {document_id}: {e}")
+                logger.error("Error en procesamiento del documento %s: %s", document_id, e)
                 # Marcar como fallido
                 self._mark_document_as_failed(processed_doc["_id"], str(e))
                 raise
-    
+
+    async def aprocess_document(self, document_data: Dict[str, Any]) -> ProcessingContext:
+        """
+        Variante asíncrona de process_document para llamadores sobre un event
+        loop (background tasks de FastAPI). Ejecuta el pipeline síncrono en un
+        hilo, de modo que el loop puede intercalar varios documentos mientras
+        el I/O de OCR/IA de cada uno está en vuelo, en lugar de bloquearse
+        durante todo el pipeline.
+        """
+        return await asyncio.to_thread(self.process_document, document_data)
+
+    async def aprocess_batch(
+        self,
+        documents: List[Dict[str, Any]],
+        max_concurrency: Optional[int] = None,
+    ) -> List[Any]:
+        """
+        Procesa un lote de documentos con concurrencia acotada.
+
+        Mantiene hasta max_concurrency pipelines en vuelo a la vez (por defecto
+        PROCESSOR_MAX_CONCURRENCY, 4), de modo que el OCR y las llamadas de IA
+        de varios documentos se solapan sin saturar a los proveedores. Cada
+        documento falla de forma independiente: el resultado de un documento
+        fallido es la excepción que lo abortó, no se cancela el resto del lote.
+
+        Returns:
+            Lista de resultados en el mismo orden que los documentos de entrada
+        """
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("PROCESSOR_MAX_CONCURRENCY", "4"))
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _procesar(document_data: Dict[str, Any]) -> Any:
+            async with semaphore:
+                return await self.aprocess_document(document_data)
+
+        return await asyncio.gather(
+            *(_procesar(document_data) for document_data in documents),
+            return_exceptions=True,
+        )
+
     def _create_processed_document(self, document_data: Dict[str, Any]) -> Dict[str, Any]:
         """Crea el registro inicial del documento procesado"""
-        
+
+        now = datetime.utcnow()
         processed_doc = {
+            # _id generado client-side: conocido de inmediato, sin depender del
+            # round trip de insert_one para encadenar las escrituras siguientes
+            "_id": ObjectId(),
             "document_id": document_data["document_id"],
             "file_url": document_data["file_url"],
             "file_name": document_data.get("file_name", "document.pdf"),
@@ -106,82 +187,133 @@ class BaseDocumentProcessor:
             "response_url": document_data.get("response_url"),
             "processing_cost_usd": 0.0,
             "processing_log": [],
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "created_at": now,
+            "updated_at": now
         }
         
         # Insertar en la base de datos
-        result = self.processed_documents_collection.insert_one(processed_doc)
-        processed_doc["_id"] = result.inserted_id
-        
-        logger.info(f"Documento {document_data['document_id']} creado con ID {result.inserted_id}")
+        self.processed_documents_collection.insert_one(processed_doc)
+
+        logger.info("Documento %s creado con ID %s", document_data['document_id'], processed_doc["_id"])
         return processed_doc
     
-    def _execute_processing_pipeline(self, processed_doc: Dict[str, Any]) -> Dict[str, Any]:
+    def _execute_processing_pipeline(self, processed_doc: Dict[str, Any]) -> ProcessingContext:
         """Ejecuta el pipeline completo de procesamiento"""
         
         document_id = processed_doc["document_id"]
-        context = {
-            "processed_doc": processed_doc,
-            "processing_log": [],
-            "total_cost": 0.0,
-            "rejection_reasons": [],
-            "validation_results": []
-        }
-        
+        # Dataclass con slots en lugar de dict: acceso a campos más barato en las
+        # capas calientes y detección temprana de claves mal escritas. Mantiene
+        # la interfaz dict (get/[]/in) para las capas compartidas.
+        context = ProcessingContext(processed_doc=processed_doc)
+
         try:
-            # Capa 1: OCR
-            logger.info(f"Iniciando OCR para documento {document_id}")
-            context = ejecutar_capa_ocr(
-                context=context,
-                ocr_service=self.ocr_service,
-                update_processing_status=self._update_processing_status,
+            # Secuencia resuelta en __init__: el bucle solo itera y corta en
+            # cuanto un paso fija la decisión final (rechazo o revisión manual)
+            for step in self._pipeline_steps:
+                context = step(context)
+                if context.get("final_decision"):
+                    break
+
+            # Determinar decisión final
+            return self._determine_final_decision(context)
+
+        except Exception as e:
+            logger.error("Error en pipeline para documento %s: %s", document_id, e)
+            context["final_decision"] = FinalDecision.MANUAL_REVIEW
+            context["processing_log"].append(f"Error en pipeline: {str(e)}")
+            raise
+
+    def _paso_ocr(self, context: ProcessingContext) -> ProcessingContext:
+        """Capa 1: OCR, con corto-circuito si no hay texto utilizable"""
+
+        document_id = context["processed_doc"]["document_id"]
+        logger.info("Iniciando OCR para documento %s", document_id)
+        context = ejecutar_capa_ocr(
+            context=context,
+            ocr_service=self.ocr_service,
+            update_processing_status=self._update_processing_status,
+        )
+
+        # Corto-circuito: sin texto OCR utilizable, las capas de IA solo
+        # acumularían fallos y costo; mejor derivar a revisión manual ya
+        type_config = get_active_document_type(
+            self.document_type_name, self.document_types_collection
+        )
+        context["_type_config"] = type_config
+        min_ocr_len = int(
+            (type_config or {}).get("min_ocr_text_length")
+            or os.getenv("MIN_OCR_TEXT_LENGTH", "20")
+        )
+        if len((context.get("ocr_text") or "").strip()) < min_ocr_len:
+            logger.warning(
+                "OCR sin texto utilizable para documento %s; se omiten las capas de IA",
+                document_id,
             )
-            
-            # Capa 2: Validación y Extracción (específica del tipo de documento)
-            logger.info(f"Iniciando validación y extracción para documento {document_id}")
-            context = ejecutar_validacion_tipo_especifico(
-                context=context,
-                document_type_name=self.document_type_name,
-                document_types_collection=self.document_types_collection,
-                ai_service=self.ai_service,
-                update_processing_status=self._update_processing_status,
+            context["final_decision"] = FinalDecision.MANUAL_REVIEW
+            context["processing_log"].append(
+                "OCR sin texto utilizable; documento derivado a revisión manual"
             )
-            
-            # Si la validación rechazó el documento, saltar autenticidad
-            if context.get("final_decision") == FinalDecision.REJECTED:
-                logger.info("Documento rechazado durante validación; se omite verificación de autenticidad.")
-            elif self.requires_authenticity:
-                # Capa 3: Autenticidad (solo para F30)
-                logger.info(f"Evaluando autenticidad para documento {document_id}")
-                context = ejecutar_capa_autenticidad(context)
-            
-            # Capa 4: Validación de Reglas de Negocio
-            if context.get("document_type_config"):
-                logger.info(f"Iniciando validación de reglas para documento {document_id}")
-                context = ejecutar_capa_validacion(
+
+        return context
+
+    def _paso_validacion_tipo(self, context: ProcessingContext) -> ProcessingContext:
+        """Capa 2: Validación y extracción específica del tipo de documento"""
+
+        document_id = context["processed_doc"]["document_id"]
+        logger.info("Iniciando validación y extracción para documento %s", document_id)
+        return ejecutar_validacion_tipo_especifico(
+            context=context,
+            document_type_name=self.document_type_name,
+            document_types_collection=self.document_types_collection,
+            ai_service=self.ai_service,
+            update_processing_status=self._update_processing_status,
+            document_type_config=context.get("_type_config"),
+        )
+
+    def _paso_capas_negocio(self, context: ProcessingContext) -> ProcessingContext:
+        """
+        Capas 3 y 4 en paralelo: autenticidad (HTTP/metadatos) y validación de
+        reglas (LLM) no dependen entre sí, así que se solapan para ahorrar una
+        latencia completa de LLM por documento. copy_context() preserva el
+        contexto de logging (doc_id/stage) en cada thread.
+        """
+
+        document_id = context["processed_doc"]["document_id"]
+        authenticity_future = None
+        validation_future = None
+
+        # Capa 3: Autenticidad (solo si el tipo la requiere)
+        if self.requires_authenticity:
+            logger.info("Evaluando autenticidad para documento %s", document_id)
+            authenticity_future = self._stage_executor.submit(
+                copy_context().run, ejecutar_capa_autenticidad, context
+            )
+
+        # Capa 4: Validación de Reglas de Negocio
+        if context.get("document_type_config"):
+            logger.info("Iniciando validación de reglas para documento %s", document_id)
+            validation_future = self._stage_executor.submit(
+                copy_context().run,
+                lambda: ejecutar_capa_validacion(
                     context=context,
                     ai_service=self.ai_service,
                     update_processing_status=self._update_processing_status,
-                )
-            else:
-                logger.warning(f"No hay configuración de tipo de documento para {document_id}")
-                context["final_decision"] = FinalDecision.MANUAL_REVIEW
-                context["processing_log"].append("No se encontró configuración de tipo de documento")
-            
-            # Determinar decisión final
-            context = self._determine_final_decision(context)
-            
-            return context
-            
-        except Exception as e:
-            logger.error(f"Error en pipeline para documento {document_id}: {e}")
+                ),
+            )
+        else:
+            logger.warning("No hay configuración de tipo de documento para %s", document_id)
             context["final_decision"] = FinalDecision.MANUAL_REVIEW
-            context["processing_log"].append(f"Error en pipeline: {str(e)}")
-            raise
-    
+            context["processing_log"].append("No se encontró configuración de tipo de documento")
+
+        # Esperar ambas capas antes de decidir (propaga excepciones del pipeline)
+        for future in (authenticity_future, validation_future):
+            if future is not None:
+                future.result()
+
+        return context
+
     
-    def _determine_final_decision(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    def _determine_final_decision(self, context: ProcessingContext) -> ProcessingContext:
         """Determina la decisión final basada en los resultados"""
         
         set_stage("final_decision")
@@ -200,29 +332,88 @@ class BaseDocumentProcessor:
         return context
     
     def _update_processing_status(self, document_id: ObjectId, status: ProcessingStatus):
-        """Actualiza el estado de procesamiento del documento"""
-        
-        self.processed_documents_collection.update_one(
+        """
+        Registra el cambio de estado del documento.
+
+        Las transiciones intermedias son puramente observacionales: por defecto
+        se acumulan en memoria y se escriben una sola vez junto con el resultado
+        final, eliminando un update_one por etapa. Con
+        PERSIST_STATUS_HEARTBEATS=true se recupera el comportamiento anterior
+        (escritura por etapa, bufferizada y coalescada en bulk_write) para
+        entornos donde un observador externo lee el estado en vivo.
+        Transiciones repetidas al mismo estado se omiten en ambos modos.
+        """
+        entry = f"Estado actualizado a: {status.value}"
+
+        persist_heartbeats = os.getenv("PERSIST_STATUS_HEARTBEATS", "false").lower() == "true"
+        if not persist_heartbeats:
+            with self._pending_ops_lock:
+                if self._last_status.get(document_id) == status:
+                    return
+                self._last_status[document_id] = status
+                self._status_log.setdefault(document_id, []).append(entry)
+            logger.debug("Estado de documento %s actualizado a %s", document_id, status.value)
+            return
+
+        op = UpdateOne(
             {"_id": document_id},
             {
-                "$set": {
-                    "processing_status": status,
-                    "updated_at": datetime.utcnow()
-                },
+                "$set": {"processing_status": status},
+                "$currentDate": {"updated_at": True},
                 "$push": {
                     "processing_log": {
-                        "$each": [f"Estado actualizado a: {status.value}"],
+                        "$each": [entry],
                         "$slice": -1000  # Mantener solo los últimos 1000 logs
                     }
                 }
             }
         )
-        
-        logger.debug(f"Estado de documento {document_id} actualizado a {status.value}")
-    
+
+        with self._pending_ops_lock:
+            if self._last_status.get(document_id) == status:
+                return
+            self._last_status[document_id] = status
+            self._pending_ops.append(op)
+            should_flush = (
+                len(self._pending_ops) >= _PENDING_OPS_MAX
+                or time.monotonic() - self._last_flush > _PENDING_OPS_MAX_AGE_SECONDS
+            )
+
+        if should_flush:
+            self._flush_pending_ops()
+
+        logger.debug("Estado de documento %s actualizado a %s", document_id, status.value)
+
+    def _flush_pending_ops(self):
+        """Envía las operaciones de estado bufferizadas en un solo bulk_write"""
+        with self._pending_ops_lock:
+            ops, self._pending_ops = self._pending_ops, []
+            self._last_flush = time.monotonic()
+
+        if not ops:
+            return
+
+        try:
+            # w=0: los heartbeats son observacionales, no vale la pena esperar el ack
+            self.heartbeat_collection.bulk_write(ops, ordered=False)
+        except Exception as exc:
+            logger.warning("Error en bulk_write de estados de procesamiento: %s", exc)
+
     def _update_processed_document(self, document_id: ObjectId, result: Dict[str, Any]):
         """Actualiza el documento con el resultado final"""
-        
+
+        # Drenar transiciones de estado pendientes antes de la escritura final
+        self._flush_pending_ops()
+
+        if isinstance(result, ProcessingContext):
+            result = result.to_dict()
+
+        # Las transiciones acumuladas en memoria se anteponen al log del pipeline
+        # (orden aproximado: cada transición precede a las entradas de su capa)
+        with self._pending_ops_lock:
+            stage_log = self._status_log.pop(document_id, [])
+            self._last_status.pop(document_id, None)
+
         update_data = {
             "processing_status": ProcessingStatus.COMPLETED,
             "final_decision": result.get("final_decision"),
@@ -232,28 +423,40 @@ class BaseDocumentProcessor:
             "validation_results": result.get("validation_results"),
             "rejection_reasons": result.get("rejection_reasons"),
             "processing_cost_usd": result.get("total_cost", 0.0),
-            "processing_log": result.get("processing_log", []),
+            "processing_log": stage_log + result.get("processing_log", []),
             "document_type_id": result.get("document_type_id"),
             "document_type_name": result.get("document_type_name"),
             "authenticity_result": result.get("authenticity_result"),
             "authenticity_signals": result.get("authenticity_signals", []),
-            "download_automatic_result": result.get("download_automatic_result"),
-            "processed_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "download_automatic_result": result.get("download_automatic_result")
         }
-        
+        # No escribir campos ausentes: un rechazo temprano deja la mayoría en
+        # None y enviarlos solo agranda el update sin aportar información
+        update_data = {k: v for k, v in update_data.items() if v is not None}
+
         self.processed_documents_collection.update_one(
             {"_id": document_id},
-            {"$set": update_data}
+            {
+                "$set": update_data,
+                # Timestamps server-side: evita discrepancias de reloj y bytes en el wire
+                "$currentDate": {"updated_at": True, "processed_at": True}
+            }
         )
         
-        logger.info(f"Documento {document_id} actualizado con resultado final en base de datos")
+        logger.info("Documento %s actualizado con resultado final en base de datos", document_id)
     
     def _mark_document_as_failed(self, document_id: ObjectId, error_message: str):
         """Marca el documento como fallido"""
-        
+
         set_stage("failed")
-        
+
+        # El estado de fallo debe quedar persistido de inmediato
+        self._flush_pending_ops()
+
+        with self._pending_ops_lock:
+            stage_log = self._status_log.pop(document_id, [])
+            self._last_status.pop(document_id, None)
+
         self.processed_documents_collection.update_one(
             {"_id": document_id},
             {
@@ -261,9 +464,9 @@ class BaseDocumentProcessor:
                     "processing_status": ProcessingStatus.FAILED,
                     "final_decision": FinalDecision.REJECTED,
                     "rejection_reasons": [{"reason": "Error de procesamiento", "details": error_message}],
-                    "processing_log": [f"Error: {error_message}"],
-                    "updated_at": datetime.utcnow()
-                }
+                    "processing_log": stage_log + [f"Error: {error_message}"]
+                },
+                "$currentDate": {"updated_at": True}
             }
         )
 
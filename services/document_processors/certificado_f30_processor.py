@@ -2,58 +2,418 @@
 Procesador específico para Certificado F30 - Antecedentes Laborales y Previsionales
 """
 
+import functools
+import hashlib
 import logging
 import os
 import json
+import queue
+import re
+import openai
+import requests
+import threading
+import time
+from collections import OrderedDict
 from typing import Dict, Any, Optional
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
 from .base_processor import BaseDocumentProcessor
 from services.verificacion_dt.vm_verification_client import VMVerificationClient
 from services.storage_service import StorageService
-from database.mongodb_connection import get_collection
-from models.document_models import FinalDecision
+from models.document_models import FinalDecision, ProcessingStatus
+from utils.json_utils import dumps_compact, dumps_sorted_bytes, loads as json_loads
 
 logger = logging.getLogger(__name__)
 
+# Pool compartido para el I/O de descargas F30 (subida a la nube y extracción
+# del archivo descargado). Un solo pool por proceso evita crear hilos por
+# documento y acota la concurrencia total contra la VM y el storage en
+# ingestas masivas; tamaño configurable vía F30_CONCURRENCY.
+_F30_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("F30_CONCURRENCY", "16")),
+    thread_name_prefix="f30-io",
+)
+
+# Cola de archivos locales ya subidos pendientes de eliminar: el unlink sale
+# del camino crítico del documento y lo absorbe un hilo daemon
+_CLEANUP_QUEUE: "queue.Queue[str]" = queue.Queue()
+
+
+def _limpiar_archivos_en_background() -> None:
+    """Elimina en segundo plano los archivos locales encolados tras la subida"""
+    while True:
+        path = _CLEANUP_QUEUE.get()
+        try:
+            os.unlink(path)
+            logger.info("Archivo local eliminado en background: %s", path)
+        except FileNotFoundError:
+            logger.warning("Archivo local no encontrado para eliminar: %s", path)
+        except OSError as e:
+            logger.error("Error al eliminar archivo local %s: %s", path, e)
+        finally:
+            _CLEANUP_QUEUE.task_done()
+
+
+_cleanup_thread = threading.Thread(
+    target=_limpiar_archivos_en_background, name="f30-cleanup", daemon=True
+)
+_cleanup_thread.start()
+
+# Circuit breaker de la VM de verificación: con la VM degradada cada llamada
+# bloquea un worker hasta 180s; tras VM_CIRCUIT_FAILURES fallos consecutivos
+# se cortan las llamadas durante VM_CIRCUIT_COOLDOWN segundos y los documentos
+# fallan rápido (terminan en revisión manual) en vez de agotar el pool
+_VM_CIRCUIT_THRESHOLD = int(os.getenv("VM_CIRCUIT_FAILURES", "5"))
+_VM_CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("VM_CIRCUIT_COOLDOWN", "30"))
+_vm_circuit_lock = threading.Lock()
+_vm_consec_failures = 0
+_vm_circuit_open_until = 0.0
+
+
+def _vm_circuit_abierto() -> bool:
+    """Indica si el circuito hacia la VM está abierto (en enfriamiento)"""
+    with _vm_circuit_lock:
+        return time.monotonic() < _vm_circuit_open_until
+
+
+def _vm_registrar_resultado(exito: bool) -> None:
+    """Actualiza el contador de fallos consecutivos y abre el circuito si corresponde"""
+    global _vm_consec_failures, _vm_circuit_open_until
+    with _vm_circuit_lock:
+        if exito:
+            _vm_consec_failures = 0
+            return
+        _vm_consec_failures += 1
+        if _vm_consec_failures >= _VM_CIRCUIT_THRESHOLD:
+            _vm_circuit_open_until = time.monotonic() + _VM_CIRCUIT_COOLDOWN_SECONDS
+            logger.warning(
+                "Circuit breaker de VM abierto tras %d fallos consecutivos; "
+                "verificaciones suspendidas por %.0fs",
+                _vm_consec_failures, _VM_CIRCUIT_COOLDOWN_SECONDS,
+            )
+
+
+def _resultado_circuito_abierto(**extra: Any) -> Dict[str, Any]:
+    """Respuesta inmediata cuando el circuito está abierto"""
+    return {
+        "success": False,
+        "valid": False,
+        "message": "Verificación omitida: VM de verificación degradada (circuito abierto)",
+        "error": "circuit_open",
+        **extra,
+    }
+
+
+# Inserta un espacio cada 4 caracteres (sin espacio final), compilado una vez
+_GRUPOS_DE_4 = re.compile(r"(.{4})(?=.)")
+
+# Capacidad de response_format={"type": "json_object"} por modelo: se aprende
+# en la primera llamada y evita reintentar (y fallar) en cada análisis
+_MODEL_SUPPORTS_JSON: Dict[str, bool] = {}
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalizar_cadena(value: str) -> str:
+    """
+    Normaliza una cadena para comparación (espacios colapsados, mayúsculas).
+
+    Memoizado: los valores repetidos entre documentos (etiquetas, enums tipo
+    "SI"/"NO", nombres de empresa) se normalizan una sola vez por proceso.
+    """
+    return " ".join(value.split()).upper()
+
+# Campos cuya discrepancia sí puede invalidar el certificado; si todas las
+# diferencias caen fuera de este conjunto, no hace falta el análisis con IA
+_CRITICAL_FIELDS = frozenset({
+    "rut",
+    "folio_oficina",
+    "folio_anio",
+    "folio_numero_consecutivo",
+    "codigo_verificacion",
+    "codigo_certificado",
+    "fecha_emision",
+})
+
+# Centinela para distinguir "clave ausente" de "valor None" en la comparación
+# programática (ambos se consideran equivalentes al comparar)
+_MISSING = object()
+
+
+# Precio (entrada, salida) por token y por modelo; "default" cubre los no
+# listados. Precomputado por token (no por 1K) para evitar divisiones por
+# llamada. $0.15 / $0.60 por 1M tokens.
+_AI_PRICING_PER_TOKEN: Dict[str, tuple] = {
+    "default": (0.00015 / 1000, 0.0006 / 1000),
+}
+
+# Errores transitorios de la API de IA que justifican reintento; cualquier
+# otro error (p. ej. parámetro no soportado) propaga de inmediato
+_TRANSIENT_AI_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+)
+
+# Tope de generación del análisis de diferencias: la respuesta es un JSON de
+# cuatro campos (~100-300 tokens incluso listando muchos campos); 512 acota la
+# reserva de KV y la latencia sin arriesgar truncar el JSON
+_ANALYSIS_MAX_TOKENS = 512
+
+# Análisis con IA memoizado por contenido de los payloads: reintentos y
+# re-procesos sobre los mismos datos cuestan un lookup en vez de una completion
+_AI_ANALYSIS_CACHE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_AI_ANALYSIS_CACHE_LOCK = threading.Lock()
+_AI_ANALYSIS_CACHE_MAX = 512
+
+
+def _solo_alfanumerico(value: Any) -> Optional[str]:
+    """Reduce un valor normalizado a sus caracteres alfanuméricos (o None)."""
+    if isinstance(value, str):
+        return "".join(ch for ch in value if ch.isalnum())
+    if isinstance(value, (int, float)):
+        return str(value)
+    return None
+
+
+def _diferencia_clara(diff: Dict[str, Any]) -> bool:
+    """
+    True si ambos valores normalizados tienen contenido alfanumérico y este
+    difiere: una discrepancia así no puede ser solo de formato/puntuación,
+    por lo que el análisis con IA no aportaría nada.
+    """
+    a = _solo_alfanumerico(diff.get("normalized_uploaded"))
+    b = _solo_alfanumerico(diff.get("normalized_downloaded"))
+    return bool(a) and bool(b) and a != b
+
 
 class CertificadoF30Processor(BaseDocumentProcessor):
     """Procesador para Certificado F30 (Razón Social y Persona Natural)"""
-    
-    def __init__(self):
-        # El nombre del tipo de documento se determinará dinámicamente según tipo_f30
+
+    # Cliente de VM compartido por todas las instancias: reutiliza la sesión
+    # HTTP (keep-alive) en lugar de reconstruir el cliente por documento
+    _vm_client: Optional[VMVerificationClient] = None
+    _vm_client_lock = threading.Lock()
+
+    # Directorio de descargas: se lee el entorno y se crea una sola vez por
+    # proceso, no un stat/mkdir por documento
+    _download_dir: Optional[str] = None
+
+    @classmethod
+    def _get_vm_client(cls) -> VMVerificationClient:
+        """Obtiene el cliente de verificación compartido (lazy, thread-safe)"""
+        if cls._vm_client is None:
+            with cls._vm_client_lock:
+                if cls._vm_client is None:
+                    cls._vm_client = VMVerificationClient()
+        return cls._vm_client
+
+    @classmethod
+    def _ensure_download_dir(cls) -> str:
+        """Asegura que el directorio de descargas exista (una vez por proceso)"""
+        if cls._download_dir is None:
+            download_dir = os.getenv("F30_DOWNLOAD_DIR", "downloads/f30")
+            os.makedirs(download_dir, exist_ok=True)
+            cls._download_dir = download_dir
+        return cls._download_dir
+
+    def __init__(self, tipo_f30: str = "razon_social"):
+        # El tipo de F30 se fija por instancia: las rutas mantienen un
+        # procesador por tipo, de modo que los pipelines concurrentes sobre la
+        # misma instancia no compiten por document_type_name/tipo_f30
+        self.tipo_f30 = "persona_natural" if tipo_f30 == "persona_natural" else "razon_social"
+        if self.tipo_f30 == "persona_natural":
+            document_type_name = "Certificado F30 - Antecedentes Laborales y Previsionales - Persona Natural"
+        else:
+            document_type_name = "Certificado F30 - Antecedentes Laborales y Previsionales - Razón Social"
         super().__init__(
-            document_type_name="",  # Se establecerá dinámicamente
+            document_type_name=document_type_name,
             requires_authenticity=True  # Solo F30 requiere autenticidad
         )
-        self.tipo_f30 = None
-    
+        self._storage: Optional[StorageService] = None
+        self._storage_lock = threading.Lock()
+
+    def _get_storage(self) -> StorageService:
+        """Obtiene el servicio de storage compartido (lazy, thread-safe)
+
+        Construir StorageService por documento implica re-parsear credenciales
+        y abrir un pool de conexiones nuevo hacia el bucket en cada descarga.
+        """
+        if self._storage is None:
+            with self._storage_lock:
+                if self._storage is None:
+                    self._storage = StorageService()
+        return self._storage
+
+    def _buscar_resultado_por_hash(self, document_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Busca un procesamiento previo del mismo contenido (hash SHA-256 del PDF).
+
+        Re-ingestas de un F30 idéntico repiten portal, OCR y llamadas de IA sin
+        aportar información nueva. Si existe un documento con el mismo hash y
+        tipo_f30, no rechazado y dentro de la ventana F30_CACHE_TTL (horas,
+        0 = deshabilitado), se reutiliza su resultado. Cualquier fallo en el
+        hash o la consulta cae al pipeline completo.
+        """
+        ttl_hours = float(os.getenv("F30_CACHE_TTL", "0"))
+        if ttl_hours <= 0:
+            return None
+
+        # El hash viaja con el documento, no en la instancia compartida:
+        # un fallo de streaming no puede dejar el hash del documento
+        # anterior asociado a este, ni dos pipelines concurrentes pisarse
+        content_hash = self._hash_contenido_remoto(document_data["file_url"])
+        if content_hash is None:
+            return None
+        document_data["content_hash"] = content_hash
+
+        try:
+            return self.processed_documents_collection.find_one(
+                {
+                    "content_hash": content_hash,
+                    "tipo_f30": self.tipo_f30,
+                    "final_decision": {"$ne": FinalDecision.REJECTED},
+                    "processed_at": {"$gte": datetime.utcnow() - timedelta(hours=ttl_hours)},
+                },
+                sort=[("processed_at", -1)],
+            )
+        except Exception as e:
+            logger.warning(f"Error al consultar caché por hash de contenido: {e}")
+            return None
+
+    def _hash_contenido_remoto(self, file_url: str) -> Optional[str]:
+        """
+        Calcula el SHA-256 del contenido de una URL en streaming (None si
+        falla). Los F30 de varios MB no necesitan materializarse completos en
+        memoria solo para calcular el hash.
+        """
+        try:
+            with requests.get(file_url, timeout=30, stream=True) as response:
+                response.raise_for_status()
+                digest = hashlib.sha256()
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    digest.update(chunk)
+            return digest.hexdigest()
+        except Exception as e:
+            logger.warning(f"No se pudo calcular hash del contenido de {file_url}: {e}")
+            return None
+
+    def _hash_archivo_local(self, file_path: str) -> Optional[str]:
+        """Calcula el SHA-256 de un archivo local (None si falla la lectura)"""
+        try:
+            with open(file_path, "rb") as f:
+                return hashlib.file_digest(f, "sha256").hexdigest()
+        except Exception as e:
+            logger.warning(f"No se pudo calcular hash del archivo {file_path}: {e}")
+            return None
+
+    def _es_pdf_valido(self, file_path: str) -> bool:
+        """
+        Verifica por tamaño y magic bytes que el archivo descargado sea un PDF
+        real; el portal a veces devuelve una página HTML de error o un stub
+        """
+        min_bytes = int(os.getenv("F30_MIN_PDF_BYTES", "4096"))
+        try:
+            if os.path.getsize(file_path) < min_bytes:
+                return False
+            with open(file_path, "rb") as f:
+                return f.read(5) == b"%PDF-"
+        except OSError as e:
+            logger.warning(f"No se pudo validar el archivo descargado {file_path}: {e}")
+            return False
+
+    def _registrar_resultado_cacheado(
+        self, document_data: Dict[str, Any], previo: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Crea el registro del documento actual reutilizando un resultado previo"""
+
+        processed_doc = self._create_processed_document(document_data)
+
+        campos_reutilizados = {
+            campo: previo.get(campo)
+            for campo in (
+                "final_decision",
+                "ocr_text",
+                "extracted_data",
+                "validation_results",
+                "rejection_reasons",
+                "document_type_id",
+                "document_type_name",
+                "authenticity_result",
+                "authenticity_signals",
+                "download_automatic_result",
+                "download_info",
+                "extracted_data_downloaded",
+                "data_comparison",
+                "tipo_f30",
+            )
+            if previo.get(campo) is not None
+        }
+
+        log_entry = (
+            f"Resultado reutilizado del documento {previo.get('document_id')} "
+            "(contenido idéntico, caché por hash)"
+        )
+        self.processed_documents_collection.update_one(
+            {"_id": processed_doc["_id"]},
+            {
+                "$set": {
+                    **campos_reutilizados,
+                    "content_hash": document_data.get("content_hash"),
+                    "processing_status": ProcessingStatus.COMPLETED,
+                    "processing_log": [log_entry],
+                    "processing_cost_usd": 0.0,
+                },
+                "$currentDate": {"updated_at": True, "processed_at": True},
+            },
+        )
+
+        logger.info(
+            "Documento %s resuelto desde caché por hash (origen: %s)",
+            document_data["document_id"], previo.get("document_id"),
+        )
+        return {
+            **campos_reutilizados,
+            "total_cost": 0.0,
+            "processing_log": [log_entry],
+        }
+
     def process_document(self, document_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Procesa un documento F30 completo siguiendo el pipeline de capas.
-        Selecciona el tipo de documento correcto según tipo_f30.
-        
+        El tipo de documento queda fijado al construir el procesador; la ruta
+        selecciona la instancia correcta según el tipo_f30 de la solicitud.
+
         Args:
-            document_data: Datos del documento a procesar, debe incluir 'tipo_f30'
-            
+            document_data: Datos del documento a procesar
+
         Returns:
             Dict con el resultado del procesamiento
         """
-        
-        # Determinar el nombre del tipo de documento según tipo_f30
-        self.tipo_f30 = document_data.get("tipo_f30", "razon_social")
-        
-        if self.tipo_f30 == "persona_natural":
-            self.document_type_name = "Certificado F30 - Antecedentes Laborales y Previsionales - Persona Natural"
-        else:  # razon_social (default)
-            self.document_type_name = "Certificado F30 - Antecedentes Laborales y Previsionales - Razón Social"
-        
+
         logger.info(f"Procesando F30 tipo: {self.tipo_f30} ({self.document_type_name})")
-        
+
+        # Reutilizar un resultado previo si el mismo contenido ya fue procesado
+        previo = self._buscar_resultado_por_hash(document_data)
+        if previo is not None:
+            return self._registrar_resultado_cacheado(document_data, previo)
+
         # Llamar al método padre con el nombre correcto
         return super().process_document(document_data)
-    
+
+    def _create_processed_document(self, document_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Extiende el registro base con el hash de contenido calculado para la
+        caché, de modo que el resto del pipeline lo lea desde el contexto del
+        documento (context["processed_doc"]) y no desde la instancia
+        """
+        processed_doc = super()._create_processed_document(document_data)
+        content_hash = document_data.get("content_hash")
+        if content_hash:
+            processed_doc["content_hash"] = content_hash
+        return processed_doc
+
+
     def _execute_processing_pipeline(self, processed_doc: Dict[str, Any]) -> Dict[str, Any]:
         """
         Ejecuta el pipeline completo de procesamiento con descarga automática
@@ -103,91 +463,176 @@ class CertificadoF30Processor(BaseDocumentProcessor):
                 # Descarga para razón social (usando código de certificado)
                 result = self._descargar_razon_social(extracted_data, document_id)
             
+            # Un solo timestamp para todo el evento de descarga: la precisión
+            # a nivel de segundo es suficiente y evita lecturas de reloj repetidas
+            event_time = datetime.utcnow()
+
             # Actualizar información de descarga
             download_info["download_status"] = "completed" if result.get("success") else "failed"
             download_info["portal_message"] = result.get("portal_message")
             download_info["download_error"] = result.get("error")
-            download_info["downloaded_at"] = datetime.utcnow()
+            download_info["downloaded_at"] = event_time
             
             # Si se descargó el archivo, subirlo a la nube y extraer datos
             if result.get("downloaded_file") and os.path.exists(result.get("downloaded_file")):
                 downloaded_file_path = result.get("downloaded_file")
                 download_info["downloaded_file_path"] = downloaded_file_path
                 download_info["downloaded_file_name"] = os.path.basename(downloaded_file_path)
-                
-                # Subir a la nube
+
+                # Subir a la nube y, si el servicio de OCR soporta lectura local,
+                # extraer los datos del archivo descargado en paralelo: ambas
+                # operaciones son I/O puro contra servicios remotos y solapar
+                # la extracción con la subida recorta el camino crítico
                 logger.info(f"Subiendo archivo descargado a la nube: {downloaded_file_path}")
-                storage_service = StorageService()
-                upload_result = storage_service.upload_file_to_bucket(downloaded_file_path)
-                
-                if upload_result.get("success"):
-                    download_info["upload_status"] = "completed"
-                    download_info["cloud_url"] = upload_result.get("public_url")
-                    download_info["cloud_bucket_path"] = upload_result.get("bucket_path")
-                    download_info["uploaded_at"] = datetime.utcnow()
-                    logger.info(f"Archivo subido exitosamente a la nube: {upload_result.get('public_url')}")
-                    
-                    # Actualizar downloaded_file en result con la URL de GCS en lugar de la ruta local
-                    cloud_url = upload_result.get("public_url")
-                    result["downloaded_file"] = cloud_url
-                    logger.info(f"Actualizado downloaded_file a URL de GCS: {cloud_url}")
-                    
-                    # Eliminar archivo local después de subirlo exitosamente a la nube
-                    try:
-                        if os.path.exists(downloaded_file_path):
-                            os.remove(downloaded_file_path)
-                            logger.info(f"Archivo local eliminado exitosamente: {downloaded_file_path}")
-                        else:
-                            logger.warning(f"Archivo local no encontrado para eliminar: {downloaded_file_path}")
-                    except Exception as e:
-                        logger.error(f"Error al eliminar archivo local {downloaded_file_path}: {e}", exc_info=True)
-                        # No fallar el proceso si no se puede eliminar el archivo local
+                storage_service = self._get_storage()
+                extraction_future = None
+
+                # Si el portal devolvió exactamente los mismos bytes que el
+                # archivo enviado por el usuario, la segunda extracción OCR+IA
+                # solo reproduciría extracted_data: se reutiliza tal cual y la
+                # comparación es trivialmente exitosa
+                # No gastar OCR+IA si el portal devolvió algo que no es un
+                # certificado (página de error HTML, stub minúsculo)
+                pdf_valido = self._es_pdf_valido(downloaded_file_path)
+                if not pdf_valido:
+                    logger.warning(
+                        f"El archivo descargado del portal no parece un PDF válido: {downloaded_file_path}"
+                    )
+
+                bytes_identicos = False
+                content_hash = context["processed_doc"].get("content_hash")
+                if pdf_valido and not content_hash:
+                    # Con la caché por hash deshabilitada (F30_CACHE_TTL=0) el
+                    # hash no se calculó al inicio; calcularlo aquí mantiene el
+                    # atajo byte a byte independiente de esa configuración
+                    content_hash = self._hash_contenido_remoto(
+                        context["processed_doc"]["file_url"]
+                    )
+                    if content_hash:
+                        context["processed_doc"]["content_hash"] = content_hash
+                if pdf_valido and content_hash:
+                    downloaded_sha = self._hash_archivo_local(downloaded_file_path)
+                    bytes_identicos = downloaded_sha == content_hash
+
+                upload_future = _F30_POOL.submit(
+                    storage_service.upload_file_to_bucket, downloaded_file_path
+                )
+                if pdf_valido and not bytes_identicos and hasattr(self.ocr_service, "extract_text_from_path"):
+                    extraction_future = _F30_POOL.submit(
+                        self._extraer_datos_documento_descargado,
+                        downloaded_file_path,
+                        context,
+                        True,
+                    )
+                try:
+                    upload_result = upload_future.result()
+
+                    if upload_result.get("success"):
+                        download_info["upload_status"] = "completed"
+                        download_info["cloud_url"] = upload_result.get("public_url")
+                        download_info["cloud_bucket_path"] = upload_result.get("bucket_path")
+                        download_info["uploaded_at"] = event_time
+                        logger.info(f"Archivo subido exitosamente a la nube: {upload_result.get('public_url')}")
                     
-                    # Extraer datos del documento descargado usando la URL de la nube
-                    logger.info(f"Extrayendo datos del documento descargado desde URL de la nube: {cloud_url}")
-                    try:
-                        extracted_data_downloaded = self._extraer_datos_documento_descargado(
-                            cloud_url,
-                            context
-                        )
-                        download_info["extracted_data_downloaded"] = extracted_data_downloaded
-                        if extracted_data_downloaded:
-                            logger.info("Datos extraídos exitosamente del documento descargado")
-                            
-                            # Comparar datos del documento enviado vs descargado
-                            logger.info("Comparando datos del documento enviado con el descargado")
-                            comparison_result = self._comparar_datos_documentos(
-                                extracted_data,
-                                extracted_data_downloaded,
-                                context
-                            )
-                            download_info["data_comparison"] = comparison_result
-                            
-                            if not comparison_result.get("match", False):
-                                # Hay diferencias significativas, rechazar documento
+                        # Actualizar downloaded_file en result con la URL de GCS en lugar de la ruta local
+                        cloud_url = upload_result.get("public_url")
+                        result["downloaded_file"] = cloud_url
+                        logger.info(f"Actualizado downloaded_file a URL de GCS: {cloud_url}")
+
+                        # Obtener los datos extraídos: de la extracción local en paralelo
+                        # si está disponible, o desde la URL de la nube como antes
+                        try:
+                            if not pdf_valido:
+                                extracted_data_downloaded = None
+                            elif bytes_identicos:
+                                logger.info("Documento descargado idéntico byte a byte al enviado; se reutilizan los datos extraídos")
+                                extracted_data_downloaded = extracted_data
+                            elif extraction_future is not None:
+                                extracted_data_downloaded = extraction_future.result()
+                            else:
+                                logger.info(f"Extrayendo datos del documento descargado desde URL de la nube: {cloud_url}")
+                                extracted_data_downloaded = self._extraer_datos_documento_descargado(
+                                    cloud_url,
+                                    context
+                                )
+
+                            download_info["extracted_data_downloaded"] = extracted_data_downloaded
+                            if not pdf_valido:
+                                download_info["data_comparison"] = {
+                                    "match": False,
+                                    "differences": [],
+                                    "differences_summary": "El portal devolvió un archivo que no es un PDF válido",
+                                    "comparison_method": "invalid_download"
+                                }
+                                context["processing_log"].append(
+                                    "Extracción omitida: el archivo descargado del portal no es un PDF válido"
+                                )
                                 context["rejection_reasons"].append({
-                                    "reason": "Diferencia entre documento enviado y descargado del portal oficial",
-                                    "details": comparison_result.get("differences_summary", "Se encontraron diferencias entre los documentos"),
-                                    "type": "data_mismatch",
-                                    "differences": comparison_result.get("differences", [])
+                                    "reason": "Descarga automática devolvió un archivo no válido",
+                                    "details": "El archivo descargado del portal no es un PDF válido; no se pudo verificar el documento",
+                                    "type": "invalid_download"
                                 })
-                                context["final_decision"] = FinalDecision.REJECTED
-                                logger.warning(f"Documento rechazado por diferencias: {comparison_result.get('differences_summary')}")
+                                context["final_decision"] = FinalDecision.MANUAL_REVIEW
+                                logger.warning("Documento derivado a revisión manual: el portal devolvió un archivo no válido")
+                            elif bytes_identicos:
+                                download_info["data_comparison"] = {
+                                    "match": True,
+                                    "differences": [],
+                                    "differences_summary": "Documento descargado idéntico byte a byte al enviado",
+                                    "comparison_method": "bytes_identical"
+                                }
+                                context["processing_log"].append(
+                                    "Comparación omitida: el documento descargado es idéntico byte a byte al enviado"
+                                )
+                            elif extracted_data_downloaded:
+                                logger.info("Datos extraídos exitosamente del documento descargado")
+
+                                # Comparar datos del documento enviado vs descargado
+                                logger.info("Comparando datos del documento enviado con el descargado")
+                                comparison_result = self._comparar_datos_documentos(
+                                    extracted_data,
+                                    extracted_data_downloaded,
+                                    context
+                                )
+                                download_info["data_comparison"] = comparison_result
+                            
+                                if not comparison_result.get("match", False):
+                                    # Hay diferencias significativas, rechazar documento
+                                    context["rejection_reasons"].append({
+                                        "reason": "Diferencia entre documento enviado y descargado del portal oficial",
+                                        "details": comparison_result.get("differences_summary", "Se encontraron diferencias entre los documentos"),
+                                        "type": "data_mismatch",
+                                        "differences": comparison_result.get("differences", [])
+                                    })
+                                    context["final_decision"] = FinalDecision.REJECTED
+                                    logger.warning(f"Documento rechazado por diferencias: {comparison_result.get('differences_summary')}")
+                                else:
+                                    logger.info("Los datos del documento enviado coinciden con el descargado")
                             else:
-                                logger.info("Los datos del documento enviado coinciden con el descargado")
-                        else:
-                            logger.warning("No se pudieron extraer datos del documento descargado")
-                    except Exception as e:
-                        logger.error(f"Error al extraer datos del documento descargado: {e}", exc_info=True)
+                                logger.warning("No se pudieron extraer datos del documento descargado")
+                        except Exception as e:
+                            logger.error(f"Error al extraer datos del documento descargado: {e}", exc_info=True)
+                            download_info["extracted_data_downloaded"] = None
+                    else:
+                        download_info["upload_status"] = "failed"
+                        download_info["upload_error"] = upload_result.get("error")
+                        logger.error(f"Error al subir archivo a la nube: {upload_result.get('error')}")
                         download_info["extracted_data_downloaded"] = None
-                else:
-                    download_info["upload_status"] = "failed"
-                    download_info["upload_error"] = upload_result.get("error")
-                    logger.error(f"Error al subir archivo a la nube: {upload_result.get('error')}")
-                    download_info["extracted_data_downloaded"] = None
+                finally:
+                    # Todos los caminos de salida (subida fallida, error de
+                    # extracción, excepción inesperada) liberan el archivo
+                    # local: se drena la extracción en vuelo para no borrar
+                    # el archivo mientras un hilo aún lo lee y luego se
+                    # encola el unlink al hilo de limpieza
+                    if extraction_future is not None:
+                        try:
+                            extraction_future.result()
+                        except Exception:
+                            pass
+                    _CLEANUP_QUEUE.put(downloaded_file_path)
             
             # Guardar información completa en base de datos (incluye comparación si existe)
-            self._guardar_informacion_descarga(document_id, download_info, result, context)
+            self._guardar_informacion_descarga(document_id, download_info, result, context, event_time)
             
             # Agregar resultado al contexto
             context["download_automatic_result"] = result
@@ -271,13 +716,24 @@ class CertificadoF30Processor(BaseDocumentProcessor):
         
         logger.info(f"Descargando F30 persona natural: {folio_oficina}/{folio_anio}/{folio_numero_consecutivo} - {codigo_verificacion}")
         
-        # Configurar directorio de descarga
-        download_dir = os.getenv("F30_DOWNLOAD_DIR", "downloads/f30")
-        os.makedirs(download_dir, exist_ok=True)
+        # Configurar directorio de descarga (memoizado a nivel de clase)
+        self._ensure_download_dir()
         
+        folios_ingresados = {
+            "folio_oficina": folio_oficina,
+            "folio_anio": folio_anio,
+            "folio_numero_consecutivo": folio_numero_consecutivo,
+            "codigo_verificacion": codigo_verificacion
+        }
+
+        # Fallo rápido si la VM está en enfriamiento por fallos consecutivos
+        if _vm_circuit_abierto():
+            logger.warning(f"Circuito de VM abierto; se omite la verificación para {document_id}")
+            return _resultado_circuito_abierto(folios_ingresados=folios_ingresados)
+
         # Usar cliente de VM para verificación
         try:
-            client = VMVerificationClient()
+            client = self._get_vm_client()
             result = client.verificar_persona_natural(
                 folio_oficina=folio_oficina,
                 folio_anio=folio_anio,
@@ -286,20 +742,17 @@ class CertificadoF30Processor(BaseDocumentProcessor):
                 document_id=document_id,
                 timeout=180
             )
+            _vm_registrar_resultado(result.get("error") is None)
             return result
         except Exception as e:
             logger.error(f"Error al ejecutar verificación en thread separado: {e}", exc_info=True)
+            _vm_registrar_resultado(False)
             return {
                 "success": False,
                 "valid": False,
                 "message": "Error durante la verificación",
                 "error": str(e),
-                "folios_ingresados": {
-                    "folio_oficina": folio_oficina,
-                    "folio_anio": folio_anio,
-                    "folio_numero_consecutivo": folio_numero_consecutivo,
-                    "codigo_verificacion": codigo_verificacion
-                }
+                "folios_ingresados": folios_ingresados
             }
     
     def _descargar_razon_social(
@@ -323,26 +776,32 @@ class CertificadoF30Processor(BaseDocumentProcessor):
         
         logger.info(f"Descargando F30 razón social con código: {codigo_certificado}")
         
-        # Configurar directorio de descarga
-        download_dir = os.getenv("F30_DOWNLOAD_DIR", "downloads/f30")
-        os.makedirs(download_dir, exist_ok=True)
+        # Configurar directorio de descarga (memoizado a nivel de clase)
+        self._ensure_download_dir()
         
         # Formatear código (puede venir con o sin espacios)
         codigo_formateado = codigo_certificado.replace(" ", "").upper()
         # Agregar espacios cada 4 caracteres si no los tiene
         if " " not in codigo_certificado and len(codigo_formateado) >= 8:
-            codigo_formateado = " ".join([codigo_formateado[i:i+4] for i in range(0, len(codigo_formateado), 4)])
+            codigo_formateado = _GRUPOS_DE_4.sub(r"\1 ", codigo_formateado)
         
+        # Fallo rápido si la VM está en enfriamiento por fallos consecutivos
+        if _vm_circuit_abierto():
+            logger.warning(f"Circuito de VM abierto; se omite la verificación para {document_id}")
+            return _resultado_circuito_abierto()
+
         # Usar cliente de VM para verificación
         try:
-            client = VMVerificationClient()
+            client = self._get_vm_client()
             result = client.verificar_portal_documental(
                 codigo=codigo_formateado,
                 document_id=document_id
             )
+            _vm_registrar_resultado(result.get("error") is None)
             return result
         except Exception as e:
             logger.error(f"Error al ejecutar verificación en thread separado: {e}", exc_info=True)
+            _vm_registrar_resultado(False)
             return {
                 "success": False,
                 "valid": False,
@@ -355,20 +814,41 @@ class CertificadoF30Processor(BaseDocumentProcessor):
         document_id: str, 
         download_info: Dict[str, Any],
         result: Dict[str, Any],
-        context: Optional[Dict[str, Any]] = None
+        context: Optional[Dict[str, Any]] = None,
+        event_time: Optional[datetime] = None
     ):
         """Guarda toda la información del proceso de descarga en la base de datos"""
         try:
-            collection = get_collection("OCR_processed_documents")
-            
+            # Handle cacheado en el procesador; evita resolver la colección
+            # en cada descarga
+            collection = self.processed_documents_collection
+
+            # Reutilizar el timestamp del evento de descarga si viene del caller
+            if event_time is None:
+                event_time = datetime.utcnow()
+
+            # download_info se persiste sin los blobs anidados: los datos
+            # extraídos y la comparación ya van como campos de primer nivel y
+            # duplicarlos dentro de download_info obliga a pymongo a codificar
+            # dos veces el mismo árbol BSON en cada escritura
+            download_info_persistido = {
+                k: v for k, v in download_info.items()
+                if k not in ("extracted_data_downloaded", "data_comparison")
+            }
+
             # Preparar objeto completo de información de descarga
             download_data = {
-                "download_info": download_info,
+                "download_info": download_info_persistido,
                 "download_automatic_result": result,
-                "download_automatic_at": datetime.utcnow(),
+                "download_automatic_at": event_time,
                 "tipo_f30": self.tipo_f30,
-                "updated_at": datetime.utcnow()
+                "updated_at": event_time
             }
+
+            # Hash del contenido para reutilizar este resultado en re-ingestas
+            content_hash = context["processed_doc"].get("content_hash") if context else None
+            if content_hash:
+                download_data["content_hash"] = content_hash
             
             # Guardar explícitamente los datos extraídos del documento descargado en un campo separado
             # para facilitar consultas y análisis posteriores
@@ -383,68 +863,54 @@ class CertificadoF30Processor(BaseDocumentProcessor):
             if result.get("proxy_usage"):
                 download_data["proxy_usage"] = result["proxy_usage"]
                 download_data["proxy_usage_mb"] = result["proxy_usage"].get("estimated_mb", 0.0)
-            
-            collection.update_one(
-                {"document_id": document_id},
-                {
-                    "$set": download_data,
-                    "$push": {
-                        "processing_log": {
-                            "$each": [
-                                f"[DESCARGA AUTOMÁTICA] Tipo: {self.tipo_f30} - {result.get('message', 'Completada')}",
-                                f"[DESCARGA AUTOMÁTICA] Éxito: {result.get('success', False)}, Válido: {result.get('valid', False)}",
-                                f"[DESCARGA AUTOMÁTICA] Status descarga: {download_info.get('download_status')}, Status upload: {download_info.get('upload_status')}"
-                            ],
-                            "$slice": -1000
-                        }
-                    }
-                }
-            )
-            
-            # Si hay folios ingresados, registrarlos también
+
+            # Si hay folios ingresados, registrarlos en el mismo $set
             if result.get("folios_ingresados"):
-                collection.update_one(
-                    {"document_id": document_id},
-                    {
-                        "$set": {
-                            "download_folios_ingresados": result.get("folios_ingresados")
-                        }
-                    }
-                )
-            
+                download_data["download_folios_ingresados"] = result.get("folios_ingresados")
+
+            all_logs = [
+                f"[DESCARGA AUTOMÁTICA] Tipo: {self.tipo_f30} - {result.get('message', 'Completada')}",
+                f"[DESCARGA AUTOMÁTICA] Éxito: {result.get('success', False)}, Válido: {result.get('valid', False)}",
+                f"[DESCARGA AUTOMÁTICA] Status descarga: {download_info.get('download_status')}, Status upload: {download_info.get('upload_status')}"
+            ]
+
             # Si hay resultado de comparación de datos, agregarlo a los logs
             if download_info.get("data_comparison"):
                 comparison = download_info["data_comparison"]
-                comparison_logs = [
+                all_logs.extend([
                     f"[COMPARACIÓN DE DATOS] Método: {comparison.get('comparison_method', 'unknown')}",
                     f"[COMPARACIÓN DE DATOS] Coinciden: {comparison.get('match', False)}",
                     f"[COMPARACIÓN DE DATOS] Resumen: {comparison.get('differences_summary', 'N/A')}"
-                ]
-                
+                ])
+
                 if comparison.get("differences"):
-                    comparison_logs.append(
+                    all_logs.append(
                         f"[COMPARACIÓN DE DATOS] Número de diferencias: {len(comparison['differences'])}"
                     )
                     # Agregar detalles de diferencias (limitado a primeros 5 para no saturar logs)
                     for i, diff in enumerate(comparison["differences"][:5]):
-                        comparison_logs.append(
+                        all_logs.append(
                             f"[COMPARACIÓN DE DATOS] Diferencia {i+1}: Campo '{diff.get('field')}' - "
                             f"Enviado: {str(diff.get('uploaded_value', 'N/A'))[:50]}, "
                             f"Descargado: {str(diff.get('downloaded_value', 'N/A'))[:50]}"
                         )
-                
-                collection.update_one(
-                    {"document_id": document_id},
-                    {
-                        "$push": {
-                            "processing_log": {
-                                "$each": comparison_logs,
-                                "$slice": -1000
-                            }
-                        }
+
+            # Una sola operación con todo el $set. Los logs entran al log del
+            # contexto (deque acotado en cliente) y se persisten completos con
+            # el $set de la escritura final, sin $push+$slice server-side
+            update_doc: Dict[str, Any] = {"$set": download_data}
+            if context is not None:
+                context["processing_log"].extend(all_logs)
+            else:
+                update_doc["$push"] = {
+                    "processing_log": {
+                        "$each": all_logs,
+                        "$slice": -1000
                     }
-                )
-            
+                }
+
+            collection.update_one({"document_id": document_id}, update_doc)
+
             logger.info(f"Información de descarga guardada para documento {document_id}")
         except Exception as e:
             logger.error(f"Error al guardar información de descarga: {e}", exc_info=True)
@@ -452,15 +918,18 @@ class CertificadoF30Processor(BaseDocumentProcessor):
     def _extraer_datos_documento_descargado(
         self,
         file_url: str,
-        context: Dict[str, Any]
+        context: Dict[str, Any],
+        desde_ruta_local: bool = False
     ) -> Optional[Dict[str, Any]]:
         """
         Extrae datos del documento descargado del portal usando OCR y el schema de extracción
-        
+
         Args:
-            file_url: URL del archivo subido a la nube
+            file_url: URL del archivo subido a la nube, o ruta local si desde_ruta_local es True
             context: Contexto del procesamiento que contiene la configuración del tipo de documento
-        
+            desde_ruta_local: Si True, ejecuta el OCR sobre el archivo local en lugar
+                de la URL de la nube (requiere que el servicio soporte extract_text_from_path)
+
         Returns:
             Dict con los datos extraídos o None si hay error
         """
@@ -476,9 +945,13 @@ class CertificadoF30Processor(BaseDocumentProcessor):
                 logger.warning("No hay schema de extracción para el documento descargado")
                 return None
             
-            # Ejecutar OCR en el archivo desde la URL de la nube
-            logger.info(f"Ejecutando OCR en documento descargado desde URL: {file_url}")
-            ocr_text, ocr_cost = self.ocr_service.extract_text_from_url(file_url)
+            # Ejecutar OCR sobre el archivo local o desde la URL de la nube
+            if desde_ruta_local:
+                logger.info(f"Ejecutando OCR en documento descargado desde ruta local: {file_url}")
+                ocr_text, ocr_cost = self.ocr_service.extract_text_from_path(file_url)
+            else:
+                logger.info(f"Ejecutando OCR en documento descargado desde URL: {file_url}")
+                ocr_text, ocr_cost = self.ocr_service.extract_text_from_url(file_url)
             
             if not ocr_text or len(ocr_text.strip()) == 0:
                 logger.warning("No se pudo extraer texto del documento descargado")
@@ -589,8 +1062,12 @@ class CertificadoF30Processor(BaseDocumentProcessor):
             }
         """
         try:
+            # Una sola resolución de la lista de log para los ~6 appends del
+            # método (el handler de excepción la resuelve por su cuenta)
+            processing_log = context["processing_log"]
+
             logger.info("Iniciando comparación de datos entre documento enviado y descargado")
-            context["processing_log"].append("Iniciando comparación de datos entre documentos")
+            processing_log.append("Iniciando comparación de datos entre documentos")
             
             # Primero: comparación programática campo por campo
             programmatic_result = self._comparar_datos_programatico(
@@ -601,7 +1078,7 @@ class CertificadoF30Processor(BaseDocumentProcessor):
             # Si no hay diferencias en la comparación programática, retornar éxito
             if programmatic_result["match"]:
                 logger.info("Los datos coinciden perfectamente (comparación programática)")
-                context["processing_log"].append("Comparación programática: Los datos coinciden perfectamente")
+                processing_log.append("Comparación programática: Los datos coinciden perfectamente")
                 return {
                     "match": True,
                     "differences": [],
@@ -610,9 +1087,55 @@ class CertificadoF30Processor(BaseDocumentProcessor):
                     "programmatic_result": programmatic_result
                 }
             
+            # Si todas las diferencias están en campos no críticos, no hay
+            # nada que el análisis con IA pueda invalidar: evitar la llamada
+            campos_distintos = {d["field"] for d in programmatic_result["differences"]}
+            if not campos_distintos & _CRITICAL_FIELDS:
+                logger.info(
+                    "Las %d diferencias afectan solo campos no críticos; se omite el análisis con IA",
+                    len(programmatic_result["differences"])
+                )
+                processing_log.append(
+                    f"Comparación programática: {len(programmatic_result['differences'])} diferencias "
+                    "solo en campos no críticos; análisis con IA omitido"
+                )
+                return {
+                    "match": True,
+                    "differences": programmatic_result["differences"],
+                    "differences_summary": "Diferencias solo en campos no críticos",
+                    "comparison_method": "programmatic_critical_only",
+                    "programmatic_result": programmatic_result
+                }
+
+            # Si algún campo crítico difiere en su contenido alfanumérico, la
+            # discrepancia no es de formato: no hay nada que analizar con IA
+            diferencias_claras = [
+                d for d in programmatic_result["differences"]
+                if d["field"] in _CRITICAL_FIELDS and _diferencia_clara(d)
+            ]
+            if diferencias_claras:
+                campos_claros = ", ".join(d["field"] for d in diferencias_claras)
+                logger.info(
+                    "Diferencias de contenido en campos críticos (%s); se omite el análisis con IA",
+                    campos_claros
+                )
+                processing_log.append(
+                    f"Comparación programática: diferencias de contenido en campos críticos "
+                    f"({campos_claros}); análisis con IA omitido"
+                )
+                return {
+                    "match": False,
+                    "differences": programmatic_result["differences"],
+                    "differences_summary": (
+                        f"Diferencias de contenido en campos críticos: {campos_claros}"
+                    ),
+                    "comparison_method": "programmatic_strict",
+                    "programmatic_result": programmatic_result
+                }
+
             # Si hay diferencias, usar IA para determinar si son significativas
             logger.info(f"Se encontraron {len(programmatic_result['differences'])} diferencias. Analizando con IA si son significativas...")
-            context["processing_log"].append(
+            processing_log.append(
                 f"Comparación programática encontró {len(programmatic_result['differences'])} diferencias. "
                 "Analizando con IA si son significativas..."
             )
@@ -630,12 +1153,12 @@ class CertificadoF30Processor(BaseDocumentProcessor):
             
             if match:
                 logger.info(f"IA determinó que las diferencias no son significativas: {differences_summary}")
-                context["processing_log"].append(
+                processing_log.append(
                     f"Análisis IA: Las diferencias no son significativas. {differences_summary}"
                 )
             else:
                 logger.warning(f"IA determinó que hay diferencias significativas: {differences_summary}")
-                context["processing_log"].append(
+                processing_log.append(
                     f"Análisis IA: Se encontraron diferencias significativas. {differences_summary}"
                 )
             
@@ -672,31 +1195,57 @@ class CertificadoF30Processor(BaseDocumentProcessor):
         Returns:
             Dict con match (bool) y differences (lista)
         """
+        # Camino rápido: entradas idénticas (misma referencia o iguales campo a
+        # campo sin normalizar) no necesitan normalización alguna; el == de
+        # dict es un recorrido en C que corta en la primera discrepancia
+        if data1 is data2 or data1 == data2:
+            return {
+                "match": True,
+                "differences": [],
+                "total_fields": len(data1),
+                "matching_fields": len(data1)
+            }
+
+        # Dos recorridos directos en lugar de materializar los dos dicts
+        # normalizados más la unión de claves: primero data1 contra data2
+        # (un campo ausente equivale a None, igual que con .get) y luego solo
+        # las claves exclusivas de data2
+        normalizar = self._normalizar_valor_comparacion
         differences = []
-        all_keys = set(data1.keys()) | set(data2.keys())
-        
-        for key in all_keys:
-            val1 = data1.get(key)
-            val2 = data2.get(key)
-            
-            # Normalizar valores para comparación
-            normalized_val1 = self._normalizar_valor_comparacion(val1)
-            normalized_val2 = self._normalizar_valor_comparacion(val2)
-            
-            if normalized_val1 != normalized_val2:
+        total_fields = len(data1)
+
+        for key, val1 in data1.items():
+            val2 = data2.get(key, _MISSING)
+            norm1_val = normalizar(val1)
+            norm2_val = None if val2 is _MISSING else normalizar(val2)
+            if norm1_val != norm2_val:
                 differences.append({
                     "field": key,
                     "uploaded_value": val1,
+                    "downloaded_value": None if val2 is _MISSING else val2,
+                    "normalized_uploaded": norm1_val,
+                    "normalized_downloaded": norm2_val
+                })
+
+        for key, val2 in data2.items():
+            if key in data1:
+                continue
+            total_fields += 1
+            norm2_val = normalizar(val2)
+            if norm2_val is not None:
+                differences.append({
+                    "field": key,
+                    "uploaded_value": None,
                     "downloaded_value": val2,
-                    "normalized_uploaded": normalized_val1,
-                    "normalized_downloaded": normalized_val2
+                    "normalized_uploaded": None,
+                    "normalized_downloaded": norm2_val
                 })
-        
+
         return {
             "match": len(differences) == 0,
             "differences": differences,
-            "total_fields": len(all_keys),
-            "matching_fields": len(all_keys) - len(differences)
+            "total_fields": total_fields,
+            "matching_fields": total_fields - len(differences)
         }
     
     def _normalizar_valor_comparacion(self, value: Any) -> Any:
@@ -707,11 +1256,22 @@ class CertificadoF30Processor(BaseDocumentProcessor):
             return None
         
         if isinstance(value, str):
-            # Quitar espacios extra, convertir a mayúsculas, quitar acentos básicos
-            normalized = value.strip().upper()
-            # Reemplazar múltiples espacios por uno solo
-            normalized = " ".join(normalized.split())
-            return normalized
+            # Camino rápido para cadenas ya normalizadas (IDs/códigos limpios,
+            # el caso común en datos extraídos por máquina): cuatro chequeos en
+            # C equivalen exactamente a " ".join(value.split()).upper() cuando
+            # no hay nada que cambiar, sin alocar ni ocupar la caché LRU con
+            # valores únicos. isprintable() descarta \t/\n/\r, así que el único
+            # espacio en blanco posible es " ".
+            if (
+                value
+                and value[0] != " "
+                and value[-1] != " "
+                and "  " not in value
+                and value.isprintable()
+                and value == value.upper()
+            ):
+                return value
+            return _normalizar_cadena(value)
         
         if isinstance(value, (int, float)):
             return value
@@ -738,19 +1298,41 @@ class CertificadoF30Processor(BaseDocumentProcessor):
             Dict con are_equivalent (bool) y summary (str)
         """
         try:
-            import json
-            
+            # Clave estable por contenido: los mismos payloads producen el
+            # mismo análisis, así que no se repite la completion
+            cache_key = hashlib.blake2b(
+                dumps_sorted_bytes([extracted_data_uploaded, extracted_data_downloaded]),
+                digest_size=16
+            ).hexdigest()
+            with _AI_ANALYSIS_CACHE_LOCK:
+                cached = _AI_ANALYSIS_CACHE.get(cache_key)
+                if cached is not None:
+                    _AI_ANALYSIS_CACHE.move_to_end(cache_key)
+            if cached is not None:
+                logger.info("Análisis de diferencias recuperado de caché (payloads ya analizados)")
+                context["processing_log"].append(
+                    "Análisis IA de diferencias recuperado de caché (sin costo)"
+                )
+                return dict(cached)
+
+            # Serializar cada payload una sola vez y en formato compacto: el
+            # modelo no necesita pretty-printing y el JSON sin indentar reduce
+            # los tokens de entrada (y su costo)
+            up_json = dumps_compact(extracted_data_uploaded)
+            down_json = dumps_compact(extracted_data_downloaded)
+            diffs_json = dumps_compact(differences)
+
             # Preparar prompt para IA
             prompt = f"""Analiza las siguientes diferencias entre dos versiones del mismo documento F30 (una enviada por el usuario y otra descargada del portal oficial).
 
 Datos del documento enviado:
-{json.dumps(extracted_data_uploaded, indent=2, ensure_ascii=False, default=str)}
+{up_json}
 
 Datos del documento descargado:
-{json.dumps(extracted_data_downloaded, indent=2, ensure_ascii=False, default=str)}
+{down_json}
 
 Diferencias encontradas:
-{json.dumps(differences, indent=2, ensure_ascii=False, default=str)}
+{diffs_json}
 
 Determina si estas diferencias son:
 1. Solo diferencias de formato (espacios, mayúsculas, puntuación, etc.) - NO significativas
@@ -769,45 +1351,51 @@ IMPORTANTE:
 - Si hay diferencias en valores reales (números, fechas, nombres, códigos), marca are_equivalent como false
 - Responde SOLO con el JSON, sin texto adicional"""
 
-            # Llamar a IA para análisis usando el cliente directamente
-            from openai import OpenAI
-            import os
-            
-            api_key = os.getenv("AI_API_KEY")
-            base_url = os.getenv("AI_BASE_URL", "https://api.openai.com/v1")
-            model = os.getenv("AI_MODEL", "gpt-4o-mini")
-            
-            client = OpenAI(api_key=api_key, base_url=base_url)
+            # Reutilizar el cliente del servicio de IA del procesador: conserva
+            # el pool de conexiones httpx en lugar de construir un cliente (y
+            # pagar TCP+TLS) en cada análisis
+            client = self.ai_service.client
+            model = self.ai_service.model
             
-            # Intentar con response_format primero (para modelos que lo soportan)
-            try:
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "Eres un experto analista de documentos. Analiza diferencias entre documentos y determina si son significativas o solo de formato. Responde SOLO en formato JSON válido."
-                        },
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.1,
-                    max_tokens=2000,
-                    response_format={"type": "json_object"}
-                )
-            except Exception as e:
-                # Si falla, intentar sin response_format
-                logger.warning(f"No se pudo usar response_format, intentando sin él: {e}")
-                response = client.chat.completions.create(
+            messages = [
+                {
+                    "role": "system",
+                    "content": "Eres un experto analista de documentos. Analiza diferencias entre documentos y determina si son significativas o solo de formato. Responde SOLO en formato JSON válido."
+                },
+                {"role": "user", "content": prompt}
+            ]
+
+            # Intentar con response_format primero (para modelos que lo soportan);
+            # la capacidad se memoriza por modelo para no fallar en cada llamada
+            strict_json = False
+            if _MODEL_SUPPORTS_JSON.get(model, True):
+                try:
+                    response = self._crear_completion_con_reintentos(
+                        client,
+                        model=model,
+                        messages=messages,
+                        temperature=0,
+                        max_tokens=_ANALYSIS_MAX_TOKENS,
+                        response_format={"type": "json_object"}
+                    )
+                    strict_json = True
+                    _MODEL_SUPPORTS_JSON[model] = True
+                except _TRANSIENT_AI_ERRORS:
+                    # Error transitorio agotados los reintentos: no dice nada
+                    # sobre el soporte de response_format del modelo
+                    raise
+                except Exception as e:
+                    # Si falla, intentar sin response_format
+                    logger.warning(f"No se pudo usar response_format, intentando sin él: {e}")
+                    _MODEL_SUPPORTS_JSON[model] = False
+
+            if not strict_json:
+                response = self._crear_completion_con_reintentos(
+                    client,
                     model=model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "Eres un experto analista de documentos. Analiza diferencias entre documentos y determina si son significativas o solo de formato. Responde SOLO en formato JSON válido."
-                        },
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.1,
-                    max_tokens=2000
+                    messages=messages,
+                    temperature=0,
+                    max_tokens=_ANALYSIS_MAX_TOKENS
                 )
             
             result_text = response.choices[0].message.content.strip()
@@ -817,31 +1405,15 @@ IMPORTANTE:
                 f"Análisis IA de diferencias completado. Costo: ${analysis_cost:.6f}"
             )
             
-            # Parsear respuesta JSON (puede venir con markdown)
+            # Parsear respuesta JSON (puede venir con markdown si no hubo
+            # response_format; con él la respuesta es JSON garantizado y los
+            # escaneos de limpieza sobran)
             try:
-                # Limpiar la respuesta para extraer solo el JSON
-                cleaned_text = result_text.strip()
-                
-                # Si la respuesta contiene markdown, extraer solo el JSON
-                if "```json" in cleaned_text:
-                    start = cleaned_text.find("```json") + 7
-                    end = cleaned_text.find("```", start)
-                    if end != -1:
-                        cleaned_text = cleaned_text[start:end].strip()
-                elif "```" in cleaned_text:
-                    start = cleaned_text.find("```") + 3
-                    end = cleaned_text.find("```", start)
-                    if end != -1:
-                        cleaned_text = cleaned_text[start:end].strip()
-                
-                # Buscar el primer { y último } para extraer JSON
-                first_brace = cleaned_text.find("{")
-                last_brace = cleaned_text.rfind("}")
-                if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
-                    cleaned_text = cleaned_text[first_brace:last_brace + 1]
-                
-                analysis_result = json.loads(cleaned_text)
-                
+                if strict_json:
+                    analysis_result = json_loads(result_text)
+                else:
+                    analysis_result = self._parsear_json_respuesta(result_text)
+
                 # Validar estructura
                 if "are_equivalent" not in analysis_result:
                     analysis_result["are_equivalent"] = False
@@ -851,7 +1423,15 @@ IMPORTANTE:
                     analysis_result["significant_differences"] = []
                 if "format_differences" not in analysis_result:
                     analysis_result["format_differences"] = []
-                
+
+                # Memoizar solo el camino exitoso (los fallbacks por error son
+                # transitorios); copia defensiva por si el caller muta el dict
+                with _AI_ANALYSIS_CACHE_LOCK:
+                    _AI_ANALYSIS_CACHE[cache_key] = dict(analysis_result)
+                    _AI_ANALYSIS_CACHE.move_to_end(cache_key)
+                    while len(_AI_ANALYSIS_CACHE) > _AI_ANALYSIS_CACHE_MAX:
+                        _AI_ANALYSIS_CACHE.popitem(last=False)
+
                 return analysis_result
             except json.JSONDecodeError as e:
                 logger.error(f"Error al parsear respuesta JSON de análisis IA: {e}")
@@ -874,20 +1454,60 @@ IMPORTANTE:
                 "format_differences": []
             }
     
+    def _crear_completion_con_reintentos(self, client, **kwargs):
+        """
+        Ejecuta chat.completions.create reintentando solo errores transitorios
+        (rate limit, timeout, conexión) con backoff exponencial, como hace el
+        limitador de OCR. Sin esto, un 429 puntual tiraba abajo toda la
+        comparación del documento y obligaba a reprocesarlo desde cero.
+        """
+        for intento in range(1, 4):
+            try:
+                return client.chat.completions.create(timeout=30, **kwargs)
+            except _TRANSIENT_AI_ERRORS as e:
+                if intento == 3:
+                    raise
+                espera = min(2 ** intento, 8)
+                logger.warning(
+                    f"Error transitorio en llamada a IA (intento {intento}/3): {e}. "
+                    f"Reintentando en {espera}s..."
+                )
+                time.sleep(espera)
+
+    def _parsear_json_respuesta(self, result_text: str) -> Dict[str, Any]:
+        """
+        Extrae y parsea el JSON de una respuesta sin response_format
+        (puede venir envuelto en markdown o con texto adicional)
+        """
+        cleaned_text = result_text.strip()
+
+        # Si la respuesta contiene markdown, extraer solo el JSON
+        if "```json" in cleaned_text:
+            start = cleaned_text.find("```json") + 7
+            end = cleaned_text.find("```", start)
+            if end != -1:
+                cleaned_text = cleaned_text[start:end].strip()
+        elif "```" in cleaned_text:
+            start = cleaned_text.find("```") + 3
+            end = cleaned_text.find("```", start)
+            if end != -1:
+                cleaned_text = cleaned_text[start:end].strip()
+
+        # Buscar el primer { y último } para extraer JSON
+        first_brace = cleaned_text.find("{")
+        last_brace = cleaned_text.rfind("}")
+        if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
+            cleaned_text = cleaned_text[first_brace:last_brace + 1]
+
+        return json_loads(cleaned_text)
+
     def _calculate_ai_cost(self, usage) -> float:
-        """Calcula el costo de la llamada a la API de IA"""
+        """Calcula el costo de la llamada a la API de IA según el modelo en uso"""
         if not usage:
             return 0.0
-        
-        # Precios aproximados por 1K tokens (ajustar según el modelo)
-        input_price_per_1k = 0.00015  # $0.15 por 1K tokens de entrada
-        output_price_per_1k = 0.0006   # $0.60 por 1K tokens de salida
-        
-        input_tokens = usage.prompt_tokens
-        output_tokens = usage.completion_tokens
-        
-        input_cost = (input_tokens / 1000) * input_price_per_1k
-        output_cost = (output_tokens / 1000) * output_price_per_1k
-        
-        return input_cost + output_cost
+
+        in_price, out_price = _AI_PRICING_PER_TOKEN.get(
+            self.ai_service.model, _AI_PRICING_PER_TOKEN["default"]
+        )
+        return usage.prompt_tokens * in_price + usage.completion_tokens * out_price
 
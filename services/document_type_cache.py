@@ -0,0 +1,82 @@
+"""
+Caché TTL para configuraciones de tipos de documento.
+
+Cada documento procesado consulta en Mongo la misma fila de
+OCR_document_types por nombre; esa configuración cambia rara vez. Este
+módulo la cachea unos minutos para ahorrar un round trip a Mongo por
+documento. Las rutas de administración de tipos invalidan la caché al
+crear/actualizar/desactivar un tipo.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_TTL_SECONDS = 300  # 5 minutos
+
+
+class DocumentTypeCache:
+    """Caché LRU con TTL de tipos de documento activos, indexada por nombre."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_active_document_type(
+        self, name: str, document_types_collection: Any
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve la configuración activa del tipo `name`, desde la caché si no
+        expiró o desde Mongo en caso contrario. Los valores se devuelven como
+        copia profunda para que el pipeline pueda anotarlos sin contaminar la
+        caché. Los tipos no encontrados no se cachean, para que un tipo recién
+        activado sea visible de inmediato.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(name)
+                    return deepcopy(value)
+                del self._entries[name]
+
+        document_type = document_types_collection.find_one({
+            "name": name,
+            "is_active": True
+        })
+
+        if document_type is None:
+            return None
+
+        with self._lock:
+            self._entries[name] = (now, document_type)
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return deepcopy(document_type)
+
+    def clear(self) -> None:
+        """Invalida la caché (tras cambios de configuración desde las rutas admin)."""
+        with self._lock:
+            self._entries.clear()
+
+
+# Instancia global compartida entre procesadores
+document_type_cache = DocumentTypeCache()
+
+
+def get_active_document_type(name: str, document_types_collection: Any) -> Optional[Dict[str, Any]]:
+    """Helper de módulo sobre la instancia global."""
+    return document_type_cache.get_active_document_type(name, document_types_collection)
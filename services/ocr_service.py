@@ -6,10 +6,17 @@ Incluye un proveedor local basado en Tesseract para entornos sin Azure.
 Selecciona proveedor mediante la variable de entorno OCR_PROVIDER: "azure" | "local" | "mock".
 """
 
+import functools
+import hashlib
 import requests
+from requests.adapters import HTTPAdapter, Retry
 import os
 import io
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, Optional
 from urllib.parse import urlparse
 
@@ -35,6 +42,97 @@ except Exception:  # pragma: no cover
 
 logger = logging.getLogger(__name__)
 
+# Caché de texto OCR direccionada por contenido: los reenvíos del mismo
+# archivo (reintentos, reprocesos) cuestan un hash BLAKE2b en lugar de volver
+# a rasterizar/llamar al proveedor. Clave por proveedor para no servir el
+# resultado de un motor como si fuera de otro.
+_OCR_TEXT_CACHE: "OrderedDict[tuple, str]" = OrderedDict()
+_OCR_TEXT_CACHE_LOCK = threading.Lock()
+_OCR_TEXT_CACHE_MAX = int(os.getenv("OCR_CACHE_SIZE", "256"))
+
+
+# Sesión HTTP compartida del módulo: keep-alive y pool de conexiones hacia
+# los proveedores y los orígenes de descarga en lugar de un handshake TCP+TLS
+# por llamada. Los reintentos del adapter solo aplican a métodos idempotentes
+# (GET/HEAD); los POST de envío a Azure no se reintentan automáticamente.
+_http_session = requests.Session()
+_http_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+    ),
+)
+_http_session.mount("https://", _http_adapter)
+_http_session.mount("http://", _http_adapter)
+
+
+# Umbral de texto embebido por página: con al menos estos caracteres se usa
+# la capa de texto del PDF (nativo digital) y se omite rasterizar + OCR; por
+# debajo se asume página escaneada y se OCRea como siempre
+_TEXT_LAYER_MIN_CHARS = int(os.getenv("PDF_TEXT_LAYER_MIN", "50"))
+
+# Límites de Google Cloud Vision: hasta 16 imágenes por batchAnnotateImages
+# y 20 MB por imagen
+_VISION_BATCH_SIZE = 16
+_VISION_MAX_IMAGE_BYTES = 20 * 1024 * 1024
+
+# Pool compartido para el OCR por página: un solo executor por proceso en
+# lugar de construir uno por PDF. Tanto Tesseract como las llamadas a Vision
+# liberan el GIL (código C / espera de red), así que las páginas escalan con
+# los hilos; tamaño configurable vía OCR_WORKERS.
+_OCR_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 4))),
+    thread_name_prefix="ocr-page",
+)
+
+
+# Tope de descarga: el mismo límite que acepta Vision; configurable por entorno
+_MAX_DOWNLOAD_BYTES = int(os.getenv("OCR_MAX_DOWNLOAD_MB", "20")) * 1024 * 1024
+
+
+def _descargar_con_limite(url: str, timeout: int = 60) -> bytes:
+    """
+    Descarga por streaming con tope de tamaño: aborta en cuanto el cuerpo
+    supera el límite, en lugar de materializar primero el archivo completo en
+    memoria y recién entonces validar (un archivo de 100 MB costaba 100 MB de
+    RSS antes de ser rechazado).
+    """
+    with _http_session.get(url, stream=True, timeout=timeout) as resp:
+        resp.raise_for_status()
+        buf = io.BytesIO()
+        for chunk in resp.iter_content(chunk_size=64 * 1024):
+            buf.write(chunk)
+            if buf.tell() > _MAX_DOWNLOAD_BYTES:
+                raise ValueError(
+                    f"El archivo supera el tamaño máximo permitido "
+                    f"({_MAX_DOWNLOAD_BYTES} bytes)"
+                )
+        return buf.getvalue()
+
+
+def _clave_cache_ocr(proveedor: str, content: bytes) -> tuple:
+    """Clave de caché: (proveedor, BLAKE2b-128 del contenido)"""
+    return proveedor, hashlib.blake2b(content, digest_size=16).digest()
+
+
+def _buscar_texto_ocr(clave: tuple) -> Optional[str]:
+    with _OCR_TEXT_CACHE_LOCK:
+        texto = _OCR_TEXT_CACHE.get(clave)
+        if texto is not None:
+            _OCR_TEXT_CACHE.move_to_end(clave)
+        return texto
+
+
+def _guardar_texto_ocr(clave: tuple, texto: str) -> None:
+    with _OCR_TEXT_CACHE_LOCK:
+        _OCR_TEXT_CACHE[clave] = texto
+        _OCR_TEXT_CACHE.move_to_end(clave)
+        while len(_OCR_TEXT_CACHE) > _OCR_TEXT_CACHE_MAX:
+            _OCR_TEXT_CACHE.popitem(last=False)
+
 
 class OCRService:
     """Servicio de OCR usando Azure Computer Vision"""
@@ -77,7 +175,7 @@ class OCRService:
             ocr_url = f"{self.endpoint}/vision/v3.2/read/analyze"
             
             # Realizar la solicitud inicial
-            response = requests.post(ocr_url, headers=headers, json=body, timeout=30)
+            response = _http_session.post(ocr_url, headers=headers, json=body, timeout=30)
             response.raise_for_status()
             
             # Obtener la URL de resultado
@@ -99,59 +197,125 @@ class OCRService:
         except Exception as e:
             logger.error(f"Error inesperado en OCR: {e}")
             raise ValueError(f"Error inesperado: {str(e)}")
-    
+
+    def extract_text_from_path(self, local_path: str) -> Tuple[str, float]:
+        """
+        Extrae texto de un archivo local enviando los bytes directamente a Azure.
+
+        Evita volver a descargar por URL un archivo que ya tenemos en disco.
+
+        Args:
+            local_path: Ruta local del documento a procesar
+
+        Returns:
+            Tuple[str, float]: (texto_extraido, costo_usd)
+        """
+        try:
+            with open(local_path, "rb") as f:
+                content = f.read()
+
+            if not content:
+                raise ValueError("El archivo local está vacío")
+
+            clave = _clave_cache_ocr("azure", content)
+            texto_cacheado = _buscar_texto_ocr(clave)
+            if texto_cacheado is not None:
+                logger.info("Texto OCR recuperado de caché por contenido (Azure)")
+                return texto_cacheado, 0.0
+
+            headers = {
+                'Ocp-Apim-Subscription-Key': self.api_key,
+                'Content-Type': 'application/octet-stream'
+            }
+
+            ocr_url = f"{self.endpoint}/vision/v3.2/read/analyze"
+
+            response = _http_session.post(ocr_url, headers=headers, data=content, timeout=30)
+            response.raise_for_status()
+
+            operation_url = response.headers.get('Operation-Location')
+            if not operation_url:
+                raise ValueError("No se recibió URL de operación de Azure")
+
+            text_result = self._wait_for_result(operation_url, headers)
+            cost = self._calculate_ocr_cost(len(text_result))
+
+            _guardar_texto_ocr(clave, text_result)
+            return text_result, cost
+
+        except OSError as e:
+            logger.error(f"Error al leer archivo local {local_path}: {e}")
+            raise ValueError(f"Error al leer el archivo: {str(e)}")
+        except requests.RequestException as e:
+            logger.error(f"Error en solicitud a Azure Computer Vision: {e}")
+            raise ValueError(f"Error al procesar documento: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error inesperado en OCR: {e}")
+            raise ValueError(f"Error inesperado: {str(e)}")
+
     def _validate_url(self, file_url: str) -> bool:
-        """Valida que la URL sea accesible"""
+        """
+        Valida la sintaxis de la URL. La accesibilidad la comprueba la
+        descarga real: el preflight HEAD costaba un RTT + handshake TLS por
+        documento y varios orígenes ni siquiera lo implementan.
+        """
         try:
-            # Verificar que sea una URL válida
             parsed = urlparse(file_url)
-            if not parsed.scheme or not parsed.netloc:
-                return False
-            
-            # Verificar que sea accesible
-            response = requests.head(file_url, timeout=10)
-            return response.status_code == 200
-            
+            return bool(parsed.scheme and parsed.netloc)
         except Exception as e:
             logger.error(f"Error al validar URL {file_url}: {e}")
             return False
     
     def _wait_for_result(self, operation_url: str, headers: dict, max_attempts: int = 30) -> str:
         """
-        Espera y obtiene el resultado del OCR de Azure
+        Espera y obtiene el resultado del OCR de Azure.
+
+        Sondeo adaptativo: parte en 250 ms y crece 1.5x hasta un tope de 2 s.
+        Los documentos cortos suelen estar listos en menos de un segundo, así
+        que el sleep fijo de 2 s pagaba hasta 2 s de latencia extra por
+        documento. Si Azure envía Retry-After (p. ej. ante throttling), ese
+        valor manda sobre el backoff propio.
         """
-        import time
-        
+        delay = 0.25
         for attempt in range(max_attempts):
+            retry_after = None
             try:
-                response = requests.get(operation_url, headers=headers, timeout=10)
+                response = _http_session.get(operation_url, headers=headers, timeout=10)
+                retry_after = response.headers.get('Retry-After')
                 response.raise_for_status()
-                
+
                 result = response.json()
                 status = result.get('status')
-                
+
                 if status == 'succeeded':
                     # Extraer texto de las líneas
                     text_lines = []
                     for read_result in result.get('analyzeResult', {}).get('readResults', []):
                         for line in read_result.get('lines', []):
                             text_lines.append(line.get('text', ''))
-                    
+
                     return '\n'.join(text_lines)
-                
+
                 elif status == 'failed':
                     error_message = result.get('message', 'Error desconocido')
                     raise ValueError(f"OCR falló: {error_message}")
-                
-                # Si aún está procesando, esperar
-                time.sleep(2)
-                
+
             except requests.RequestException as e:
                 logger.error(f"Error al obtener resultado (intento {attempt + 1}): {e}")
                 if attempt == max_attempts - 1:
                     raise ValueError(f"Timeout al obtener resultado del OCR: {str(e)}")
-                time.sleep(2)
-        
+
+            # Aún procesando (o error transitorio): esperar antes del
+            # siguiente sondeo
+            wait = delay
+            if retry_after:
+                try:
+                    wait = float(retry_after)
+                except ValueError:
+                    pass
+            time.sleep(wait)
+            delay = min(2.0, delay * 1.5)
+
         raise ValueError("Timeout: El OCR tardó demasiado en completarse")
     
     def _calculate_ocr_cost(self, text_length: int) -> float:
@@ -193,9 +357,13 @@ class MockOCRService:
         
         # Simular costo
         cost = 0.0015
-        
+
         return mock_text.strip(), cost
 
+    def extract_text_from_path(self, local_path: str) -> Tuple[str, float]:
+        """Mock del servicio de OCR para archivos locales"""
+        return self.extract_text_from_url(local_path)
+
 
 class LocalOCRService:
     """Servicio de OCR local usando Tesseract (pytesseract) y PyMuPDF para PDFs."""
@@ -226,18 +394,22 @@ class LocalOCRService:
             download_url = self._convert_google_drive_url(file_url)
             logger.info(f"Descargando desde: {download_url}")
             
-            resp = requests.get(download_url, timeout=60)
-            resp.raise_for_status()
-            content = resp.content
+            content = _descargar_con_limite(download_url)
             
             # Validar que el contenido no esté vacío
             if not content:
                 raise ValueError("El archivo descargado está vacío")
-            
+
+            clave = _clave_cache_ocr("tesseract", content)
+            texto_cacheado = _buscar_texto_ocr(clave)
+            if texto_cacheado is not None:
+                logger.info("Texto OCR recuperado de caché por contenido (Tesseract)")
+                return texto_cacheado, 0.0
+
             # Determinar si es PDF por extensión o primeros bytes
             path = urlparse(file_url).path.lower()
             is_pdf = path.endswith(".pdf") or (len(content) >= 4 and content[:4] == b'%PDF')
-            
+
             if is_pdf:
                 if not self.has_pdf_support:
                     raise ValueError("PyMuPDF no está instalado y es requerido para PDFs")
@@ -245,6 +417,7 @@ class LocalOCRService:
             else:
                 text = self._ocr_image(content)
 
+            _guardar_texto_ocr(clave, text)
             # Costo local: aproximación marginal casi cero, útil para trazabilidad
             cost = 0.0
             return text, cost
@@ -256,12 +429,51 @@ class LocalOCRService:
             logger.error(f"Error al procesar archivo desde {file_url}: {e}")
             raise ValueError(f"Error al procesar el archivo: {str(e)}")
 
+    def extract_text_from_path(self, local_path: str) -> Tuple[str, float]:
+        """
+        Extrae texto de una imagen o PDF local usando OCR local, sin descarga.
+        Retorna (texto, costo_aprox).
+        """
+        try:
+            with open(local_path, "rb") as f:
+                content = f.read()
+
+            if not content:
+                raise ValueError("El archivo local está vacío")
+
+            clave = _clave_cache_ocr("tesseract", content)
+            texto_cacheado = _buscar_texto_ocr(clave)
+            if texto_cacheado is not None:
+                logger.info("Texto OCR recuperado de caché por contenido (Tesseract)")
+                return texto_cacheado, 0.0
+
+            is_pdf = local_path.lower().endswith(".pdf") or (len(content) >= 4 and content[:4] == b'%PDF')
+
+            if is_pdf:
+                if not self.has_pdf_support:
+                    raise ValueError("PyMuPDF no está instalado y es requerido para PDFs")
+                text = self._ocr_pdf(content)
+            else:
+                text = self._ocr_image(content)
+
+            _guardar_texto_ocr(clave, text)
+            return text, 0.0
+
+        except OSError as e:
+            logger.error(f"Error al leer archivo local {local_path}: {e}")
+            raise ValueError(f"Error al leer el archivo: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error al procesar archivo local {local_path}: {e}")
+            raise ValueError(f"Error al procesar el archivo: {str(e)}")
+
     def _ocr_image(self, image_bytes: bytes) -> str:
         try:
             # Validar que sea una imagen válida
             image = Image.open(io.BytesIO(image_bytes))
-            # Verificar que se pueda convertir a RGB
-            image = image.convert("RGB")
+            # Escala de grises antes de Tesseract: 1 byte/píxel en lugar de 3
+            # reduce a un tercio los datos que recorre leptonica, y la
+            # conversión de Pillow es más barata que la interna de Tesseract
+            image = image.convert("L")
             # Config por defecto; se puede ajustar según idioma
             return pytesseract.image_to_string(image, lang=os.getenv("TESSERACT_LANG", "spa+eng"))
         except Exception as e:
@@ -270,22 +482,48 @@ class LocalOCRService:
 
     def _ocr_pdf(self, pdf_bytes: bytes) -> str:
         assert fitz is not None
+        lang = os.getenv("TESSERACT_LANG", "spa+eng")
+
+        # Las páginas con capa de texto embebida (PDFs nativos digitales, el
+        # caso común) se leen directo sin rasterizar ni OCRear; el resto se
+        # rasteriza en serie (fitz.Page no es thread-safe) y se reparte en el
+        # pool compartido: Tesseract libera el GIL en su código C, así que
+        # las páginas de un PDF escalan con los hilos
         text_pages = []
+        images = []  # (índice en text_pages, imagen) de páginas escaneadas
         with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
             for page in doc:
+                texto_embebido = page.get_text("text")
+                if len(texto_embebido.strip()) >= _TEXT_LAYER_MIN_CHARS:
+                    text_pages.append(texto_embebido)
+                    continue
                 pix = page.get_pixmap(dpi=200)
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                page_text = pytesseract.image_to_string(img, lang=os.getenv("TESSERACT_LANG", "spa+eng"))
-                text_pages.append(page_text)
+                text_pages.append(None)
+                # Escala de grises antes de Tesseract (1 byte/píxel vs 3)
+                images.append((
+                    len(text_pages) - 1,
+                    Image.frombytes("RGB", [pix.width, pix.height], pix.samples).convert("L"),
+                ))
+
+        if len(images) == 1:
+            idx, img = images[0]
+            text_pages[idx] = pytesseract.image_to_string(img, lang=lang)
+        elif images:
+            resultados = _OCR_POOL.map(
+                lambda img: pytesseract.image_to_string(img, lang=lang),
+                [img for _, img in images],
+            )
+            for (idx, _), texto in zip(images, resultados):
+                text_pages[idx] = texto
+
         return "\n".join(text_pages)
 
     def _validate_url(self, file_url: str) -> bool:
+        # Solo sintaxis: la descarga real reporta la accesibilidad sin pagar
+        # el RTT extra de un HEAD previo
         try:
             parsed = urlparse(file_url)
-            if not parsed.scheme or not parsed.netloc:
-                return False
-            response = requests.head(file_url, timeout=10)
-            return response.status_code == 200
+            return bool(parsed.scheme and parsed.netloc)
         except Exception as e:
             logger.error(f"Error al validar URL {file_url}: {e}")
             return False
@@ -302,38 +540,50 @@ class LocalOCRService:
 
 class GCPOCRService:
     """Servicio de OCR usando Google Cloud Vision API"""
-    
+
+    # Cliente de Vision compartido por todas las instancias: el canal gRPC y
+    # el parseo de credenciales (~100-500 ms) se pagan una vez por proceso
+    _shared_client = None
+    _shared_client_lock = threading.Lock()
+
     def __init__(self):
         if vision is None or service_account is None:
             raise ValueError("Google Cloud Vision no está instalado. Instala google-cloud-vision")
-        
+
         # Configurar credenciales de GCP
         self.project_id = os.getenv("GCP_PROJECT_ID")
         self.credentials_path = os.getenv("GCP_CREDENTIALS_PATH")
         self.credentials_json = os.getenv("GCP_CREDENTIALS_JSON")
-        
+
         if not self.project_id:
             raise ValueError("GCP_PROJECT_ID no está configurado")
-        
-        # Configurar cliente de Vision API
+
+        # Configurar cliente de Vision API (compartido entre instancias)
         try:
-            if self.credentials_path:
-                # Usar archivo de credenciales
-                credentials = service_account.Credentials.from_service_account_file(
-                    self.credentials_path
-                )
-                self.client = vision.ImageAnnotatorClient(credentials=credentials)
-            elif self.credentials_json:
-                # Usar JSON de credenciales como string
-                import json
-                credentials_info = json.loads(self.credentials_json)
-                credentials = service_account.Credentials.from_service_account_info(credentials_info)
-                self.client = vision.ImageAnnotatorClient(credentials=credentials)
-            else:
-                # Usar credenciales por defecto (Application Default Credentials)
-                self.client = vision.ImageAnnotatorClient()
+            if GCPOCRService._shared_client is None:
+                with GCPOCRService._shared_client_lock:
+                    if GCPOCRService._shared_client is None:
+                        GCPOCRService._shared_client = self._crear_cliente_vision()
+            self.client = GCPOCRService._shared_client
         except Exception as e:
             raise ValueError(f"Error al configurar cliente de GCP Vision: {e}")
+
+    def _crear_cliente_vision(self):
+        """Construye el cliente de Vision según las credenciales configuradas"""
+        if self.credentials_path:
+            # Usar archivo de credenciales
+            credentials = service_account.Credentials.from_service_account_file(
+                self.credentials_path
+            )
+            return vision.ImageAnnotatorClient(credentials=credentials)
+        if self.credentials_json:
+            # Usar JSON de credenciales como string
+            import json
+            credentials_info = json.loads(self.credentials_json)
+            credentials = service_account.Credentials.from_service_account_info(credentials_info)
+            return vision.ImageAnnotatorClient(credentials=credentials)
+        # Usar credenciales por defecto (Application Default Credentials)
+        return vision.ImageAnnotatorClient()
     
     def extract_text_from_url(self, file_url: str) -> Tuple[str, float]:
         """
@@ -361,14 +611,18 @@ class GCPOCRService:
             if download_url.startswith("https://storage.googleapis.com/"):
                 content = self._download_from_gcs(download_url)
             else:
-                response = requests.get(download_url, timeout=60)
-                response.raise_for_status()
-                content = response.content
+                content = _descargar_con_limite(download_url)
             
             # Validar que el contenido no esté vacío
             if not content:
                 raise ValueError("El archivo descargado está vacío")
-            
+
+            clave = _clave_cache_ocr("gcp_vision", content)
+            texto_cacheado = _buscar_texto_ocr(clave)
+            if texto_cacheado is not None:
+                logger.info("Texto OCR recuperado de caché por contenido (GCP Vision)")
+                return texto_cacheado, 0.0
+
             # Determinar si es PDF por extensión o primeros bytes
             is_pdf = self._is_pdf(file_url, content)
             
@@ -382,16 +636,60 @@ class GCPOCRService:
             
             # Calcular costo (aproximado para Google Cloud Vision)
             cost = self._calculate_gcp_ocr_cost(len(text_result))
-            
+
+            _guardar_texto_ocr(clave, text_result)
             return text_result, cost
-            
+
         except requests.RequestException as e:
             logger.error(f"Error al descargar archivo desde {file_url}: {e}")
             raise ValueError(f"Error al descargar el archivo: {str(e)}")
         except Exception as e:
             logger.error(f"Error inesperado en GCP OCR: {e}")
             raise ValueError(f"Error inesperado: {str(e)}")
-    
+
+    def extract_text_from_path(self, local_path: str) -> Tuple[str, float]:
+        """
+        Extrae texto de un archivo local usando Google Cloud Vision API.
+
+        Lee los bytes desde disco en lugar de descargarlos por URL.
+
+        Args:
+            local_path: Ruta local del documento a procesar
+
+        Returns:
+            Tuple[str, float]: (texto_extraido, costo_usd)
+        """
+        try:
+            with open(local_path, "rb") as f:
+                content = f.read()
+
+            if not content:
+                raise ValueError("El archivo local está vacío")
+
+            clave = _clave_cache_ocr("gcp_vision", content)
+            texto_cacheado = _buscar_texto_ocr(clave)
+            if texto_cacheado is not None:
+                logger.info("Texto OCR recuperado de caché por contenido (GCP Vision)")
+                return texto_cacheado, 0.0
+
+            if self._is_pdf(local_path, content):
+                logger.info("Archivo local detectado como PDF, procesando página por página")
+                text_result = self._process_pdf_with_gcp_vision(content)
+            else:
+                text_result = self._process_with_gcp_vision(content)
+
+            cost = self._calculate_gcp_ocr_cost(len(text_result))
+
+            _guardar_texto_ocr(clave, text_result)
+            return text_result, cost
+
+        except OSError as e:
+            logger.error(f"Error al leer archivo local {local_path}: {e}")
+            raise ValueError(f"Error al leer el archivo: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error inesperado en GCP OCR: {e}")
+            raise ValueError(f"Error inesperado: {str(e)}")
+
     def _is_pdf(self, file_url: str, content: bytes) -> bool:
         """Detecta si el archivo es un PDF por extensión o primeros bytes"""
         # Verificar por extensión en la URL
@@ -409,9 +707,7 @@ class GCPOCRService:
         """Procesa un PDF convirtiendo cada página a imagen y aplicando OCR en paralelo"""
         if fitz is None:
             raise ValueError("PyMuPDF (fitz) no está instalado y es requerido para procesar PDFs")
-        
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        
+
         try:
             with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
                 total_pages = len(doc)
@@ -420,46 +716,49 @@ class GCPOCRService:
                 # DPI reducido para mejor rendimiento (150 en lugar de 200)
                 dpi = int(os.getenv("PDF_OCR_DPI", "150"))
                 
-                # Convertir todas las páginas a imágenes ANTES de paralelizar
-                # (las páginas de fitz no se pueden pasar directamente a threads)
+                # Las páginas con capa de texto embebida (PDFs nativos
+                # digitales) se leen directo; solo las escaneadas se
+                # convierten a imagen ANTES de paralelizar (las páginas de
+                # fitz no se pueden pasar directamente a threads)
+                text_pages = []
                 page_images = []
                 for page_num, page in enumerate(doc, start=1):
+                    texto_embebido = page.get_text("text")
+                    if len(texto_embebido.strip()) >= _TEXT_LAYER_MIN_CHARS:
+                        logger.info(
+                            f"Página {page_num}/{total_pages} con capa de texto; OCR omitido"
+                        )
+                        text_pages.append(texto_embebido)
+                        continue
                     logger.info(f"Convirtiendo página {page_num}/{total_pages} a imagen")
                     pix = page.get_pixmap(dpi=dpi)
-                    img_bytes = pix.tobytes("png")
+                    # JPEG en lugar de PNG: evita el DEFLATE de zlib por
+                    # página (el paso más caro de la rasterización) y sube
+                    # ~5x menos bytes a Vision, que acepta JPEG sin pérdida
+                    # apreciable de exactitud a 150 DPI
+                    img_bytes = pix.tobytes("jpg", jpg_quality=85)
+                    text_pages.append(None)
                     page_images.append((page_num, img_bytes))
-                
-                def process_page_image(page_data):
-                    """Procesa una imagen de página individual"""
-                    page_num, img_bytes = page_data
-                    try:
-                        logger.info(f"Procesando OCR de página {page_num}/{total_pages}")
-                        
-                        # Procesar la imagen con GCP Vision
-                        page_text = self._process_image_bytes_with_gcp_vision(img_bytes)
-                        
-                        logger.info(f"Página {page_num} procesada: {len(page_text)} caracteres extraídos")
-                        return page_num, page_text
-                    except Exception as e:
-                        logger.error(f"Error al procesar página {page_num}: {e}")
-                        return page_num, ""
-                
-                # Procesar todas las imágenes en paralelo
-                text_pages_dict = {}
-                with ThreadPoolExecutor(max_workers=min(total_pages, 4)) as executor:
-                    # Preparar todas las tareas
-                    future_to_page = {
-                        executor.submit(process_page_image, page_data): page_data[0]
-                        for page_data in page_images
-                    }
-                    
-                    # Recolectar resultados conforme se completan
-                    for future in as_completed(future_to_page):
-                        page_num, page_text = future.result()
-                        text_pages_dict[page_num] = page_text
-                
-                # Ordenar páginas por número y combinar texto
-                text_pages = [text_pages_dict[i] for i in sorted(text_pages_dict.keys())]
+
+                # Agrupar las páginas escaneadas en lotes de 16 (tope de la
+                # API) y anotar cada lote en una sola llamada
+                # batch_annotate_images: amortiza el canal gRPC y la
+                # autenticación, y un PDF de 100 páginas pasa de 100
+                # round-trips a 7. Los lotes corren en el pool compartido y
+                # map preserva el orden de las páginas.
+                if page_images:
+                    lotes = [
+                        page_images[i:i + _VISION_BATCH_SIZE]
+                        for i in range(0, len(page_images), _VISION_BATCH_SIZE)
+                    ]
+                    textos_ocr = []
+                    for textos_lote in _OCR_POOL.map(self._process_image_batch_with_gcp_vision, lotes):
+                        textos_ocr.extend(textos_lote)
+                    relleno = iter(textos_ocr)
+                    text_pages = [
+                        texto if texto is not None else next(relleno)
+                        for texto in text_pages
+                    ]
         
         except Exception as e:
             logger.error(f"Error al procesar PDF: {e}")
@@ -469,13 +768,64 @@ class GCPOCRService:
         logger.info(f"PDF procesado completamente: {len(full_text)} caracteres totales")
         return full_text
     
+    def _process_image_batch_with_gcp_vision(self, lote: list) -> list:
+        """
+        Anota un lote de páginas [(page_num, bytes), ...] (hasta 16) en una
+        sola llamada a Vision. Devuelve los textos en el orden del lote; una
+        página con error individual produce cadena vacía, igual que el camino
+        por página que reemplaza.
+        """
+        textos = [""] * len(lote)
+        peticiones = []
+        indices = []
+        for idx, (page_num, img_bytes) in enumerate(lote):
+            if len(img_bytes) > _VISION_MAX_IMAGE_BYTES:
+                logger.error(
+                    f"Página {page_num} demasiado grande para Vision: {len(img_bytes)} bytes"
+                )
+                continue
+            peticiones.append(vision.AnnotateImageRequest(
+                image=vision.Image(content=img_bytes),
+                features=[vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)],
+            ))
+            indices.append(idx)
+
+        if not peticiones:
+            return textos
+
+        try:
+            respuesta = self.client.batch_annotate_images(requests=peticiones)
+        except Exception as e:
+            paginas = ", ".join(str(lote[idx][0]) for idx in indices)
+            logger.error(f"Error de Vision en lote de páginas {paginas}: {e}")
+            return textos
+
+        for idx, page_response in zip(indices, respuesta.responses):
+            page_num = lote[idx][0]
+            if page_response.error.message:
+                logger.error(
+                    f"Error de Vision en página {page_num}: {page_response.error.message}"
+                )
+                continue
+            if page_response.text_annotations:
+                textos[idx] = page_response.text_annotations[0].description
+                logger.info(
+                    f"Página {page_num} procesada: {len(textos[idx])} caracteres extraídos"
+                )
+            else:
+                logger.warning(f"No se detectó texto en la página {page_num}")
+
+        return textos
+
     def _process_image_bytes_with_gcp_vision(self, image_bytes: bytes) -> str:
         """Procesa bytes de imagen con Google Cloud Vision API"""
         try:
             # Validar tamaño del contenido (GCP Vision tiene límites)
-            max_size = 20 * 1024 * 1024  # 20MB
-            if len(image_bytes) > max_size:
-                raise ValueError(f"La imagen es demasiado grande: {len(image_bytes)} bytes (máximo: {max_size} bytes)")
+            if len(image_bytes) > _VISION_MAX_IMAGE_BYTES:
+                raise ValueError(
+                    f"La imagen es demasiado grande: {len(image_bytes)} bytes "
+                    f"(máximo: {_VISION_MAX_IMAGE_BYTES} bytes)"
+                )
             
             # Crear imagen para Vision API
             image = vision.Image(content=image_bytes)
@@ -552,50 +902,26 @@ class GCPOCRService:
             raise ValueError(f"Error al procesar con Google Cloud Vision: {str(e)}")
     
     def _validate_url(self, file_url: str) -> bool:
-        """Valida que la URL sea accesible y contenga contenido válido"""
+        """
+        Valida la sintaxis de la URL. El preflight HEAD (accesibilidad,
+        Content-Type, Content-Length) costaba un RTT + TLS por documento;
+        la descarga real reporta la inaccesibilidad y el límite de tamaño
+        se aplica sobre el propio contenido descargado.
+        """
         try:
             # Verificar que sea una URL válida
             parsed = urlparse(file_url)
             if not parsed.scheme or not parsed.netloc:
                 logger.error(f"URL inválida: {file_url}")
                 return False
-            
-            # Si es URL de GCS, no validar con HEAD (puede dar 403 pero el archivo existe)
+
+            # Si es URL de GCS, validar formato bucket/objeto
             if file_url.startswith("https://storage.googleapis.com/"):
-                # Validar formato de URL
                 url_parts = file_url.replace("https://storage.googleapis.com/", "").split("/", 1)
                 return len(url_parts) == 2
-            
-            # Verificar que sea accesible y obtener información del contenido
-            response = requests.head(file_url, timeout=10, allow_redirects=True)
-            if response.status_code != 200:
-                logger.error(f"URL no accesible: {file_url} (status: {response.status_code})")
-                logger.error(f"Response headers: {dict(response.headers)}")
-                return False
-            
-            # Verificar Content-Type
-            content_type = response.headers.get('content-type', '').lower()
-            logger.info(f"Content-Type detectado: {content_type}")
-            
-            # Verificar que sea un tipo de archivo soportado
-            supported_types = ['image/', 'application/pdf', 'application/octet-stream']
-            if not any(content_type.startswith(t) for t in supported_types):
-                logger.warning(f"Tipo de contenido no soportado: {content_type}")
-                # No rechazar automáticamente, algunos servidores no envían el Content-Type correcto
-            
-            # Verificar Content-Length
-            content_length = response.headers.get('content-length')
-            if content_length:
-                size_mb = int(content_length) / (1024 * 1024)
-                logger.info(f"Tamaño del archivo: {size_mb:.2f} MB")
-                
-                # Verificar que no sea demasiado grande
-                if int(content_length) > 20 * 1024 * 1024:  # 20MB
-                    logger.error(f"Archivo demasiado grande: {size_mb:.2f} MB")
-                    return False
-            
+
             return True
-            
+
         except Exception as e:
             logger.error(f"Error al validar URL {file_url}: {e}")
             return False
@@ -738,10 +1064,125 @@ class FallbackOCRService:
         logger.error("Todos los servicios de OCR fallaron")
         raise ValueError(f"Error en todos los servicios de OCR. Último error: {last_error}")
 
+    def extract_text_from_path(self, local_path: str) -> Tuple[str, float]:
+        """Extrae texto de un archivo local usando el primer servicio disponible"""
+        last_error = None
+
+        for i, service in enumerate(self.services):
+            try:
+                logger.info(f"Intentando OCR local con servicio {i+1}/{len(self.services)}: {service.__class__.__name__}")
+                text, cost = service.extract_text_from_path(local_path)
+                logger.info(f"OCR exitoso con {service.__class__.__name__}")
+                return text, cost
+            except Exception as e:
+                last_error = e
+                logger.warning(f"Falló {service.__class__.__name__}: {e}")
+                if i < len(self.services) - 1:
+                    logger.info("Probando con el siguiente servicio...")
+                continue
 
+        # Si todos los servicios fallan
+        logger.error("Todos los servicios de OCR fallaron")
+        raise ValueError(f"Error en todos los servicios de OCR. Último error: {last_error}")
+
+
+class _LimitadorOCR:
+    """
+    Límite global de concurrencia y tasa para las llamadas de OCR del proceso.
+
+    Los proveedores externos (Azure/GCP) devuelven HTTP 429 ante ráfagas; este
+    limitador espacia las llamadas para sostener el throughput cerca del tope
+    del proveedor sin desatar tormentas de reintentos.
+    """
+
+    def __init__(self, max_concurrency: int = 8, rps: float = 5.0):
+        self._semaphore = threading.Semaphore(max_concurrency)
+        self._rate_lock = threading.Lock()
+        self._min_interval = 1.0 / rps if rps > 0 else 0.0
+        self._next_slot = time.monotonic()
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        if self._min_interval > 0:
+            with self._rate_lock:
+                now = time.monotonic()
+                wait = self._next_slot - now
+                self._next_slot = max(now, self._next_slot) + self._min_interval
+            if wait > 0:
+                time.sleep(wait)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._semaphore.release()
+        return False
+
+
+# Limitador compartido por todas las instancias del proceso, configurable por entorno
+_limitador_ocr = _LimitadorOCR(
+    max_concurrency=int(os.getenv("OCR_MAX_CONCURRENCY", "8")),
+    rps=float(os.getenv("OCR_RPS", "5")),
+)
+
+
+def _es_error_rate_limit(error: Exception) -> bool:
+    """Determina si la excepción corresponde a un límite de tasa del proveedor"""
+    response = getattr(error, "response", None)
+    if response is not None and getattr(response, "status_code", None) == 429:
+        return True
+    mensaje = str(error).lower()
+    return "429" in mensaje or "rate limit" in mensaje or "too many requests" in mensaje
+
+
+class RateLimitedOCRService:
+    """
+    Envoltura con límite de tasa y reintentos para cualquier servicio de OCR.
+
+    Comparte el limitador global del proceso, de modo que varios procesadores
+    concurrentes no superen en conjunto el tope del proveedor. Ante un error
+    de rate limit reintenta con backoff exponencial; otros errores se propagan
+    sin reintento (de eso se encarga FallbackOCRService).
+    """
+
+    def __init__(self, service, max_retries: int = 3, limitador: _LimitadorOCR = None):
+        self.service = service
+        self.max_retries = max_retries
+        self._limitador = limitador or _limitador_ocr
+
+    def extract_text_from_url(self, file_url: str) -> Tuple[str, float]:
+        """Extrae texto delegando en el servicio envuelto, con límite de tasa"""
+        return self._ejecutar_con_limite(self.service.extract_text_from_url, file_url)
+
+    def extract_text_from_path(self, local_path: str) -> Tuple[str, float]:
+        """Extrae texto de un archivo local delegando en el servicio envuelto"""
+        return self._ejecutar_con_limite(self.service.extract_text_from_path, local_path)
+
+    def _ejecutar_con_limite(self, extractor, origen: str) -> Tuple[str, float]:
+        """Ejecuta la extracción bajo el limitador global, con reintentos ante 429"""
+        for intento in range(1, self.max_retries + 1):
+            with self._limitador:
+                try:
+                    return extractor(origen)
+                except Exception as e:
+                    if not _es_error_rate_limit(e) or intento == self.max_retries:
+                        raise
+                    espera = min(2 ** intento, 30)
+                    logger.warning(
+                        "Rate limit del proveedor de OCR (intento %d/%d); reintentando en %ds: %s",
+                        intento, self.max_retries, espera, e
+                    )
+            time.sleep(espera)
+
+        raise ValueError("Se agotaron los reintentos de OCR por límite de tasa")
+
+
+@functools.lru_cache(maxsize=1)
 def get_ocr_service():
     """Factory para obtener el servicio de OCR según OCR_PROVIDER.
 
+    Memoizada: cada orquestador construía su propia pila de servicios
+    (releyendo entorno y credenciales); la configuración es de por vida del
+    proceso, así que todos comparten una sola instancia.
+
     OCR_PROVIDER:
       - "azure": usa Azure Computer Vision
       - "gcp": usa Google Cloud Vision API
@@ -758,11 +1199,11 @@ def get_ocr_service():
     if provider == "local":
         return LocalOCRService()
     if provider == "azure":
-        return OCRService()
+        return RateLimitedOCRService(OCRService())
     if provider == "gcp":
-        return GCPOCRService()
+        return RateLimitedOCRService(GCPOCRService())
     if provider == "fallback":
-        return FallbackOCRService()
+        return RateLimitedOCRService(FallbackOCRService())
 
     # Por defecto usar fallback
-    return FallbackOCRService()
+    return RateLimitedOCRService(FallbackOCRService())
@@ -0,0 +1,88 @@
+"""
+Contexto de procesamiento del pipeline de capas.
+
+El contexto pasaba por las capas como Dict[str, Any] anónimo: cada acceso es un
+hash/lookup y cualquier typo en una clave es un error en runtime. Este módulo lo
+convierte en un dataclass con __slots__ (acceso por atributo, sin __dict__ por
+instancia) manteniendo la interfaz de diccionario (get/[]/in) que las capas ya
+usan, para poder migrarlas gradualmente. Las claves internas de coordinación
+(p. ej. _persist, _ctx_lock) viven en `extra`.
+"""
+
+from collections import deque
+from dataclasses import dataclass, field, fields
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+
+@dataclass(slots=True)
+class ProcessingContext:
+    """Estado compartido de un documento a lo largo del pipeline de capas."""
+
+    processed_doc: Dict[str, Any]
+    # Acotado en cliente (mismo tope que el $slice histórico): la persistencia
+    # escribe la lista completa con $set sin recortes server-side
+    processing_log: Deque[str] = field(default_factory=lambda: deque(maxlen=1000))
+    total_cost: float = 0.0
+    rejection_reasons: List[Dict[str, Any]] = field(default_factory=list)
+    validation_results: List[Dict[str, Any]] = field(default_factory=list)
+    final_decision: Optional[Any] = None
+    ocr_text: Optional[str] = None
+    extracted_data: Optional[Dict[str, Any]] = None
+    classification_result: Optional[Dict[str, Any]] = None
+    document_type_config: Optional[Dict[str, Any]] = None
+    document_type_id: Optional[Any] = None
+    document_type_name: Optional[str] = None
+    download_info: Optional[Dict[str, Any]] = None
+    # Claves no estructurales (callbacks, locks, banderas transitorias)
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    # --- Interfaz de diccionario (compatibilidad con las capas existentes) ---
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _SLOT_KEYS:
+            return getattr(self, key)
+        return self.extra[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in _SLOT_KEYS:
+            setattr(self, key, value)
+        else:
+            self.extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        if key in _SLOT_KEYS:
+            return getattr(self, key) is not None
+        return key in self.extra
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _SLOT_KEYS:
+            value = getattr(self, key)
+            return default if value is None else value
+        return self.extra.get(key, default)
+
+    def keys(self) -> Iterator[str]:
+        for key in _SLOT_KEYS:
+            if getattr(self, key) is not None:
+                yield key
+        yield from self.extra.keys()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Vista dict del contexto para las fronteras de persistencia/respuesta.
+        Omite los campos aún no poblados y las claves internas (prefijo "_").
+        """
+        result = {
+            key: getattr(self, key)
+            for key in _SLOT_KEYS
+            if getattr(self, key) is not None
+        }
+        result.update(
+            (key, value) for key, value in self.extra.items() if not key.startswith("_")
+        )
+        # BSON/JSON no codifican deque; materializar el log como lista
+        if "processing_log" in result:
+            result["processing_log"] = list(result["processing_log"])
+        return result
+
+
+_SLOT_KEYS = frozenset(f.name for f in fields(ProcessingContext)) - {"extra"}
@@ -0,0 +1,88 @@
+"""
+Caché de reglas pre-serializadas para los prompts de validación.
+
+Para un tipo de documento dado, el bloque JSON de reglas que se inyecta en los
+prompts es invariante, pero hoy se re-serializa con json.dumps en cada llamada.
+Este módulo lo compila una vez por (tipo, versión de reglas, grupo) y lo
+reutiliza. La clave incluye `rules_version` del documento en OCR_document_types:
+al editar reglas debe incrementarse esa versión para invalidar la entrada.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from utils.json_utils import dumps_pretty
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 128
+
+
+class RulePromptCache:
+    """Caché LRU de bloques JSON de reglas compilados por tipo de documento."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_compiled_rules(
+        self, document_type_config: Dict[str, Any], rule_group: str
+    ) -> Optional[str]:
+        """
+        Devuelve el bloque JSON serializado de `rule_group` ("general_rules" o
+        "validation_rules") de la configuración, cacheado por
+        (_id, rules_version, grupo). Devuelve None si el grupo no tiene reglas.
+
+        Las configuraciones sin _id o con reglas filtradas por documento
+        (marcadas con _rules_filtered) se serializan sin cachear.
+        """
+        rules = document_type_config.get(rule_group)
+        if not rules:
+            return None
+
+        doc_type_id = document_type_config.get("_id")
+        if doc_type_id is None or document_type_config.get("_rules_filtered"):
+            return _serialize_rules(rules)
+
+        key = (
+            str(doc_type_id),
+            str(document_type_config.get("rules_version")),
+            rule_group,
+        )
+
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                return compiled
+
+        compiled = _serialize_rules(rules)
+
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return compiled
+
+    def clear(self) -> None:
+        """Vacía la caché (para tests o recargas de configuración de reglas)."""
+        with self._lock:
+            self._entries.clear()
+
+
+def _serialize_rules(rules: Any) -> str:
+    return dumps_pretty(rules)
+
+
+# Instancia global compartida
+rule_prompt_cache = RulePromptCache()
+
+
+def get_compiled_rules(document_type_config: Dict[str, Any], rule_group: str) -> Optional[str]:
+    """Helper de módulo sobre la instancia global."""
+    return rule_prompt_cache.get_compiled_rules(document_type_config, rule_group)
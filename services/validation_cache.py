@@ -0,0 +1,79 @@
+"""
+Caché en memoria para resultados de validación de reglas con IA.
+
+Evita repetir llamadas LLM cuando el mismo conjunto de reglas se aplica a los
+mismos datos (reintentos, reprocesamientos y pares original/descargado que
+comparten campos). LRU acotado con TTL; seguro para uso concurrente.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Any, Callable, Tuple
+
+from utils.json_utils import dumps_sorted_bytes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 3600  # 1 hora
+
+
+def make_cache_key(**payload: Any) -> str:
+    """
+    Construye una clave estable a partir de los componentes de la validación
+    (reglas, datos extraídos, datos del usuario, versión de reglas, etc.)
+    """
+    return hashlib.sha1(dumps_sorted_bytes(payload)).hexdigest()
+
+
+class ValidationCache:
+    """Caché LRU con TTL para resultados de validación."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Devuelve (valor, fue_caché). Si la clave no está o expiró, ejecuta fn(),
+        guarda el resultado y lo devuelve. Los valores cacheados se devuelven
+        como copia profunda para que el llamador pueda mutarlos sin contaminar
+        la caché.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    return deepcopy(value), True
+                # Expirado: eliminar y recomputar
+                del self._entries[key]
+
+        value = fn()
+
+        with self._lock:
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                logger.debug(f"Entrada de caché de validación desalojada: {evicted_key}")
+
+        return deepcopy(value), False
+
+    def clear(self) -> None:
+        """Vacía la caché (útil para tests y recargas de configuración)."""
+        with self._lock:
+            self._entries.clear()
+
+
+# Instancia global compartida entre procesadores
+validation_cache = ValidationCache()
@@ -28,6 +28,9 @@ class VMVerificationClient:
         self.vm_url = vm_url or os.getenv("VM_VERIFICATION_URL", "http://34.176.102.209:8080")
         self.timeout = timeout
         self.base_url = self.vm_url.rstrip("/")
+        # Sesión persistente: keep-alive hacia la VM en lugar de pagar el
+        # handshake TCP/TLS en cada verificación
+        self.session = requests.Session()
         
     def _save_base64_to_file(self, pdf_base64: str, document_id: str, prefix: str = "certificado") -> Optional[str]:
         """
@@ -92,7 +95,7 @@ class VMVerificationClient:
             url = f"{self.base_url}/verificar/portal-documental"
             payload = {"codigo": codigo}
             
-            response = requests.post(url, json=payload, timeout=self.timeout)
+            response = self.session.post(url, json=payload, timeout=self.timeout)
             response.raise_for_status()
             
             result = response.json()
@@ -178,7 +181,7 @@ class VMVerificationClient:
             }
             
             req_timeout = timeout or self.timeout
-            response = requests.post(url, json=payload, timeout=req_timeout)
+            response = self.session.post(url, json=payload, timeout=req_timeout)
             response.raise_for_status()
             
             result = response.json()
@@ -0,0 +1,54 @@
+"""
+Serialización JSON del camino caliente (claves de caché, prompts).
+
+Usa orjson (serializador en C, 2-5x más rápido que json y con salida bytes
+directa para hashlib) cuando está instalado, con fallback transparente a la
+librería estándar. Todas las variantes serializan tipos no-JSON (ObjectId,
+datetime) vía str, igual que los json.dumps(default=str) que reemplazan.
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - entorno sin orjson
+    orjson = None
+
+
+def dumps_compact(obj: Any) -> str:
+    """Serialización compacta sin escapar no-ASCII (para prompts y payloads)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, default=str)
+
+
+def dumps_pretty(obj: Any) -> str:
+    """Serialización con indentación de 2 espacios (bloques JSON de prompts)."""
+    if orjson is not None:
+        return orjson.dumps(
+            obj, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2
+        ).decode("utf-8")
+    return json.dumps(obj, indent=2, ensure_ascii=False, default=str)
+
+
+def dumps_sorted_bytes(obj: Any) -> bytes:
+    """
+    Serialización determinista (claves ordenadas) en bytes, lista para
+    alimentar hashlib sin pasar por un str intermedio. Para claves de caché.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            obj, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+        )
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """
+    Deserialización JSON (str o bytes). orjson.JSONDecodeError subclasea
+    json.JSONDecodeError, así que los handlers existentes siguen funcionando.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)